@@ -1,16 +1,257 @@
-from dotenv import load_dotenv
-from flask import Flask, jsonify, request, render_template, session, redirect, url_for, flash
-from domain_checker import check_domains_concurrently
-from logs import logger
-from user_management import register_user, login_user
-from data_manager import get_user_domains, save_user_domains, remove_user_domain
+from flask import Blueprint, Flask, Response, g, jsonify, request, render_template, session, redirect, url_for, flash
+from logs import logger, configure_logging
+from user_management import register_user, login_user, get_user_quota, is_admin
+from data_manager import (get_user_domains, update_user_domains, remove_user_domain,
+                          list_usernames, cache_stats)
+from scheduler import PRIORITIES
+from domain_normalizer import normalize_domain, normalize_domains
+from live_updates import StatusBroadcaster
+from assertions import domain_assertions, validate_assertions
+from event_log import get_event_log, record_result_change, EVENT_READ_LIMIT
+from tracing import (slow_checks, set_tracing, tracing_enabled, start_profile, finish_profile,
+                     SLOW_CHECK_WINDOW)
+import atexit
+import json
 import os
-import re
-
-
-load_dotenv()
-app = Flask(__name__, template_folder= 'templates', static_folder='static')
-app.secret_key = os.environ.get("SECRET_KEY", "dev_secret")
+import threading
+import time
+
+# NOTE: the probe stack (domain_checker -> requests, ssl, tls_inspector) and the
+# background engine are imported lazily, only by the code paths that need them,
+# so a web worker that never runs a live check never pays for them.
+
+# the largest number of domains one bulk request may carry.
+BULK_MAX_ITEMS = 50000
+# bulk checks with wait=true run live in the request, so they are capped lower.
+BULK_LIVE_CHECK_MAX = 500
+# GET /api/domains only re-checks lists up to this size live, longer lists get the background results.
+LIVE_CHECK_MAX = BULK_LIVE_CHECK_MAX
+# how long a browser waits before reconnecting a dropped live stream (milliseconds).
+STREAM_RETRY_MS = 5000
+# the longest /api/changes may hold a request waiting for new events (seconds).
+CHANGES_MAX_WAIT = 30
+# the most pages of other users' events one waiting /api/changes request skips through,
+# past them it answers with the offset reached and the client continues from there.
+CHANGES_MAX_SKIPPED_PAGES = 20
+
+
+bp = Blueprint('main', __name__)
+
+
+def create_app():
+    """
+    app factory: builds and configures the Flask app.
+    run it with `python app.py`, or `gunicorn "app:create_app()"`.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+    configure_logging()
+    app = Flask(__name__, template_folder= 'templates', static_folder='static')
+    app.secret_key = os.environ.get("SECRET_KEY", "dev_secret")
+    app.register_blueprint(bp)
+    return app
+
+
+# the background engine keeps checking every user's domains on their own schedule.
+# set MONITOR_ENGINE=0 to run the web app without it (e.g. when worker.py runs the checks).
+_engine = None
+_engine_lock = threading.Lock()
+# pushes the engine's status changes to connected dashboards (/api/events).
+broadcaster = StatusBroadcaster()
+
+
+def get_engine():
+    # returns the engine, creating and starting it on first use. None when MONITOR_ENGINE=0.
+    global _engine
+    if _engine is not None or os.environ.get("MONITOR_ENGINE", "1") == "0":
+        return _engine
+    with _engine_lock:
+        if _engine is None:
+            from engine import MonitorEngine
+            from snapshot import snapshot_path
+            from vantage import probe_from_env
+            engine = MonitorEngine(probe=probe_from_env(), snapshot_path=snapshot_path())
+            engine.add_listener(push_status_change)
+            # status transitions and certificate renewals also go to the change event log.
+            engine.add_listener(record_result_change)
+            # warm start: results from the last snapshot are served right away.
+            engine.load_snapshot()
+            for username in list_usernames():
+                engine.sync_user(username, get_user_domains(username), stagger=True, quota=get_user_quota(username))
+            engine.start()
+            atexit.register(engine.stop)
+            _engine = engine
+    return _engine
+
+
+_worker_results = None
+
+
+def result_source():
+    """
+    where the latest background results come from: this process's engine, or
+    with MONITOR_ENGINE=0 the snapshot worker.py writes. None when there is neither.
+    both have latest(domains).
+    """
+    global _worker_results
+    engine = get_engine()
+    if engine is not None:
+        return engine
+    if _worker_results is None:
+        from snapshot import SnapshotResults, snapshot_path
+        _worker_results = SnapshotResults(snapshot_path())
+    return _worker_results if _worker_results.available() else None
+
+
+@bp.before_app_request
+def start_engine():
+    # started with the first request (not at import), so the debug reloader's
+    # parent process never runs a second engine.
+    get_engine()
+
+
+@bp.before_app_request
+def start_request_profile():
+    # opt-in profiling: an admin sends "X-Profile: 1" (binary pstats dump) or "X-Profile: text"
+    # and gets the request's cProfile back instead of its response.
+    # without the header this costs one header lookup.
+    mode = request.headers.get('X-Profile')
+    if mode and is_admin(session.get('username')):
+        g.profile_mode = mode
+        g.profiler = start_profile()
+
+
+@bp.after_app_request
+def finish_request_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    body, mimetype, filename = finish_profile(profiler, g.profile_mode)
+    if response.is_streamed:
+        # an event stream is left alone, replacing it would leak its subscription.
+        return response
+    logger.info(f"profiled {request.method} {request.path} for {session.get('username')}.")
+    headers = {'Content-Disposition': f'attachment; filename={filename}',
+               'X-Profiled-Status': str(response.status_code)}
+    return Response(body, mimetype=mimetype, headers=headers)
+
+
+def push_status_change(usernames, domain, result, previous):
+    # engine listener: serializes the change once per group of owners that see the domain alike
+    # (owners with other assertions see another result), and only if one of them is connected.
+    for owners, view in domain_assertions.views(usernames, result):
+        if not broadcaster.has_subscribers(owners):
+            continue
+        if previous is not None and not view.changed_from(domain_assertions.seen_by(owners[0], previous)):
+            continue
+        broadcaster.publish(owners, domain, json.dumps(format_result(view)))
+
+
+def sync_engine(username, stagger=False):
+    # call after any change to a user's domain list.
+    # stagger=True spreads the first checks of many new domains instead of making them all due now.
+    if _engine is not None:
+        _engine.sync_user(username, get_user_domains(username), stagger=stagger, quota=get_user_quota(username))
+
+
+# one live re-check of a user's whole list at a time. repeated reloads while one runs
+# are answered from the engine, so one user cannot occupy the probe pool several times over.
+_live_check_locks = {}
+_live_check_locks_guard = threading.Lock()
+
+
+def live_check_lock(username):
+    with _live_check_locks_guard:
+        return _live_check_locks.setdefault(username, threading.Lock())
+
+
+def validate_schedule_settings(data, quota):
+    # optional settings: priority class, check interval in seconds and content assertions.
+    # returns an error message, or None if the settings are fine.
+    priority = data.get('priority')
+    if priority is not None and priority not in PRIORITIES:
+        return f"Invalid priority. Use one of: {', '.join(PRIORITIES)}."
+    interval = data.get('interval')
+    if interval is not None and (isinstance(interval, bool) or not isinstance(interval, (int, float)) or interval <= 0):
+        return "Interval must be a positive number of seconds."
+    if interval is not None and interval < quota['min_interval']:
+        return f"Interval must be at least {quota['min_interval']} seconds."
+    if data.get('assertions') is not None:
+        return validate_assertions(data['assertions'])
+    return None
+
+
+def quota_message(quota):
+    return f"Domain limit reached ({quota['max_domains']} domains)."
+
+
+def new_domain_record(domain, data):
+    # the record we store for a freshly added domain.
+    record = {"domain": domain, "status": "Pending check", "ssl_expiration": "N/A", "ssl_issuer": "N/A"}
+    for key in ('priority', 'interval', 'assertions'):
+        if data.get(key) is not None:
+            record[key] = data[key]
+    return record
+
+
+def read_bulk_items(data):
+    # returns (items, error message). items may be plain domain strings or objects with a "domain" key.
+    items = data.get('domains') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, "Request must contain a non-empty 'domains' list."
+    if len(items) > BULK_MAX_ITEMS:
+        return None, f"Too many domains in one request (max {BULK_MAX_ITEMS})."
+    items = [item if isinstance(item, dict) else {"domain": item} for item in items]
+    for index, item in enumerate(items):
+        if not isinstance(item.get('domain'), str):
+            return None, f"Item {index}: the domain must be a string."
+    return items, None
+
+
+def stored_name(raw, owned):
+    # finds how a domain is stored: exactly as given (older entries), or in normalized form.
+    raw = str(raw or '').strip()
+    if raw in owned:
+        return raw
+    normalized, _ = normalize_domain(raw)
+    return normalized if normalized in owned else None
+
+
+def engine_report(domains_to_check, source, username):
+    # the latest background results (see result_source); domains not checked yet keep their saved "pending" entry.
+    latest = source.latest([d['domain'] for d in domains_to_check]) if source else {}
+    return [format_result(latest[d['domain']], username) if d['domain'] in latest else
+            {key: d.get(key, 'N/A') for key in ('domain', 'status', 'ssl_expiration', 'ssl_issuer')}
+            for d in domains_to_check]
+
+
+def format_result(result, username=None):
+    # turns a CheckResult into the API's domain object, with the outcome of the user's own assertions.
+    # results stay compact in memory and are only expanded into dicts here, at the edge.
+    result = domain_assertions.seen_by(username, result)
+    if result.degraded:
+        # answered, but e.g. with an error or parking page: shown as down.
+        status_text = f"Degraded. Status code {result.status_value()}, {result.assertion_error}"
+    elif result.live:
+        status_text = f"Live. Status code {result.status_value()}"
+    else:
+        status_text = f"Unavailable. Status code {result.status_value()}"
+    formatted = {
+        "domain": result.domain,
+        "status": status_text,
+        "ssl_expiration": result.expiry_value(),
+        "ssl_issuer": result.issuer or 'N/A',
+        "tls": result.tls.to_dict() if result.tls else None
+    }
+    if result.vantages:
+        formatted["vantages"] = result.vantages_value()
+    if result.assertion_error:
+        formatted["assertion_error"] = result.assertion_error
+    if result.body_hash:
+        formatted["body_hash"] = result.body_hash
+    if result.redirects:
+        formatted["redirects"] = list(result.redirects)
+    return formatted
 
 
 # =================================================================
@@ -19,26 +260,26 @@ app.secret_key = os.environ.get("SECRET_KEY", "dev_secret")
 # in the API endpoints below.
 # =================================================================
 
-@app.route('/')
+@bp.route('/')
 def main_page():
     # If the user has a session, show them the dashboard, otherwise the login page.
     if 'username' in session:
-        return redirect(url_for('dashboard_page'))
-    return redirect(url_for('login_page'))
+        return redirect(url_for('main.dashboard_page'))
+    return redirect(url_for('main.login_page'))
 
-@app.route('/register')
+@bp.route('/register')
 def register_page():
     return render_template('register.html')
 
-@app.route('/login')
+@bp.route('/login')
 def login_page():
     return render_template('login.html')
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 def dashboard_page():
     # This route is now protected; it will only serve the dashboard if the user is logged in.
     if 'username' not in session:
-        return redirect(url_for('login_page'))
+        return redirect(url_for('main.login_page'))
     # The template is rendered without data; the frontend JS will fetch it.
     return render_template('dashboard.html', username=session['username'])
 
@@ -48,7 +289,7 @@ def dashboard_page():
 # These endpoints is for the  JSON-based API.
 # =================================================================
 
-@app.route('/api/register', methods=['POST'])
+@bp.route('/api/register', methods=['POST'])
 def api_register():
     data = request.get_json()
     if not data or not data.get('username') or not data.get('password'):
@@ -66,7 +307,7 @@ def api_register():
         status_code = 409 if "exists" in message else 500
         return jsonify({"success": False, "message": message}), status_code
 
-@app.route('/api/login', methods=['POST'])
+@bp.route('/api/login', methods=['POST'])
 def api_login():
     data = request.get_json()
     if not data or not data.get('username') or not data.get('password'):
@@ -84,12 +325,12 @@ def api_login():
         # Invalid credentials is an unauthorized error
         return jsonify({"success": False, "message": message}), 401
 
-@app.route('/api/logout', methods=['POST'])
+@bp.route('/api/logout', methods=['POST'])
 def api_logout():
     session.pop('username', None)
     return jsonify({"success": True, "message": "You have been logged out."}), 200
 
-@app.route('/api/session', methods=['GET'])
+@bp.route('/api/session', methods=['GET'])
 def api_session():
     # A new endpoint for the frontend to check if a user is logged in.
     if 'username' in session:
@@ -97,7 +338,7 @@ def api_session():
     else:
         return jsonify({"loggedIn": False}), 401
 
-@app.route('/api/domains', methods=['GET'])
+@bp.route('/api/domains', methods=['GET'])
 def api_get_domains():
     if 'username' not in session:
         return jsonify({"error": "Unauthorized"}), 401
@@ -111,19 +352,29 @@ def api_get_domains():
     if not domain_names:
         return jsonify([]) # Return empty list if no domains
 
-    fresh_check_results = check_domains_concurrently(domain_names)
-
-    final_report =[]
-    for result in fresh_check_results:
-        status_code = result.get('status_code')
-        status_text = f"Live. Status code {status_code}" if status_code == 200 else f"Unavailable. Status code {status_code}"
-        formatted_result = {
-            "domain": result.get('domain'),
-            "status": status_text,
-            "ssl_expiration": result.get('certificate_expiry', 'N/A'),
-            "ssl_issuer": result.get('issuer', 'N/A')
-        }
-        final_report.append(formatted_result)
+    # ?source=engine serves the background engine's latest results instead of re-checking everything live.
+    source = result_source()
+    if request.args.get('source') == 'engine':
+        return jsonify(engine_report(domains_to_check, source, username))
+
+    # a long list is never re-checked inside one request, it would hold the worker for minutes.
+    if len(domain_names) > LIVE_CHECK_MAX:
+        logger.info(f"API: {username} has {len(domain_names)} domains, over the live check limit, serving engine results.")
+        return jsonify(engine_report(domains_to_check, source, username))
+
+    # while a live re-check of this user's list is already running, serve the engine's results.
+    lock = live_check_lock(username)
+    if not lock.acquire(blocking=source is None):
+        logger.info(f"API: live check already running for {username}, serving engine results.")
+        return jsonify(engine_report(domains_to_check, source, username))
+    try:
+        from domain_checker import check_domains_concurrently
+        domain_assertions.sync_user(username, domains_to_check)
+        fresh_check_results = check_domains_concurrently(domain_names)
+    finally:
+        lock.release()
+
+    final_report = [format_result(result, username) for result in fresh_check_results]
 
     # THE FIX: This line was the source of the bug. A GET request should not modify data on the server.
     # By removing it, we ensure that a failed live check cannot corrupt the user's saved list of domains.
@@ -131,41 +382,48 @@ def api_get_domains():
     
     return jsonify(final_report)
 
-@app.route('/api/add_domain', methods=['POST'])
+@bp.route('/api/add_domain', methods=['POST'])
 def api_add_domain():
     if 'username' not in session:
         return jsonify({"error": "Unauthorized"}), 401
 
     data = request.get_json()
-    domain_to_add = data.get('domain', '').strip()
+    raw_domain = data.get('domain', '')
 
-    if not domain_to_add:
+    if not isinstance(raw_domain, str) or not raw_domain.strip():
         return jsonify({"success": False, "message": "Domain cannot be empty."}), 400
 
-    # This is a validation block .
-    # It uses a regular expression to check for a valid domain name format.
-    domain_regex = re.compile(
-        r'^(?:[a-zA-Z0-9]'
-        r'(?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)'
-        r'+[a-zA-Z]{2,}$' # CORRECTED: Changed {2,6} to {2,}
-    )
-    if not domain_regex.match(domain_to_add):
-        return jsonify({"success": False, "message": "Invalid domain format. Please use a format like 'example.com'."}), 400
-    #end of validation block
+    # 'https://Example.com./' and 'example.com' are the same domain, we store the normalized form.
+    domain_to_add, error = normalize_domain(raw_domain)
+    if error:
+        return jsonify({"success": False, "message": error}), 400
 
     username = session['username']
-    current_domains = get_user_domains(username)
-
-    if domain_to_add in [d['domain'] for d in current_domains]:
+    quota = get_user_quota(username)
+    settings_error = validate_schedule_settings(data, quota)
+    if settings_error:
+        return jsonify({"success": False, "message": settings_error}), 400
+
+    new_domain = new_domain_record(domain_to_add, data)
+
+    # the duplicate check, the quota check and the append happen under the user's lock, in one step.
+    def add_one(current_domains):
+        if domain_to_add in {d.get('domain') for d in current_domains}:
+            return current_domains, [], 'exists'
+        if len(current_domains) >= quota['max_domains']:
+            return current_domains, [], 'quota'
+        return current_domains + [new_domain], [{"op": "add", "record": new_domain}], 'added'
+
+    outcome = update_user_domains(username, add_one)
+    if outcome == 'exists':
         return jsonify({"success": False, "message": f"Domain '{domain_to_add}' is already in your list."}), 409
-
-    current_domains.append({
-        "domain": domain_to_add, "status": "Pending check", "ssl_expiration": "N/A", "ssl_issuer": "N/A"
-    })
-    save_user_domains(username, current_domains)
+    if outcome == 'quota':
+        return jsonify({"success": False, "message": quota_message(quota)}), 403
+    logger.info(f"added domain '{domain_to_add}' for user '{username}'.")
+    sync_engine(username)
     return jsonify({"success": True, "message": f"Domain '{domain_to_add}' was added successfully."}), 201
 
-@app.route('/api/remove_domain', methods=['POST'])
+@bp.route('/api/remove_domain', methods=['POST'])
 def api_remove_domain():
     if 'username' not in session:
         return jsonify({"error": "Unauthorized"}), 401
@@ -177,12 +435,17 @@ def api_remove_domain():
         return jsonify({"success": False, "message": "Invalid request."}), 400
 
     success = remove_user_domain(username, domain_to_remove)
+    if not success:
+        # the client may send a non-normalized spelling of a stored domain.
+        normalized, _ = normalize_domain(domain_to_remove)
+        success = bool(normalized) and normalized != domain_to_remove and remove_user_domain(username, normalized)
     if success:
+        sync_engine(username)
         return jsonify({"success": True, "message": f"Domain '{domain_to_remove}' was removed."}), 200
     else:
         return jsonify({"success": False, "message": f"Domain '{domain_to_remove}' not found."}), 404
 
-@app.route('/api/bulk_upload', methods=['POST'])
+@bp.route('/api/bulk_upload', methods=['POST'])
 def api_bulk_upload():
     if 'username' not in session:
         return jsonify({"error": "Unauthorized"}), 401
@@ -193,22 +456,275 @@ def api_bulk_upload():
         return jsonify({"success": False, "message": "Please upload a valid .txt file."}), 400
 
     username = session['username']
-    current_domains = get_user_domains(username)
-    existing_domain_names = {d['domain'] for d in current_domains}
-    added_count = 0
-
-    for line in file.readlines():
-        domain = line.decode('utf-8').strip()
-        if domain and domain not in existing_domain_names:
-            current_domains.append({
-                "domain": domain, "status": "pending check", "ssl_expiration": "N/A", "ssl_issuer": "N/A"
-            })
+    quota = get_user_quota(username)
+    lines = [line.decode('utf-8').strip() for line in file.readlines()]
+    lines = [line for line in lines if line]
+    normalized = normalize_domains(lines)
+    valid = [domain for domain, error in normalized if not error]
+    skipped_count = len(lines) - len(valid)
+    over_quota = set()
+
+    def add_new(current_domains):
+        existing_domain_names = {d['domain'] for d in current_domains}
+        ops = []
+        for domain in valid:
+            if domain in existing_domain_names:
+                continue
+            if len(current_domains) >= quota['max_domains']:
+                over_quota.add(domain)
+                continue
+            record = {"domain": domain, "status": "pending check", "ssl_expiration": "N/A", "ssl_issuer": "N/A"}
+            current_domains.append(record)
+            ops.append({"op": "add", "record": record})
             existing_domain_names.add(domain)
-            added_count += 1
-            
-    save_user_domains(username, current_domains)
-    return jsonify({"success": True, "message": f"Bulk upload complete. Added {added_count} new domains."}), 200
+        return current_domains, ops, len(ops)
+
+    added_count = update_user_domains(username, add_new)
+    sync_engine(username, stagger=True)
+    message = f"Bulk upload complete. Added {added_count} new domains."
+    if skipped_count:
+        message += f" Skipped {skipped_count} invalid lines."
+    if over_quota:
+        message += f" {len(over_quota)} domains were not added: {quota_message(quota)}"
+    return jsonify({"success": True, "message": message}), 200
+
+# =================================================================
+# Bulk JSON API
+# one request carries many domains, gets one result per item, and
+# the storage change is committed once for the whole batch.
+# =================================================================
+
+@bp.route('/api/bulk_add', methods=['POST'])
+def api_bulk_add():
+    if 'username' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    items, error = read_bulk_items(request.get_json(silent=True))
+    if error:
+        return jsonify({"success": False, "message": error}), 400
+
+    username = session['username']
+    quota = get_user_quota(username)
+    results = [None] * len(items)
+    candidates = []
+    normalized = normalize_domains([item.get('domain') for item in items])
+    for index, (item, (domain, error)) in enumerate(zip(items, normalized)):
+        if error:
+            results[index] = {"domain": item.get('domain'), "result": "invalid", "message": error}
+            continue
+        settings_error = validate_schedule_settings(item, quota)
+        if settings_error:
+            results[index] = {"domain": domain, "result": "invalid", "message": settings_error}
+            continue
+        candidates.append((index, domain, item))
+
+    def add_all(current_domains):
+        existing = {d['domain'] for d in current_domains}
+        ops = []
+        for index, domain, item in candidates:
+            if domain in existing:
+                results[index] = {"domain": domain, "result": "exists"}
+                continue
+            if len(current_domains) >= quota['max_domains']:
+                results[index] = {"domain": domain, "result": "quota_exceeded", "message": quota_message(quota)}
+                continue
+            record = new_domain_record(domain, item)
+            current_domains.append(record)
+            ops.append({"op": "add", "record": record})
+            existing.add(domain)
+            results[index] = {"domain": domain, "result": "added"}
+        return current_domains, ops, len(ops)
+
+    added_count = update_user_domains(username, add_all)
+    if added_count:
+        sync_engine(username, stagger=True)
+    return jsonify({"success": True, "added": added_count, "results": results}), 200
+
+@bp.route('/api/bulk_remove', methods=['POST'])
+def api_bulk_remove():
+    if 'username' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    items, error = read_bulk_items(request.get_json(silent=True))
+    if error:
+        return jsonify({"success": False, "message": error}), 400
+
+    username = session['username']
+    wanted = [item.get('domain') for item in items]
+    results = []
+
+    def remove_all(current_domains):
+        remaining = {d['domain']: d for d in current_domains}
+        ops = []
+        for raw in wanted:
+            domain = stored_name(raw, remaining)
+            if domain is None:
+                results.append({"domain": raw, "result": "not_found"})
+                continue
+            del remaining[domain]
+            ops.append({"op": "remove", "domain": domain})
+            results.append({"domain": domain, "result": "removed"})
+        return list(remaining.values()), ops, len(ops)
+
+    removed_count = update_user_domains(username, remove_all)
+    if removed_count:
+        sync_engine(username)
+    return jsonify({"success": True, "removed": removed_count, "results": results}), 200
+
+@bp.route('/api/bulk_check', methods=['POST'])
+def api_bulk_check():
+    if 'username' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True)
+    items, error = read_bulk_items(data)
+    if error:
+        return jsonify({"success": False, "message": error}), 400
+
+    # only domains in the user's own list can be force-checked.
+    username = session['username']
+    records = get_user_domains(username)
+    owned = {d['domain'] for d in records}
+    wanted = [stored_name(item.get('domain'), owned) or item.get('domain') for item in items]
+    to_check = list(dict.fromkeys(d for d in wanted if d in owned))
+
+    # wait=false queues the checks in the background engine right away and returns.
+    if data.get('wait', True) is False:
+        engine = get_engine()
+        if engine is None:
+            return jsonify({"success": False, "message": "The background engine is not running in this process."}), 503
+        queued = set(engine.check_now(to_check))
+        # an owned domain the engine does not schedule yet (e.g. just added in another worker) is not queued.
+        results = [{"domain": d, "result": "queued" if d in queued else "not_scheduled" if d in owned else "not_found"}
+                   for d in wanted]
+        return jsonify({"success": True, "queued": len(queued), "results": results}), 202
+
+    if len(to_check) > BULK_LIVE_CHECK_MAX:
+        return jsonify({"success": False, "message": f"Live checks are limited to {BULK_LIVE_CHECK_MAX} domains per request, use \"wait\": false for more."}), 400
+
+    from domain_checker import check_domains_concurrently
+    domain_assertions.sync_user(username, records)
+    checked = {r.domain: format_result(r, username) for r in check_domains_concurrently(to_check)} if to_check else {}
+    results = [dict(checked[d], result="checked") if d in checked else {"domain": d, "result": "not_found"} for d in wanted]
+    return jsonify({"success": True, "checked": len(checked), "results": results}), 200
+
+@bp.route('/api/events', methods=['GET'])
+def api_events():
+    # server-sent events: one "status" event per domain whose result changed,
+    # produced by the background engine, instead of the dashboard polling /api/domains.
+    if 'username' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    if get_engine() is None:
+        return jsonify({"success": False, "message": "The background engine is not running in this process."}), 503
+
+    subscription = broadcaster.subscribe(session['username'])
+
+    def stream():
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            while True:
+                events = subscription.wait()
+                if subscription.closed:
+                    break
+                if not events:
+                    yield ": keepalive\n\n"
+                    continue
+                yield ''.join(f"event: {name}\ndata: {data}\n\n" for name, data in events)
+        finally:
+            # runs when the client disconnects and the server closes the generator.
+            broadcaster.unsubscribe(subscription)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream(), mimetype='text/event-stream', headers=headers)
+
+@bp.route('/api/usage', methods=['GET'])
+def api_usage():
+    # the user's quota and how much of the shared check capacity they use.
+    if 'username' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    username = session['username']
+    engine = get_engine()
+    usage = engine.usage(username) if engine else None
+    return jsonify({"quota": get_user_quota(username), "domains": len(get_user_domains(username)),
+                    "usage": usage}), 200
+
+@bp.route('/api/metrics', methods=['GET'])
+def api_metrics():
+    # engine health (scheduled domains, lag per priority class), data cache and parsed-certificate cache hit ratios,
+    # and the open live-update streams.
+    if 'username' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    from tls_inspector import cert_cache
+    engine = get_engine()
+    return jsonify({"engine": engine.metrics() if engine else None, "cache": cache_stats(),
+                    "tls_cache": cert_cache.stats(), "streams": broadcaster.stats(),
+                    "events": get_event_log().stats()}), 200
+
+@bp.route('/api/changes', methods=['GET'])
+def api_changes():
+    # the change event log from ?offset= on: domains added / removed, status transitions,
+    # certificate renewals ... a consumer keeps next_offset and asks again from there.
+    # ?wait=N holds the request up to N seconds until there is something new.
+    # users only see events about their own domains, admins see everything. a user's
+    # events list only them as users, not who else monitors a shared domain.
+    if 'username' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    username = session['username']
+    offset = request.args.get('offset', 0, type=int)
+    if offset < 0:
+        return jsonify({"success": False, "message": "Offset must be 0 or more."}), 400
+    limit = min(max(request.args.get('limit', EVENT_READ_LIMIT, type=int), 1), EVENT_READ_LIMIT)
+    wait = min(max(request.args.get('wait', 0, type=float), 0), CHANGES_MAX_WAIT)
+
+    log = get_event_log()
+    admin = is_admin(username)
+    deadline = time.monotonic() + wait
+    next_offset = offset
+    skipped = 0
+    while True:
+        events, read_to = log.read(next_offset, limit)
+        if not admin:
+            events = [dict(event, users=[username]) for event in events if username in event['users']]
+        remaining = deadline - time.monotonic()
+        if read_to > next_offset:
+            next_offset = read_to
+            # a page of only other users' events does not end the wait, the next page might be ours.
+            # but a long run of them is left to the client's next request.
+            skipped += 1
+            if events or not wait or remaining <= 0 or skipped >= CHANGES_MAX_SKIPPED_PAGES:
+                break
+            continue
+        if remaining <= 0 or not log.wait(next_offset, remaining):
+            break
+    first_offset = log.first_offset()
+    return jsonify({"events": events, "next_offset": next_offset, "first_offset": first_offset,
+                    "truncated": offset < first_offset}), 200
+
+@bp.route('/api/admin/slow_checks', methods=['GET'])
+def api_slow_checks():
+    # the slowest checks of the last hour with their per-phase timings (needs check tracing on).
+    if 'username' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    if not is_admin(session['username']):
+        return jsonify({"error": "Forbidden"}), 403
+    limit = request.args.get('limit', type=int)
+    return jsonify({"tracing": tracing_enabled(), "window": SLOW_CHECK_WINDOW,
+                    "checks": slow_checks.top(limit)}), 200
+
+@bp.route('/api/admin/tracing', methods=['POST'])
+def api_set_tracing():
+    # switches check tracing on or off at runtime: {"enabled": true}
+    if 'username' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    if not is_admin(session['username']):
+        return jsonify({"error": "Forbidden"}), 403
+    enabled = (request.get_json(silent=True) or {}).get('enabled')
+    if not isinstance(enabled, bool):
+        return jsonify({"success": False, "message": "\"enabled\" must be true or false."}), 400
+    set_tracing(enabled)
+    logger.info(f"check tracing switched {'on' if enabled else 'off'} by {session['username']}.")
+    return jsonify({"success": True, "tracing": enabled}), 200
 
 
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port="8080")
\ No newline at end of file
+    create_app().run(debug=True, host="0.0.0.0", port="8080")
\ No newline at end of file
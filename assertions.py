@@ -0,0 +1,341 @@
+import functools
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+try:
+    from re import _parser as sre_parse  # python 3.11+
+except ImportError:
+    import sre_parse
+
+
+# how much of a page we read at most to answer a domain's assertions.
+BODY_READ_LIMIT = 512 * 1024
+BODY_CHUNK_SIZE = 16 * 1024
+# a regex match must fit in this many bytes, that much of the previous chunk is kept
+# so a match that spans two chunks is still found.
+REGEX_WINDOW = 4096
+MAX_PATTERN_LENGTH = 500
+# the longest one check may spend matching a domain's pattern (seconds). validate_assertions
+# rejects the patterns that backtrack badly, this bounds whatever is left.
+REGEX_TIME_BUDGET = 1.0
+
+_REPEATS = ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+
+ASSERTION_KEYS = ('contains', 'regex', 'max_response_ms', 'final_host', 'track_body')
+
+
+def validate_assertions(spec):
+    """
+    checks a domain's "assertions" object as sent to the API, e.g.
+    {"contains": "Welcome", "regex": "Order #\\d+", "max_response_ms": 2000,
+     "final_host": "www.example.com", "track_body": true}
+    every key is optional. returns an error message, or None if it is fine.
+    """
+    if not isinstance(spec, dict):
+        return "Assertions must be an object."
+    unknown = set(spec) - set(ASSERTION_KEYS)
+    if unknown:
+        return f"Unknown assertion '{sorted(unknown)[0]}'. Use: {', '.join(ASSERTION_KEYS)}."
+    for key in ('contains', 'regex', 'final_host'):
+        value = spec.get(key)
+        if value is not None and (not isinstance(value, str) or not value or len(value) > MAX_PATTERN_LENGTH):
+            return f"'{key}' must be a non-empty string of at most {MAX_PATTERN_LENGTH} characters."
+    if spec.get('regex') is not None:
+        try:
+            re.compile(spec['regex'].encode())
+        except re.error as e:
+            return f"Invalid regex: {e}."
+        problem = _backtracking_problem(spec['regex'])
+        if problem:
+            return f"Regex not allowed: {problem}."
+    limit = spec.get('max_response_ms')
+    if limit is not None and (isinstance(limit, bool) or not isinstance(limit, (int, float)) or limit <= 0):
+        return "'max_response_ms' must be a positive number."
+    if spec.get('track_body') is not None and not isinstance(spec['track_body'], bool):
+        return "'track_body' must be true or false."
+    return None
+
+
+def _backtracking_problem(pattern: str):
+    """
+    the patterns a page can make backtrack for minutes are refused up front:
+    nested quantifiers ((a+)+), alternation under a quantifier ((a|aa)+),
+    backreferences, more than one variable-length quantifier (\\d+\\d+x) and a
+    leading one (.*x, the same as x for a search but quadratic). an optional
+    part (colou?r) is fine, it cannot blow up.
+    returns what is wrong with the pattern, or None.
+    """
+    variable = 0
+
+    def walk(items, repeated):
+        nonlocal variable
+        for op, av in items:
+            name = str(op)
+            if name in ('GROUPREF', 'GROUPREF_EXISTS'):
+                return "backreferences are not supported"
+            if name in _REPEATS:
+                low, high, sub = av
+                if repeated and high > 1:
+                    return "nested quantifiers are not supported"
+                if low != high and high > 1:
+                    variable += 1
+                    if variable > 1:
+                        return "use at most one variable-length quantifier (*, +, {m,n})"
+                problem = walk(sub, repeated or high > 1)
+            elif name == 'BRANCH':
+                if repeated:
+                    return "alternation inside a quantified group is not supported"
+                problem = next(filter(None, (walk(branch, repeated) for branch in av[1])), None)
+            elif name == 'SUBPATTERN':
+                problem = walk(av[-1], repeated)
+            elif name in ('ASSERT', 'ASSERT_NOT'):
+                problem = walk(av[1], repeated)
+            elif name == 'ATOMIC_GROUP':
+                problem = walk(av, repeated)
+            else:
+                problem = None
+            if problem:
+                return problem
+        return None
+
+    parsed = list(sre_parse.parse(pattern.encode()))
+    problem = walk(parsed, False)
+    first = parsed
+    while first and str(first[0][0]) == 'SUBPATTERN':
+        first = list(first[0][1][-1])
+    if problem is None and first and str(first[0][0]) in _REPEATS:
+        low, high, _ = first[0][1]
+        if low != high and high > 1:
+            problem = "it must not start with a variable-length quantifier, drop the leading part (e.g. '.*')"
+    return problem
+
+
+def host_of(url: str) -> str:
+    return (urlsplit(url).hostname or '').lower()
+
+
+class Assertions:
+    """
+    one set of compiled assertions (one owner's, for one domain). evaluate() reads
+    the response body in chunks, at most BODY_READ_LIMIT bytes, and stops as soon
+    as every content assertion is answered (unless the body is hashed, which needs all of it).
+    key is the spec in canonical JSON form, the same in every process.
+    """
+
+    __slots__ = ('spec', 'key', 'contains', 'regex', 'max_response_ms', 'final_host', 'track_body')
+
+    def __init__(self, spec: dict):
+        self.spec = spec
+        self.key = sys.intern(json.dumps(spec, sort_keys=True))
+        self.contains = spec['contains'].encode() if spec.get('contains') else None
+        self.regex = re.compile(spec['regex'].encode()) if spec.get('regex') else None
+        self.max_response_ms = spec.get('max_response_ms')
+        self.final_host = spec['final_host'].lower() if spec.get('final_host') else None
+        self.track_body = bool(spec.get('track_body'))
+
+    @property
+    def reads_body(self) -> bool:
+        return self.contains is not None or self.regex is not None or self.track_body
+
+    def header_error(self, response, elapsed_ms: float):
+        # the assertions answered without the body: response time and final host.
+        if self.max_response_ms is not None and elapsed_ms > self.max_response_ms:
+            return f"response took {int(elapsed_ms)}ms (max {self.max_response_ms}ms)"
+        if self.final_host is not None:
+            final_host = host_of(response.url)
+            if final_host != self.final_host:
+                return f"redirected to {final_host}, expected {self.final_host}"
+        return None
+
+    def evaluate(self, response, elapsed_ms: float):
+        """
+        checks a streamed requests response (requests.get(..., stream=True)).
+                Returns:
+            (error, body_hash): the first failed assertion as a message (None if all
+            passed), and the sha256 of the body (first BODY_READ_LIMIT bytes) if track_body is set.
+        """
+        return evaluate_all((self,), response, elapsed_ms)[0]
+
+    def scan(self, chunks):
+        # (error, body_hash) of the content assertions alone, see scan_body.
+        return scan_body((self,), chunks)[0]
+
+
+class BodyScan:
+    """
+    the content checks of one Assertions over one body, fed chunk by chunk.
+    keeps only the overlap a match could span instead of buffering the page.
+    """
+
+    __slots__ = ('assertions', 'found_text', 'found_pattern', 'digest', 'keep', 'tail', 'regex_seconds')
+
+    def __init__(self, assertions: Assertions):
+        self.assertions = assertions
+        self.found_text = assertions.contains is None
+        self.found_pattern = assertions.regex is None
+        self.digest = hashlib.sha256() if assertions.track_body else None
+        self.keep = REGEX_WINDOW if assertions.regex is not None else len(assertions.contains or b'') - 1
+        self.tail = b''
+        self.regex_seconds = 0.0
+
+    @property
+    def done(self) -> bool:
+        return self.found_text and self.found_pattern and self.digest is None
+
+    def feed(self, chunk: bytes):
+        if self.digest is not None:
+            self.digest.update(chunk)
+        if self.found_text and self.found_pattern:
+            return
+        window = self.tail + chunk
+        if not self.found_text and self.assertions.contains in window:
+            self.found_text = True
+        if not self.found_pattern and self.regex_seconds < REGEX_TIME_BUDGET:
+            started = time.perf_counter()
+            self.found_pattern = self.assertions.regex.search(window) is not None
+            self.regex_seconds += time.perf_counter() - started
+        self.tail = window[max(0, len(window) - self.keep):] if self.keep > 0 else b''
+
+    def result(self, capped: bool):
+        where = f" in the first {BODY_READ_LIMIT // 1024} KB" if capped else ''
+        if not self.found_text:
+            error = f"expected text not found{where}"
+        elif not self.found_pattern and self.regex_seconds >= REGEX_TIME_BUDGET:
+            error = f"the pattern took over {REGEX_TIME_BUDGET:g}s to match, matching stopped"
+        elif not self.found_pattern:
+            error = f"body does not match the pattern{where}"
+        else:
+            error = None
+        return error, (self.digest.hexdigest() if self.digest is not None else None)
+
+
+def scan_body(assertions, chunks) -> list:
+    """
+    answers the content assertions of several Assertions from one pass over the
+    body chunks, stopping once all of them are answered or BODY_READ_LIMIT is read.
+    returns [(error, body_hash), ...] in the order of `assertions`.
+    """
+    scans = [BodyScan(a) for a in assertions]
+    read = 0
+    for chunk in chunks:
+        chunk = chunk[:BODY_READ_LIMIT - read]
+        read += len(chunk)
+        for body_scan in scans:
+            body_scan.feed(chunk)
+        if read >= BODY_READ_LIMIT or all(body_scan.done for body_scan in scans):
+            break
+    return [body_scan.result(read >= BODY_READ_LIMIT) for body_scan in scans]
+
+
+def evaluate_all(assertions, response, elapsed_ms: float) -> list:
+    """
+    evaluates several owners' Assertions on one streamed response, reading the
+    body once for all of them (see Assertions.evaluate for one).
+    returns [(error, body_hash), ...] in the order of `assertions`.
+    """
+    header_errors = [a.header_error(response, elapsed_ms) for a in assertions]
+    readers = [a for a in assertions if a.reads_body]
+    body = {}
+    if readers:
+        # imported here so the web app can validate assertions without loading the probe stack.
+        import requests
+        try:
+            body = dict(zip(readers, scan_body(readers, response.iter_content(BODY_CHUNK_SIZE))))
+        except requests.exceptions.RequestException as e:
+            failed = (f"body could not be read ({type(e).__name__})", None)
+            body = {a: failed for a in readers}
+    results = []
+    for a, header_error in zip(assertions, header_errors):
+        body_error, body_hash = body.get(a, (None, None))
+        results.append((header_error or body_error, body_hash))
+    return results
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile(key: str) -> Assertions:
+    return Assertions(json.loads(key))
+
+
+def compile_assertions(spec: dict) -> Assertions:
+    # the same spec always gives the same (shared) Assertions object, so regexes are compiled once.
+    return _compile(json.dumps(spec, sort_keys=True))
+
+
+class AssertionRegistry:
+    """
+    which assertions apply to each domain, kept in sync from the users' domain
+    records (see MonitorEngine.sync_user). a domain monitored by several users
+    is checked with every distinct set of assertions its owners set, on one
+    read of the page, and each owner sees the outcome of their own (see views()).
+    """
+
+    def __init__(self):
+        self._owners = {}  # domain -> {username: Assertions}
+        self._by_user = {}  # username -> {domain: Assertions}
+        self._resolved = {}  # domain -> (Assertions, ...) checked, distinct, ordered by key
+        self._lock = threading.Lock()
+
+    def sync_user(self, username: str, records: list):
+        mine = {r['domain']: compile_assertions(r['assertions'])
+                for r in records if r.get('domain') and r.get('assertions')}
+        with self._lock:
+            previous = self._by_user.get(username, {})
+            if mine == previous:
+                return
+            if mine:
+                self._by_user[username] = mine
+            else:
+                self._by_user.pop(username, None)
+            for domain in previous.keys() - mine.keys():
+                owners = self._owners.get(domain, {})
+                owners.pop(username, None)
+                if not owners:
+                    self._owners.pop(domain, None)
+            for domain, assertions in mine.items():
+                self._owners.setdefault(domain, {})[username] = assertions
+            for domain in previous.keys() | mine.keys():
+                owners = self._owners.get(domain)
+                if owners:
+                    distinct = {a.key: a for a in owners.values()}
+                    self._resolved[domain] = tuple(distinct[key] for key in sorted(distinct))
+                else:
+                    self._resolved.pop(domain, None)
+
+    def get(self, domain: str) -> tuple:
+        # every distinct set of assertions the domain's owners set, () if none.
+        return self._resolved.get(domain, ())
+
+    def for_user(self, username: str, domain: str):
+        # the user's own assertions for the domain, or None.
+        return self._by_user.get(username, {}).get(domain)
+
+    def seen_by(self, username, result):
+        # the result as this user sees it: with the outcome of their own assertions.
+        assertions = self.for_user(username, result.domain) if username is not None else None
+        return result.seen_with(assertions.key if assertions is not None else None)
+
+    def views(self, usernames, result) -> list:
+        """
+        splits a domain's owners by the assertions they set.
+        returns [(usernames, result as they see it)], one item per distinct set
+        of assertions (owners without any share one), for change listeners.
+        """
+        if not result.assertion_outcomes:
+            return [(list(usernames), result)] if usernames else []
+        groups = {}
+        for username in usernames:
+            assertions = self.for_user(username, result.domain)
+            groups.setdefault(assertions.key if assertions is not None else None, []).append(username)
+        return [(owners, result.seen_with(key)) for key, owners in groups.items()]
+
+    def __len__(self):
+        return len(self._resolved)
+
+
+# one shared registry: the engine and the web app's live checks both read it.
+domain_assertions = AssertionRegistry()
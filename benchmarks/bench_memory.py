@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for the engine's in-memory results
+Measures how much memory 100k domains' latest results take, as the old
+per-result dicts of strings versus the compact CheckResult records the
+engine keeps now. Issuers, protocols and error reasons repeat across the
+fleet like they do in real data, but every dict result gets its own copy
+of each string, the way they come out of the certificate parser.
+Run from the repo root: python3 benchmarks/bench_memory.py [--domains N]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from check_result import CheckResult, CertStatus, TlsSummary, STATUS_FAILED
+
+ISSUERS = ["R3", "R10", "E5", "GTS CA 1C3", "DigiCert Global G2 TLS RSA SHA256 2020 CA1",
+           "Sectigo RSA Domain Validation Secure Server CA", "Amazon RSA 2048 M02"]
+BASE_EXPIRY = 1893456000
+
+
+def fresh(text):
+    # a new string object with the same text, like a parser would hand us.
+    return "".join(list(text))
+
+
+def make_fields(i):
+    # 90% valid certificates with a TLS summary, 5% HTTP errors, 5% failed checks.
+    kind = i % 20
+    if kind == 19:
+        return {"status": STATUS_FAILED, "error": "Connection timed out"}
+    return {"status": 503 if kind == 18 else 200, "issuer": ISSUERS[i % len(ISSUERS)],
+            "expiry": BASE_EXPIRY + i * 60, "key": "RSA 2048" if i % 3 else "EC 256"}
+
+
+def make_dict(domain, f):
+    if "error" in f:
+        return {"domain": domain, "status_code": "FAILED", "certificate_status": fresh("failed"),
+                "certificate_expiry": fresh(f["error"]), "issuer": fresh("N/A"), "tls": None, "attempts": 3}
+    expiry = time.strftime("%Y-%m-%d", time.gmtime(f["expiry"]))
+    return {"domain": domain, "status_code": f["status"], "certificate_status": fresh("valid"),
+            "certificate_expiry": expiry, "issuer": fresh(f["issuer"]),
+            "tls": {"protocol": fresh("TLSv1.3"), "key": fresh(f["key"]), "san_match": True, "chain_length": 3,
+                    "chain_expiry": expiry, "ocsp_stapled": None, "issues": []},
+            "attempts": 1}
+
+
+def make_record(domain, f):
+    if "error" in f:
+        return CheckResult(domain, STATUS_FAILED, CertStatus.FAILED, cert_error=fresh(f["error"]),
+                           issuer=fresh("N/A"), attempts=3)
+    tls = TlsSummary(fresh("TLSv1.3"), fresh(f["key"]), True, 3, f["expiry"], [])
+    return CheckResult(domain, f["status"], CertStatus.VALID, f["expiry"], issuer=fresh(f["issuer"]), tls=tls)
+
+
+def measure(label, build, domains, fields, baseline=None):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    results = {d: build(d, f) for d, f in zip(domains, fields)}
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    per_domain = used / len(results)
+    per_100k = per_domain * 100000 / 1024 / 1024
+    note = f"  ({used / baseline:.0%} of dicts)" if baseline else ""
+    print(f"{label:<28} {per_domain:>8.0f} bytes/domain {per_100k:>8.1f} MB per 100k{note}")
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--domains", type=int, default=100000)
+    count = parser.parse_args().domains
+    # the domain strings already live in the scheduler, so they are not counted.
+    domains = [f"site{i}.example.com" for i in range(count)]
+    fields = [make_fields(i) for i in range(count)]
+    print(f"{count} domains, results dict included")
+    baseline = measure("dict results", make_dict, domains, fields)
+    measure("CheckResult records", make_record, domains, fields, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for domain_normalizer
+Prints how many domains per second normalize_domain / normalize_domains handle
+for a realistic mix of clean, messy (URLs, case, trailing dots), international
+and invalid input.
+Run from the repo root: python3 benchmarks/bench_normalize.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from domain_normalizer import normalize_domain, normalize_domains
+
+ROUNDS = 5
+BATCH_SIZE = 50000
+
+
+def make_batch(size):
+    # 60% already clean, 25% messy, 5% international, 10% invalid.
+    batch = []
+    for i in range(size):
+        kind = i % 20
+        if kind < 12:
+            batch.append(f"site{i}.example.com")
+        elif kind < 17:
+            batch.append(f"https://WWW.Site{i}.Example.com./path?q={i}")
+        elif kind < 18:
+            batch.append(f"bücher{i}.de")
+        else:
+            batch.append(f"not a domain {i}")
+    return batch
+
+
+def bench(label, func, batch):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func(batch)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<40} {len(batch) / best:>12,.0f} validations/sec")
+
+
+if __name__ == "__main__":
+    batch = make_batch(BATCH_SIZE)
+    print(f"batch of {BATCH_SIZE} domains, best of {ROUNDS} rounds")
+    bench("normalize_domain (one by one)", lambda b: [normalize_domain(d) for d in b], batch)
+    bench("normalize_domains (batch)", normalize_domains, batch)
+    bench("normalize_domains (50% repeats)", normalize_domains, batch[:BATCH_SIZE // 2] * 2)
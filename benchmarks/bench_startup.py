@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for the service entry points
+Runs each entry point in a fresh interpreter the way it really starts, not
+just its import: the web app up to a built Flask app (create_app()), the
+check worker up to its first user sync, and the CLI answering from its
+result cache. Each run reports its wall time and checks that the import
+boundaries hold: the CLI and the worker must not import Flask, and the web
+app must not import the probe stack (requests / tls_inspector).
+The runs work in a scratch directory (data/, users.json, the engine
+snapshot), seeded with one user and SEEDED_DOMAINS domains.
+Run from the repo root: python3 benchmarks/bench_startup.py [--save]
+--save records the numbers in benchmarks/startup_times.json, and later runs
+print the change against that file.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_FILE = os.path.join(ROOT, "benchmarks", "startup_times.json")
+ROUNDS = 5
+SEEDED_DOMAINS = 500
+
+# entry point -> (code run in the fresh interpreter, modules it must NOT pull in).
+ENTRY_POINTS = {
+    "app": ("import app; app.create_app()",
+            ["requests", "domain_checker", "engine", "tls_inspector"]),
+    "worker": ("import worker; engine = worker.create_engine(); worker.sync_users(engine, set(), stagger=True)",
+               ["flask"]),
+    "cli": ("import cli; cli.main(['--since-cache', '3600', 'example.com'])",
+            ["flask", "requests", "domain_checker"]),
+}
+
+# runs the entry point, then prints its wall time (microseconds) and the loaded modules on the last line.
+HARNESS = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+{code}
+elapsed = int((time.perf_counter() - started) * 1e6)
+print(json.dumps([elapsed, sorted(sys.modules)]))
+"""
+
+
+def seed(workdir):
+    # one user with SEEDED_DOMAINS domains and a fresh CLI cache entry for example.com.
+    sys.path.insert(0, ROOT)
+    import data_manager
+    data_manager.DATA_DIR = os.path.join(workdir, "data")
+    os.makedirs(data_manager.DATA_DIR, exist_ok=True)
+    data_manager.save_user_domains("bench", [{"domain": f"bench{i}.com"} for i in range(SEEDED_DOMAINS)])
+    with open(os.path.join(workdir, "users.json"), "w") as f:
+        json.dump([{"username": "bench", "password": "x"}], f)
+    with open(os.path.join(workdir, "data", "cli_cache.json"), "w") as f:
+        json.dump({"example.com": {"domain": "example.com", "status_code": 200, "checked_at": int(time.time())}}, f)
+
+
+def run_entry_point(code, workdir):
+    # returns (wall microseconds, set of modules loaded).
+    proc = subprocess.run(
+        [sys.executable, "-c", HARNESS.format(root=ROOT, code=code)],
+        cwd=workdir, capture_output=True, text=True, env=dict(os.environ, MONITOR_ENGINE="0"),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"running `{code}` failed:\n{proc.stderr}")
+    elapsed, modules = json.loads(proc.stdout.strip().splitlines()[-1])
+    return elapsed, set(modules)
+
+
+def main():
+    previous = {}
+    if os.path.exists(RESULTS_FILE):
+        with open(RESULTS_FILE) as f:
+            previous = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix="dm_bench_startup_")
+    seed(workdir)
+    results = {}
+    failures = []
+    print(f"{'entry':<10} {'best start':>12} {'previous':>10}  forbidden imports")
+    for name, (code, forbidden) in ENTRY_POINTS.items():
+        best = None
+        for _ in range(ROUNDS):
+            elapsed, modules = run_entry_point(code, workdir)
+            best = elapsed if best is None else min(best, elapsed)
+        leaked = [module for module in forbidden if module in modules]
+        if leaked:
+            failures.append(f"{name} imports {', '.join(leaked)}")
+        results[name] = best
+        before = f"{previous[name] / 1000:.1f}ms" if name in previous else "-"
+        print(f"{name:<10} {best / 1000:>10.1f}ms {before:>10}  {', '.join(leaked) or 'none'}")
+
+    if "--save" in sys.argv:
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"saved to {RESULTS_FILE}")
+    if failures:
+        print("\n✗ import boundaries broken: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
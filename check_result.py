@@ -0,0 +1,208 @@
+import enum
+import sys
+import time
+
+
+# status_code holds the HTTP status, or one of these when there is none.
+STATUS_NOT_CHECKED = 0
+STATUS_FAILED = -1
+
+_NO_ISSUES = ()
+_NO_OUTCOMES = ()
+
+
+class CertStatus(enum.Enum):
+    # the value is what the API has always returned for certificate_status.
+    NOT_CHECKED = 'N/A'
+    VALID = 'valid'
+    EXPIRED = 'expired'
+    FAILED = 'failed'
+
+
+_CERT_STATUS_BY_VALUE = {status.value: status for status in CertStatus}
+
+
+def _intern(value):
+    # issuers, protocols and error reasons repeat across thousands of domains,
+    # interning keeps one copy of each string instead of one per result.
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _format_date(epoch):
+    return time.strftime('%Y-%m-%d', time.gmtime(epoch))
+
+
+class TlsSummary:
+    """the compact form of tls_inspector.posture_summary()."""
+
+    __slots__ = ('protocol', 'key', 'san_match', 'chain_length', 'chain_expiry', 'issues')
+
+    def __init__(self, protocol, key, san_match, chain_length, chain_expiry, issues):
+        self.protocol = _intern(protocol)
+        self.key = _intern(key)
+        self.san_match = san_match
+        self.chain_length = chain_length
+        self.chain_expiry = chain_expiry  # epoch seconds or None
+        self.issues = tuple(issues) if issues else _NO_ISSUES
+
+    @classmethod
+    def from_posture(cls, posture: dict):
+        leaf = posture['leaf']
+        key = f"{leaf['key_type']} {leaf['key_bits']}" if leaf['key_bits'] else leaf['key_type']
+        return cls(posture['protocol'], key, posture['san_match'], len(posture['chain']),
+                   posture['chain_expiry'], posture['issues'])
+
+    def to_dict(self) -> dict:
+        # same keys and formatting as posture_summary().
+        return {
+            'protocol': self.protocol,
+            'key': self.key,
+            'san_match': self.san_match,
+            'chain_length': self.chain_length,
+            'chain_expiry': _format_date(self.chain_expiry) if self.chain_expiry else 'N/A',
+            # the stdlib ssl module cannot read stapled OCSP responses, see tls_inspector.
+            'ocsp_stapled': None,
+            'issues': list(self.issues),
+        }
+
+
+def intern_outcomes(outcomes) -> tuple:
+    # assertion outcomes from a snapshot or a vantage, with the repeated keys and errors shared.
+    if not outcomes:
+        return _NO_OUTCOMES
+    return tuple((sys.intern(key), _intern(error), body_hash) for key, error, body_hash in outcomes)
+
+
+class CheckResult:
+    """
+    one domain's check result, kept small because the engine holds one per
+    monitored domain: no per-instance dict, enum states instead of strings,
+    the expiry as an epoch int and interned issuer / error strings.
+    it is turned into the API's dict format only at the edge (to_dict()).
+    """
+
+    __slots__ = ('domain', 'status_code', 'cert_status', 'cert_expiry', 'cert_error', 'issuer', 'tls', 'attempts',
+                 'vantages', 'assertion_error', 'body_hash', 'assertion_outcomes', 'redirects')
+
+    def __init__(self, domain: str, status_code: int = STATUS_NOT_CHECKED,
+                 cert_status: CertStatus = CertStatus.NOT_CHECKED, cert_expiry=None,
+                 cert_error=None, issuer=None, tls=None, attempts: int = 1):
+        self.domain = domain
+        self.status_code = status_code
+        self.cert_status = cert_status
+        self.cert_expiry = cert_expiry  # epoch seconds of the leaf notAfter, or None
+        self.cert_error = _intern(cert_error)  # why the certificate check failed, or None
+        self.issuer = _intern(issuer)
+        self.tls = tls  # TlsSummary or None
+        self.attempts = attempts
+        self.vantages = None  # ((vantage name, status, latency_ms), ...) for multi-vantage checks
+        self.assertion_error = None  # the first failed content assertion (see assertions.py), or None
+        self.body_hash = None  # sha256 of the page for domains with track_body, or None
+        # what a probe found for each set of its owners' assertions: ((Assertions.key, error, body_hash), ...).
+        # assertion_error / body_hash are filled per owner from these by seen_with().
+        self.assertion_outcomes = _NO_OUTCOMES
+        self.redirects = ()  # the redirect chain (requested URL ... final URL), shared with redirects.redirect_cache
+
+    @property
+    def failed(self) -> bool:
+        return self.status_code == STATUS_FAILED
+
+    @property
+    def live(self) -> bool:
+        return self.status_code == 200
+
+    @property
+    def degraded(self) -> bool:
+        # the server answered, but not with what the domain's assertions expect.
+        return self.assertion_error is not None and not self.failed
+
+    def changed_from(self, other) -> bool:
+        # True if anything a user sees differs from an earlier result (status, certificate, assertions,
+        # page content, redirect chain).
+        return (self.status_code != other.status_code or self.cert_status is not other.cert_status
+                or self.cert_expiry != other.cert_expiry or self.cert_error != other.cert_error
+                or self.issuer != other.issuer or self.assertion_error != other.assertion_error
+                or self.body_hash != other.body_hash or self.assertion_outcomes != other.assertion_outcomes
+                or self.redirects != other.redirects)
+
+    def seen_with(self, assertions_key):
+        """
+        this result as an owner whose assertions have this key (None: no assertions)
+        sees it, with their own assertion_error and body_hash. results without
+        per-owner outcomes are returned as they are.
+        """
+        if not self.assertion_outcomes:
+            return self
+        view = CheckResult.__new__(CheckResult)
+        for name in CheckResult.__slots__:
+            setattr(view, name, getattr(self, name))
+        view.assertion_outcomes = _NO_OUTCOMES
+        view.assertion_error = view.body_hash = None
+        for key, error, body_hash in self.assertion_outcomes:
+            if key == assertions_key:
+                view.assertion_error, view.body_hash = error, body_hash
+                break
+        return view
+
+    def status_value(self):
+        # the status_code as the API shows it: the HTTP code, 'FAILED' or 'N/A'.
+        if self.status_code == STATUS_FAILED:
+            return 'FAILED'
+        return self.status_code if self.status_code != STATUS_NOT_CHECKED else 'N/A'
+
+    def expiry_value(self) -> str:
+        if self.cert_error:
+            return self.cert_error
+        return _format_date(self.cert_expiry) if self.cert_expiry is not None else 'N/A'
+
+    def vantages_value(self):
+        # per-vantage status and latency, None for single-vantage checks.
+        if not self.vantages:
+            return None
+        return [{'vantage': name, 'status_code': status, 'latency_ms': latency_ms}
+                for name, status, latency_ms in self.vantages]
+
+    def to_dict(self) -> dict:
+        # the raw check result format check_domain_status used to return.
+        result = {
+            'domain': self.domain,
+            'status_code': self.status_value(),
+            'certificate_status': self.cert_status.value,
+            'certificate_expiry': self.expiry_value(),
+            'issuer': self.issuer or 'N/A',
+            'tls': self.tls.to_dict() if self.tls else None,
+            'attempts': self.attempts,
+        }
+        if self.vantages:
+            result['vantages'] = self.vantages_value()
+        if self.assertion_error:
+            result['assertion_error'] = self.assertion_error
+        if self.body_hash:
+            result['body_hash'] = self.body_hash
+        if self.redirects:
+            result['redirects'] = list(self.redirects)
+        return result
+
+    def to_state(self) -> tuple:
+        # plain tuple of builtins for engine snapshots (see snapshot.py), the inverse of from_state().
+        tls = self.tls
+        tls_state = (tls.protocol, tls.key, tls.san_match, tls.chain_length, tls.chain_expiry, tls.issues) if tls else None
+        return (self.domain, self.status_code, self.cert_status.value, self.cert_expiry, self.cert_error,
+                self.issuer, tls_state, self.attempts, self.vantages, self.assertion_error, self.body_hash,
+                self.assertion_outcomes, self.redirects)
+
+    @classmethod
+    def from_state(cls, state: tuple):
+        (domain, status_code, cert_status, cert_expiry, cert_error, issuer, tls_state, attempts, vantages,
+         assertion_error, body_hash, assertion_outcomes, redirects) = state
+        result = cls(domain, status_code, _CERT_STATUS_BY_VALUE[cert_status], cert_expiry, cert_error, issuer,
+                     TlsSummary(*tls_state) if tls_state else None, attempts)
+        result.vantages = vantages
+        result.assertion_error = assertion_error
+        result.body_hash = body_hash
+        result.assertion_outcomes = intern_outcomes(assertion_outcomes)
+        result.redirects = tuple(sys.intern(url) for url in redirects)
+        return result
+
+    def __repr__(self):
+        return f"CheckResult({self.domain!r}, status={self.status_value()!r}, cert={self.cert_status.value!r})"
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Headless domain checker for cron jobs and CI gates.
+Runs the same checks as the web app without importing Flask, and streams
+one result per line (NDJSON or CSV) to stdout as checks finish.
+
+examples:
+    python3 cli.py example.com github.com
+    python3 cli.py -f domains.txt --format csv > report.csv
+    cat domains.txt | python3 cli.py -
+    python3 cli.py --user alice --since-cache 3600
+
+exit codes:
+    0 - every domain is live (HTTP 200)
+    1 - at least one domain is down, failed or invalid
+    2 - bad usage (no domains given, unreadable file, ...)
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+
+DEFAULT_CACHE_FILE = os.path.join('data', 'cli_cache.json')
+CSV_FIELDS = ['domain', 'status_code', 'certificate_status', 'certificate_expiry', 'issuer',
+              'tls_issues', 'attempts', 'checked_at', 'cached']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Check domain liveness and certificates from the command line.")
+    parser.add_argument('domains', nargs='*', help="domains to check, '-' reads them from stdin (one per line)")
+    parser.add_argument('-f', '--file', action='append', default=[], help="read domains from a file, can be repeated")
+    parser.add_argument('-u', '--user', action='append', default=[], help="check every domain in this user's list")
+    parser.add_argument('-c', '--concurrency', type=int, default=10, help="checks to run at once (default: 10)")
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson', help="output format (default: ndjson)")
+    parser.add_argument('--since-cache', type=float, metavar='SECONDS',
+                        help="reuse cached results younger than SECONDS, only re-check stale domains")
+    parser.add_argument('--cache-file', default=DEFAULT_CACHE_FILE, help=f"result cache (default: {DEFAULT_CACHE_FILE})")
+    parser.add_argument('--no-confirm', action='store_true', help="report a failure after one probe, without retries")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log check progress to stderr")
+    return parser.parse_args(argv)
+
+
+def quiet_logging(verbose: bool):
+    # logs go to stderr, stdout is reserved for the NDJSON/CSV stream.
+    from logs import configure_logging
+    configure_logging(stream=sys.stderr, level=logging.INFO if verbose else logging.WARNING)
+
+
+def read_lines(stream) -> list:
+    return [line.strip() for line in stream if line.strip() and not line.lstrip().startswith('#')]
+
+
+def collect_domains(args) -> list:
+    raw = []
+    for item in args.domains:
+        if item == '-':
+            raw.extend(read_lines(sys.stdin))
+        else:
+            raw.append(item)
+    for path in args.file:
+        with open(path, 'r') as f:
+            raw.extend(read_lines(f))
+    if args.user:
+        # only touch the user store when asked to.
+        from data_manager import get_user_domains
+        for username in args.user:
+            raw.extend(d['domain'] for d in get_user_domains(username))
+    return raw
+
+
+def load_cache(path: str) -> dict:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_cache(path: str, cache: dict):
+    from data_manager import _atomic_write_json
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    _atomic_write_json(path, cache, indent=None)
+
+
+class ResultWriter:
+    """writes results to stdout, one line per result, flushed right away."""
+
+    def __init__(self, fmt: str, stream=sys.stdout):
+        self.fmt = fmt
+        self.stream = stream
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(stream, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            self.csv.writeheader()
+
+    def write(self, result: dict):
+        if self.fmt == 'csv':
+            row = dict(result)
+            row['tls_issues'] = '; '.join((result.get('tls') or {}).get('issues', []))
+            self.csv.writerow(row)
+        else:
+            self.stream.write(json.dumps(result) + '\n')
+        self.stream.flush()
+
+
+def is_live(result: dict) -> bool:
+    return result.get('status_code') == 200
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    quiet_logging(args.verbose)
+
+    from domain_normalizer import normalize_domains
+    try:
+        raw = collect_domains(args)
+    except OSError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    if not raw:
+        print("error: no domains given (pass domains, -f FILE, -u USER or '-' for stdin).", file=sys.stderr)
+        return EXIT_USAGE
+    if args.concurrency < 1:
+        print("error: --concurrency must be at least 1.", file=sys.stderr)
+        return EXIT_USAGE
+
+    writer = ResultWriter(args.format)
+    failures = 0
+    domains = []
+    for item, (domain, error) in zip(raw, normalize_domains(raw)):
+        if error:
+            print(f"skipping '{item}': {error}", file=sys.stderr)
+            failures += 1
+        else:
+            domains.append(domain)
+    domains = list(dict.fromkeys(domains))
+
+    cache = load_cache(args.cache_file)
+    now = time.time()
+    to_check = []
+    for domain in domains:
+        cached = cache.get(domain)
+        if args.since_cache is not None and cached and now - cached.get('checked_at', 0) < args.since_cache:
+            writer.write(dict(cached, cached=True))
+            failures += 0 if is_live(cached) else 1
+        else:
+            to_check.append(domain)
+
+    if to_check:
+        # the probe stack (requests, ssl) is only imported when there is something to check.
+        from domain_checker import iter_domain_checks, CONFIRM_ATTEMPTS
+        confirm_attempts = 1 if args.no_confirm else CONFIRM_ATTEMPTS
+        for checked in iter_domain_checks(to_check, max_workers=args.concurrency, confirm_attempts=confirm_attempts):
+            result = checked.to_dict()
+            result['checked_at'] = int(time.time())
+            cache[result['domain']] = result
+            writer.write(dict(result, cached=False))
+            failures += 0 if is_live(result) else 1
+        save_cache(args.cache_file, cache)
+
+    return EXIT_FAILURES if failures else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
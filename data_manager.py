@@ -1,32 +1,446 @@
 import json
 import os
+import queue
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from logs import logger
 
+try:
+    import fcntl  # cross-process file locks, POSIX only.
+except ImportError:
+    fcntl = None
+
 
 DATA_DIR ='data'
-os.makedirs(DATA_DIR, exist_ok=True)
+
+# once a user's change log grows past this many bytes it is compacted into the snapshot.
+COMPACT_LOG_BYTES = 64 * 1024
+# a single change with more ops than this rewrites the snapshot instead of appending to the log.
+SNAPSHOT_OPS_THRESHOLD = 500
+
+# read-through cache settings: how many files we keep parsed in memory,
+# and how long (seconds) an entry may live even if the file never changes.
+CACHE_MAX_ENTRIES = 1024
+CACHE_TTL = 300
+
+
+class FileCache:
+    """
+    in-process LRU + TTL cache for parsed JSON files.
+    every entry remembers the file's signature (mtime, size, inode) at load time.
+    a lookup re-stats the file (much cheaper than read+parse) and treats a
+    changed signature as a miss, so other workers' writes are picked up.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (signature, loaded_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, key, signature):
+        """returns the cached value, or None if missing, expired or the file changed."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            cached_signature, loaded_at, value = entry
+            if cached_signature != signature or time.monotonic() - loaded_at > self.ttl:
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, signature, value):
+        with self._lock:
+            self._entries[key] = (signature, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+_file_cache = FileCache()
+
+
+def _ensure_data_dir():
+    # the data directory is created on first write, not at import.
+    os.makedirs(DATA_DIR, exist_ok=True)
+
+
+def _file_signature(filepath: str):
+    # None means "file does not exist", which is a valid (cacheable) state too.
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _copy(value):
+    # callers modify the lists they get back, so never hand out the cached objects.
+    if isinstance(value, list):
+        return [dict(item) if isinstance(item, dict) else item for item in value]
+    return value
+
+
+def read_json_cached(filepath: str, default=None):
+    """
+    reads and parses a JSON file through the cache.
+    a missing file returns `default` (or raises FileNotFoundError if default is None).
+    """
+    signature = _file_signature(filepath)
+    cached = _file_cache.get(filepath, signature)
+    if cached is None:
+        if signature is None:
+            cached = FileNotFoundError
+        else:
+            with open(filepath, 'r') as f:
+                cached = json.load(f)
+        _file_cache.put(filepath, signature, cached)
+    if cached is FileNotFoundError:
+        if default is None:
+            raise FileNotFoundError(filepath)
+        return _copy(default)
+    return _copy(cached)
+
+
+def _atomic_write_json(filepath: str, data, indent: int = 4):
+    """
+    crash-safe write: dump to a temp file in the same directory, fsync it,
+    then os.replace() it over the live file. readers see either the old or
+    the new content, never a half-written file.
+    """
+    _atomic_write(filepath, lambda f: f.write(json.dumps(data, indent=indent).encode('utf-8')), suffix='.json')
+
+
+def _atomic_write_bytes(filepath: str, payload: bytes):
+    # same crash-safe replace as _atomic_write_json, for binary files (engine snapshots).
+    _atomic_write(filepath, lambda f: f.write(payload), suffix='.bin')
+
+
+def _atomic_write(filepath: str, write, suffix: str):
+    directory = os.path.dirname(filepath) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        # make the rename itself durable.
+        dir_fd = os.open(directory, os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def write_json_cached(filepath: str, data, indent: int = 4):
+    # write-through: the file is written first, then the cache is refreshed with what we wrote.
+    _atomic_write_json(filepath, data, indent=indent)
+    _file_cache.put(filepath, _file_signature(filepath), _copy(data))
+
+
+def invalidate_cache(filepath: str):
+    _file_cache.invalidate(filepath)
+
+
+def cache_stats() -> dict:
+    return _file_cache.stats()
+
+
+# =================================================================
+# per-user storage
+# every user has a snapshot file (<user>_domains.json) and an
+# append-only change log (<user>_domains.log, one JSON op per line).
+# small changes only append to the log; the log is folded into the
+# snapshot (compacted) in the background once it grows.
+# all changes to one user happen under that user's lock.
+#
+# the snapshot is {"generation": n, "domains": [...]} (older ones are a
+# plain list, generation 0). every snapshot write bumps the generation and
+# every logged op carries the generation it was appended on top of, so ops
+# left in the log by a crash between writing a snapshot and removing the
+# log (already folded into that snapshot) are skipped instead of replayed.
+# =================================================================
+
+def _snapshot_path(username: str) -> str:
+    return os.path.join(DATA_DIR, f"{username}_domains.json")
+
+
+def _log_path(username: str) -> str:
+    return os.path.join(DATA_DIR, f"{username}_domains.log")
+
+
+_user_locks = {}
+_user_locks_guard = threading.Lock()
+_held_locks = threading.local()
+
+
+@contextmanager
+def user_lock(username: str):
+    """
+    exclusive lock on one user's data.
+    a threading lock serializes requests inside this process, and an fcntl
+    lock on data/.<user>.lock serializes other worker processes.
+    other users are never blocked. re-entering from the same thread is a no-op.
+    """
+    held = _held_locks.__dict__.setdefault('users', set())
+    if username in held:
+        yield
+        return
+    with _user_locks_guard:
+        lock = _user_locks.setdefault(username, threading.Lock())
+    with lock:
+        held.add(username)
+        try:
+            _ensure_data_dir()
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(DATA_DIR, f".{username}.lock"), 'a') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        finally:
+            held.discard(username)
+
+
+def _user_signature(username: str):
+    return (_file_signature(_snapshot_path(username)), _file_signature(_log_path(username)))
+
+
+def _replay(state: dict, op):
+    # state is {domain: record} in list order, so replaying a long log stays linear.
+    if not isinstance(op, dict):
+        return
+    if op.get('op') == 'add':
+        record = op.get('record', {})
+        state.setdefault(record.get('domain'), record)
+    elif op.get('op') == 'remove':
+        state.pop(op.get('domain'), None)
+
+
+def _load_user_state(username: str):
+    # snapshot + every op from the change log that is not already in it, in order.
+    # returns (snapshot generation, domains).
+    try:
+        with open(_snapshot_path(username), 'r') as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        snapshot = []
+    if isinstance(snapshot, dict):
+        generation, records = snapshot.get('generation', 0), snapshot.get('domains', [])
+    else:
+        generation, records = 0, snapshot
+    state = {d.get('domain'): d for d in records}
+    stale = 0
+    try:
+        with open(_log_path(username), 'r') as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    # a torn last line from a crash mid-append, the op never completed.
+                    logger.warning(f"skipping incomplete change log entry for '{username}'.")
+                    continue
+                if isinstance(op, dict) and op.get('gen', 0) < generation:
+                    stale += 1
+                    continue
+                _replay(state, op)
+    except FileNotFoundError:
+        pass
+    if stale:
+        logger.warning(f"skipped {stale} change log entries for '{username}' already in the snapshot.")
+    return generation, list(state.values())
+
+
+def _user_state(username: str):
+    # (generation, domains) through the cache. the domains are the cached list, do not modify it.
+    signature = _user_signature(username)
+    cached = _file_cache.get(_snapshot_path(username), signature)
+    if cached is None:
+        cached = _load_user_state(username)
+        _file_cache.put(_snapshot_path(username), signature, cached)
+    return cached
+
 
 """
-    Reads the user's single domain data file.
+    Reads the user's domain list (snapshot + change log).
     Returns a list of domain dictionaries or an empty list if not found.
+    repeated reads are served from the in-process cache while the files are unchanged.
 """
 def get_user_domains(username: str) -> list:
-    filepath = os.path.join(DATA_DIR, f"{username}_domains.json")
-    try:
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
+    return _copy(_user_state(username)[1])
+
+
+def list_usernames() -> list:
+    #returns every username that has a domain file, used to load all users at startup.
+    usernames = set()
+    if not os.path.isdir(DATA_DIR):
         return []
+    for name in os.listdir(DATA_DIR):
+        for suffix in ('_domains.json', '_domains.log'):
+            if name.endswith(suffix):
+                usernames.add(name[:-len(suffix)])
+    return sorted(usernames)
 
 
 def save_user_domains(username: str, domains: list):
-    #saves the list of domains for a given user to their .json file
-    filepath = os.path.join(DATA_DIR, f"{username}_domains.json")
-    with open(filepath, 'w') as f:
-        json.dump(domains, f, indent=4)
+    #saves the full list of domains for a given user: atomic snapshot write, then the log is dropped.
+    with user_lock(username):
+        before = {d.get('domain') for d in get_user_domains(username)}
+        _write_user_snapshot(username, domains)
+        # the overwrite is recorded in the event log as the adds / removes it amounts to.
+        after = {d.get('domain'): d for d in domains}
+        ops = [{'op': 'remove', 'domain': d} for d in before if d not in after]
+        ops += [{'op': 'add', 'record': record} for d, record in after.items() if d not in before]
+        _publish_ops(username, ops)
+
+
+def _write_user_snapshot(username: str, domains: list):
+    # caller holds user_lock. a new generation, then the log it replaces is dropped.
+    filepath = _snapshot_path(username)
+    generation = _user_state(username)[0] + 1
+    _atomic_write_json(filepath, {'generation': generation, 'domains': domains})
+    if os.path.exists(_log_path(username)):
+        os.remove(_log_path(username))
+    _file_cache.put(filepath, _user_signature(username), (generation, _copy(domains)))
     logger.info(f"domain data for '{username}' saved to {filepath}.")
 
 
+def _publish_ops(username: str, ops: list):
+    # every committed add / remove also goes to the change event log (event_log.py),
+    # still under the user's lock, so events are in the same order as the changes.
+    if ops:
+        import event_log
+        event_log.publish_domain_ops(username, ops)
+
+
+def _append_ops(username: str, ops: list, domains: list):
+    # caller holds user_lock. appends + fsyncs the ops, then refreshes the cache with the new state.
+    log_path = _log_path(username)
+    generation = _user_state(username)[0]
+    payload = ''.join(json.dumps(dict(op, gen=generation)) + '\n' for op in ops).encode('utf-8')
+    with open(log_path, 'a+b') as f:
+        # if a crash left a torn last line, start on a fresh line so our ops stay readable.
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                payload = b'\n' + payload
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    _file_cache.put(_snapshot_path(username), _user_signature(username), (generation, _copy(domains)))
+    if os.path.getsize(log_path) > COMPACT_LOG_BYTES:
+        _schedule_compaction(username)
+
+
+def update_user_domains(username: str, change):
+    """
+    transactional read-modify-write of a user's list.
+    `change(domains)` gets the current list and returns (new_list, ops, outcome),
+    where ops are the change-log entries describing the change. everything runs
+    under the user's lock, so concurrent updates are never lost, and the change
+    is committed to storage once (one log append, or one snapshot write for big changes).
+    returns whatever `outcome` the change function returned.
+    """
+    with user_lock(username):
+        domains = get_user_domains(username)
+        new_domains, ops, outcome = change(domains)
+        if len(ops) > SNAPSHOT_OPS_THRESHOLD:
+            _write_user_snapshot(username, new_domains)
+        elif ops:
+            _append_ops(username, ops, new_domains)
+        _publish_ops(username, ops)
+        return outcome
+
+
+def add_user_domain(username: str, record: dict) -> bool:
+    """
+    adds one domain record to the user's list.
+    returns True if it was added, False if the domain was already there.
+    """
+    def change(domains):
+        if record['domain'] in {d.get('domain') for d in domains}:
+            return domains, [], False
+        return domains + [record], [{'op': 'add', 'record': record}], True
+
+    added = update_user_domains(username, change)
+    if added:
+        logger.info(f"added domain '{record['domain']}' for user '{username}'.")
+    return added
+
+
+def compact_user_log(username: str):
+    # folds the change log into a fresh snapshot (atomically) and removes the log.
+    with user_lock(username):
+        if not os.path.exists(_log_path(username)):
+            return
+        _, domains = _load_user_state(username)
+        _write_user_snapshot(username, domains)
+    logger.info(f"compacted change log for '{username}'.")
+
+
+def _compaction_worker():
+    while True:
+        username = _compaction_queue.get()
+        try:
+            compact_user_log(username)
+        except Exception as e:
+            logger.error(f"compaction for '{username}' failed: {e}")
+
+
+_compaction_queue = queue.Queue()
+_compaction_thread = None
+
+
+def _schedule_compaction(username: str):
+    # the compaction thread is only started the first time a log needs compacting.
+    global _compaction_thread
+    with _user_locks_guard:
+        if _compaction_thread is None:
+            _compaction_thread = threading.Thread(target=_compaction_worker, name='log-compaction', daemon=True)
+            _compaction_thread.start()
+    _compaction_queue.put(username)
+
+
         
     """  this function 
     removes a single domain from the user domain list.
@@ -40,19 +454,21 @@ def save_user_domains(username: str, domains: list):
 
 def remove_user_domain(username: str, domain_to_remove: str) ->bool:
     logger.info(f"attempting to remove domain '{domain_to_remove}' for user '{username}'.")
-    #1.get the current list of domains.
-    current_domains = get_user_domains(username)
 
-    #2.find total nu,ber of domains before removal.
-    initial_domain_count = len(current_domains)
+    def change(current_domains):
+        #1.find total number of domains before removal.
+        initial_domain_count = len(current_domains)
+
+        #2.create a new list, without the domain we are removing.
+        updated_domains = [d for d in current_domains if d.get('domain') != domain_to_remove]
 
-    #3.create a new list, withput the doamin we re,uving,
-    updated_domains = [d for d in current_domains if d.get('domain') != domain_to_remove]
+        #3.check if domain was actually removed, if so record it in the change log.
+        if len(updated_domains) < initial_domain_count:
+            return updated_domains, [{'op': 'remove', 'domain': domain_to_remove}], True
+        return current_domains, [], False
 
-    #4.check if domain was actually removed,
-    if len(updated_domains) < initial_domain_count:
-        #5.save the new list, overwrite the old file
-        save_user_domains(username, updated_domains)
+    #4.the whole read-modify-write runs under the user's lock.
+    if update_user_domains(username, change):
         logger.info(f"successfully removed domain '{domain_to_remove}' for user '{username}'.")
         return True
     else:
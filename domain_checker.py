@@ -1,9 +1,29 @@
 import requests
 from concurrent.futures import ThreadPoolExecutor
+import queue
+import random
 import ssl
 import socket
-from datetime import datetime
+import sys
+import time
 from logs import logger #this is our "imported" logger.
+from rate_limiter import HostRateLimiter, spread_offsets
+from tls_inspector import inspect_tls
+from check_result import CheckResult, CertStatus, TlsSummary, STATUS_FAILED
+from tracing import trace_check, span
+from assertions import domain_assertions, evaluate_all
+from redirects import redirect_cache, redirect_chain, hostname_of
+
+# one shared limiter, so every caller respects the same per-host budget.
+host_limiter = HostRateLimiter()
+
+# a domain is only reported as FAILED after this many consecutive failed probes.
+CONFIRM_ATTEMPTS = 3
+# confirmation retries back off exponentially from RETRY_BASE_DELAY up to RETRY_MAX_DELAY seconds.
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 5
+# size of the separate retry lane, so retries never queue behind a full batch.
+RETRY_WORKERS = 4
 
 # this function show us certificate status.
 def get_certificate_info(hostname: str):
@@ -11,92 +31,241 @@ def get_certificate_info(hostname: str):
     Connects to a given hostname and retrieves its SSL certificate expiration info.
     returns: (status, expiry_date. issuer) in a form of a tuple.
     
+    """
+    status, expiry, issuer, _ = get_tls_report(hostname)
+    return status, expiry, issuer
+
+
+def get_tls_report(hostname: str):
+    """
+    Like get_certificate_info, plus the full TLS posture from tls_inspector
+    (chain expiry, SAN coverage, key type/size, protocol).
+    returns: (status, expiry_date, issuer, posture) - posture is None if the check failed.
     """
     logger.debug(f"Starting certificate check for {hostname}")
     try:
-        context = ssl.create_default_context()
-        with socket.create_connection((hostname, 443), timeout=5) as sock:
-            with context.wrap_socket(sock, server_hostname=hostname) as ssock:
-                cert = ssock.getpeercert()
-                issuer_info = dict(x[0] for x in cert['issuer'])
-                issuer = issuer_info.get('commonName', 'N/A')
-
-        expiry_date_str = cert['notAfter']
-        expiry_date = datetime.strptime(expiry_date_str, "%b %d %H:%M:%S %Y %Z")        
-    
-        if expiry_date < datetime.now():
+        posture = inspect_tls(hostname)
+        leaf = posture['leaf']
+        issuer = leaf['issuer']
+        expiry_date = time.strftime("%Y-%m-%d", time.gmtime(leaf['not_after']))
+
+        if leaf['not_after'] < time.time():
             logger.warning(f"Certificate for {hostname} has expired .")
-            return 'expired', expiry_date.strftime("%Y-%m-%d"), issuer
+            return 'expired', expiry_date, issuer, posture
         else:
             logger.info(f"Certificate for {hostname} is valid .")
-            return 'valid', expiry_date.strftime("%Y-%m-%d"), issuer
+            return 'valid', expiry_date, issuer, posture
 
     except socket.gaierror:
         # this error occurs if the DNS lookup fails (e.g., domain does not exist).
         # this is the cause of '[Errno 11001] getaddrinfo failed'.
         logger.error(f"DNS resolution failed for {hostname}.")
-        return 'failed', 'DNS resolution failed', 'N/A'
+        return 'failed', 'DNS resolution failed', 'N/A', None
     except ssl.SSLCertVerificationError:
         # this error occurs for SSL certificate validation issues, like a hostname mismatch.
         # this is the cause of '[SSL: CERTIFICATE_VERIFY_FAILED]...'.
         logger.error(f"SSL certificate verification failed for {hostname}.")
-        return 'failed', 'SSL certificate invalid', 'N/A'
+        return 'failed', 'SSL certificate invalid', 'N/A', None
     except socket.timeout:
         # this error occurs if the connection attempt exceeds the timeout value.
         logger.error(f"Connection timed out for {hostname}.")
-        return 'failed', 'Connection timed out', 'N/A'
+        return 'failed', 'Connection timed out', 'N/A', None
     except ConnectionRefusedError:
         # this error occurs if the server is reachable but actively refuses the connection.
         logger.error(f"Connection refused for {hostname}.")
-        return 'failed', 'Connection refused', 'N/A'
+        return 'failed', 'Connection refused', 'N/A', None
     except Exception as e:
         # a general catch-all for any other unexpected errors.
         # we log the specific error for debugging but return a generic message to the user.
         logger.error(f"An unexpected error occurred during certificate check for {hostname}: {e}")
-        return 'failed', 'An unknown error occurred', 'N/A'
+        return 'failed', 'An unknown error occurred', 'N/A', None
 
     
     
 
-def check_domain_status(domain: str):
+def first_hop_redirects(chain: tuple) -> bool:
+    # the requested URL still answers, with a redirect to the cached second hop.
+    # a GET (body not read), since some hosts refuse HEAD or redirect it elsewhere.
+    try:
+        with requests.get(chain[0], timeout=5, allow_redirects=False, verify=False, stream=True) as response:
+            return response.next is not None and response.next.url == chain[1]
+    except requests.exceptions.RequestException as e:
+        logger.debug(f"first hop {chain[0]} failed ({e}), walking the redirects again.")
+        return False
+
+def fetch(domain: str):
+    """
+    Requests the domain's page (headers only, the body is streamed).
+    A domain whose redirect chain is cached as stable (and has at least one hop
+    in between to save) is checked at its first hop (which must still redirect
+    to the cached second hop, so an outage of the requested host is never
+    hidden) and then requested at its final URL directly, skipping the hops in
+    between. If either answers differently, with an error or not at all, the
+    chain is walked again from the start, as it is every REDIRECT_REVALIDATE
+    seconds. A first hop that answers differently also makes the chain
+    unstable, so it is not probed directly again until it was walked
+    unchanged REDIRECT_STABLE_AFTER more times.
+           Returns:
+        (response, redirect chain) - the chain is () when there are no redirects.
+    """
+    target = redirect_cache.target(domain)
+    chain = redirect_cache.chain(domain) if target is not None else ()
+    if chain and not first_hop_redirects(chain):
+        redirect_cache.unsettle(domain)
+    elif chain:
+        try:
+            response = requests.get(target, timeout=5, allow_redirects=False, verify=False, stream=True)
+            if not response.is_redirect and response.status_code < 400:
+                redirect_cache.hit(domain)
+                return response, chain
+            response.close()
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"direct probe of {target} for {domain} failed ({e}), walking the redirects again.")
+    response = requests.get(f'https://{domain}', timeout=5, allow_redirects=True, verify=False, stream=True)
+    chain, _ = redirect_cache.record(domain, redirect_chain(response))
+    return response, chain
+
+def check_domain_status(domain: str, assertions=None):
     """
     Checks the status of a single domain using HTTPS. It gets the HTTP
     status code even if the certificate is invalid, while still checking
     the certificate status separately.
+    The domain's assertions (expected text, max response time ...), a tuple of
+    Assertions, default to the ones its owners registered in
+    assertions.domain_assertions. Every owner's set is evaluated on the same
+    response and kept in result.assertion_outcomes. The body is only read
+    (once) when an assertion needs it.
            Returns:
-        A dictionary containing the check results.
+        A CheckResult (result.to_dict() gives the API's dictionary form).
     """
     logger.debug(f"Starting status check for {domain}")
-    result = {
-        'domain': domain,
-        'status_code': 'N/A',      
-        'certificate_status': 'N/A',
-        'certificate_expiry': 'N/A',
-        'issuer': 'N/A'
-    }
+    result = CheckResult(domain)
+    if assertions is None:
+        assertions = domain_assertions.get(domain)
 
-    try:
-        # we can use verify=False to get the status code even if the certificate is invalid.
-        # the separate get_certificate_info call will still give us the real certificate status.
-        response = requests.get(f'https://{domain}', timeout=5, allow_redirects=True, verify=False)
-        result['status_code'] = response.status_code
-
-        # response.url.split('/')[2] is a safe way to get the final hostname after redirects.
-        final_hostname = response.url.split('/')[2]
-        cert_status, cert_expiry, issuer = get_certificate_info(final_hostname)
-        result['certificate_status'] = cert_status
-        result['certificate_expiry'] = cert_expiry
-        result['issuer'] = issuer
-        
-    except requests.exceptions.RequestException as e:
-        # this will now only catch connection errors, not SSL certificate errors.
-        logger.error(f"HTTPS check for {domain} failed: {e}.")
-        result['status_code'] = 'FAILED'
-            
-    logger.info(f"Successfully checked {domain}. Status: {result['status_code']}.")
+    # joins the caller's trace if there is one (see tracing.py), a no-op unless tracing is on.
+    with trace_check(domain):
+        try:
+            # we can use verify=False to get the status code even if the certificate is invalid.
+            # the separate get_certificate_info call will still give us the real certificate status.
+            # stream=True: only the headers are fetched, the body is read by the assertions (if any).
+            with span('http'):
+                started = time.perf_counter()
+                response, result.redirects = fetch(domain)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+            with response:
+                result.status_code = response.status_code
+                if assertions:
+                    with span('body'):
+                        outcomes = evaluate_all(assertions, response, elapsed_ms)
+                    result.assertion_outcomes = tuple(
+                        (a.key, sys.intern(error) if error else None, body_hash)
+                        for a, (error, body_hash) in zip(assertions, outcomes))
+
+            # the certificate that matters is the one of the host the redirects end on.
+            final_hostname = hostname_of(response.url)
+            with span('tls'):
+                cert_status, cert_expiry, issuer, posture = get_tls_report(final_hostname)
+            result.cert_status = CertStatus(cert_status)
+            result.issuer = sys.intern(issuer)
+            if posture:
+                result.cert_expiry = posture['leaf']['not_after']
+                result.tls = TlsSummary.from_posture(posture)
+            else:
+                # on failure the expiry field carries the reason ('Connection timed out', ...).
+                result.cert_error = sys.intern(cert_expiry)
+
+        except requests.exceptions.RequestException as e:
+            # this will now only catch connection errors, not SSL certificate errors.
+            logger.error(f"HTTPS check for {domain} failed: {e}.")
+            result.status_code = STATUS_FAILED
+
+    logger.info(f"Successfully checked {domain}. Status: {result.status_value()}.")
+    return result
+
+def is_failed(result) -> bool:
+    # only a failed request counts, an HTTP error status is still a real answer from the server.
+    return result.failed
+
+def retry_delay(attempt: int) -> float:
+    # exponential backoff with jitter: ~0.5s, ~1s, ~2s ... capped at RETRY_MAX_DELAY.
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def confirm_failure(domain: str, attempts: int = CONFIRM_ATTEMPTS, limiter=None):
+    """
+    Re-probes a domain whose first check failed, with backoff between attempts.
+    The domain is only reported as FAILED if every attempt fails, so a transient
+    blip does not flip it to "down".
+           Returns:
+        The first successful result, or the last failed one.
+    """
+    limiter = limiter or host_limiter
+    result = None
+    for attempt in range(2, attempts + 1):
+        time.sleep(retry_delay(attempt - 1))
+        with trace_check(domain), limiter.slot(domain):
+            result = check_domain_status(domain)
+        result.attempts = attempt
+        if not is_failed(result):
+            logger.info(f"{domain} recovered on attempt {attempt}, first failure was transient.")
+            return result
+    logger.warning(f"{domain} failed {attempts} consecutive checks, reporting it as down.")
     return result
 
-def check_domains_concurrently(domains):
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        results = list(executor.map(check_domain_status, domains))
-        return results
\ No newline at end of file
+def iter_domain_checks(domains, max_workers=10, spread_over=0, limiter=None,
+                       confirm_attempts=CONFIRM_ATTEMPTS):
+    """
+    Checks many domains in a thread pool while staying polite per host group,
+    yielding each result as soon as it is final (so callers can stream them).
+    domains are interleaved across zones, every check waits for its group's
+    token bucket, and with spread_over > 0 the checks are spread evenly
+    (with jitter) across that many seconds instead of bursting.
+    A failed check is re-probed in a separate retry lane and only reported
+    as FAILED after `confirm_attempts` consecutive failures.
+    """
+    limiter = limiter or host_limiter
+    ordered = limiter.interleave(list(dict.fromkeys(domains)))
+    start = time.monotonic()
+    offsets = dict(zip(ordered, spread_offsets(len(ordered), spread_over)))
+
+    def polite_check(domain):
+        delay = start + offsets[domain] - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        with trace_check(domain), limiter.slot(domain):
+            return check_domain_status(domain)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            ThreadPoolExecutor(max_workers=RETRY_WORKERS, thread_name_prefix='retry') as retry_lane:
+        # finished checks are handed over by their done callbacks, so each one is picked up in O(1)
+        # and retries join the same stream, the pending checks are never scanned again.
+        finished = queue.SimpleQueue()
+        pending = 0
+
+        def submit(pool, *args):
+            nonlocal pending
+            pending += 1
+            pool.submit(*args).add_done_callback(finished.put)
+
+        for domain in ordered:
+            submit(executor, polite_check, domain)
+        while pending:
+            result = finished.get().result()
+            pending -= 1
+            # failures are confirmed in the retry lane right away, not after the whole batch.
+            if is_failed(result) and result.attempts == 1 and confirm_attempts > 1:
+                submit(retry_lane, confirm_failure, result.domain, confirm_attempts, limiter)
+                continue
+            yield result
+
+def check_domains_concurrently(domains, max_workers=10, spread_over=0, limiter=None,
+                               confirm_attempts=CONFIRM_ATTEMPTS):
+    """
+    Checks many domains concurrently, see iter_domain_checks.
+    Returns:
+        A list of CheckResults, in the same order as `domains`.
+    """
+    results = {result.domain: result for result in
+               iter_domain_checks(domains, max_workers, spread_over, limiter, confirm_attempts)}
+    return [results[domain] for domain in domains]
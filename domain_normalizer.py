@@ -0,0 +1,114 @@
+import re
+
+
+MAX_DOMAIN_LENGTH = 253
+
+# already-normalized input (lowercase ascii, no scheme/path) skips all the stripping work.
+FAST_PATH = re.compile(r'^[a-z0-9.-]+$')
+
+# scheme ("https://"), then userinfo ("user:pass@"), then the host, then port/path/query/fragment.
+URL_PARTS = re.compile(r'^(?:[a-zA-Z][a-zA-Z0-9+.-]*://)?(?:[^@/?#]*@)?([^/?#:]*)')
+
+# one label: 1-63 chars, letters/digits/hyphens, no hyphen at the ends.
+# the TLD is letters only, or a punycode TLD (xn--...).
+DOMAIN_REGEX = re.compile(
+    r'^(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+'
+    r'(?:[a-z]{2,63}|xn--[a-z0-9-]{1,59})$'
+)
+
+# public suffixes with more than one label. a registered domain sits one label
+# below these (example.co.uk), and a bare suffix (co.uk) is not a valid domain.
+# this is the commonly used part of the Public Suffix List, not the whole list.
+MULTI_LABEL_SUFFIXES = frozenset({
+    'co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'ltd.uk', 'plc.uk', 'me.uk', 'net.uk', 'sch.uk',
+    'com.au', 'net.au', 'org.au', 'edu.au', 'gov.au', 'id.au',
+    'co.nz', 'org.nz', 'net.nz', 'govt.nz',
+    'co.il', 'org.il', 'ac.il', 'gov.il', 'net.il', 'muni.il',
+    'co.jp', 'ne.jp', 'or.jp', 'ac.jp', 'go.jp',
+    'com.br', 'net.br', 'org.br', 'gov.br',
+    'com.cn', 'net.cn', 'org.cn', 'gov.cn', 'edu.cn',
+    'co.in', 'net.in', 'org.in', 'gov.in', 'ac.in',
+    'co.za', 'org.za', 'gov.za',
+    'com.mx', 'com.ar', 'com.tr', 'com.sg', 'com.hk', 'com.tw', 'co.kr', 'or.kr',
+    'github.io', 'herokuapp.com', 'azurewebsites.net', 'cloudfront.net', 'appspot.com',
+})
+
+INVALID_FORMAT = "Invalid domain format. Please use a format like 'example.com'."
+
+
+def _to_ascii(host: str) -> str:
+    # punycode-encodes non-ascii labels (bücher.de -> xn--bcher-kva.de).
+    # idna (IDNA 2008, in requirements.txt) has big tables, so it is only imported for non-ascii input.
+    # without it we fall back to the stdlib IDNA 2003 codec.
+    try:
+        import idna
+    except ImportError:
+        return host.encode('idna').decode('ascii')
+    return idna.encode(host, uts46=True).decode('ascii')
+
+
+def public_suffix(domain: str) -> str:
+    labels = domain.split('.')
+    if len(labels) >= 2 and '.'.join(labels[-2:]) in MULTI_LABEL_SUFFIXES:
+        return '.'.join(labels[-2:])
+    return labels[-1]
+
+
+def registered_domain(domain: str) -> str:
+    """
+    returns the registrable "zone" of a domain:
+    'api.shop.example.com' -> 'example.com', 'www.example.co.uk' -> 'example.co.uk'.
+    """
+    domain = domain.lower().rstrip('.')
+    suffix = public_suffix(domain)
+    labels = domain[:-len(suffix)].rstrip('.').split('.') if domain != suffix else []
+    if not labels or not labels[-1]:
+        return domain
+    return f"{labels[-1]}.{suffix}"
+
+
+def normalize_domain(raw):
+    """
+    turns user input into the one canonical form we store and check.
+    strips scheme, credentials, port, path and the trailing dot, lowercases,
+    and punycode-encodes international names, then validates the result.
+    'https://Example.com./login' -> 'example.com'
+    returns: (domain, None) if valid, otherwise (None, error message).
+    """
+    if not isinstance(raw, str):
+        return None, INVALID_FORMAT
+    host = raw.strip()
+    if not FAST_PATH.match(host):
+        match = URL_PARTS.match(host)
+        host = match.group(1) if match else ''
+        # lower(), not casefold(): casefold maps ß to ss and ς to σ, which names a different
+        # domain under IDNA 2008. the remaining case mapping is left to UTS 46 (see _to_ascii).
+        host = host.lower()
+        if not host.isascii():
+            try:
+                host = _to_ascii(host.rstrip('.'))
+            except (UnicodeError, ValueError):
+                return None, INVALID_FORMAT
+    host = host.rstrip('.')
+
+    if not host or len(host) > MAX_DOMAIN_LENGTH or not DOMAIN_REGEX.match(host):
+        return None, INVALID_FORMAT
+    if host in MULTI_LABEL_SUFFIXES:
+        return None, f"'{host}' is a public suffix, not a domain you can monitor."
+    return host, None
+
+
+def normalize_domains(raws) -> list:
+    """
+    batch version of normalize_domain for bulk ingestion.
+    repeated inputs in one batch are only normalized once.
+    returns a list of (domain, error) tuples in input order.
+    """
+    seen = {}
+    results = []
+    for raw in raws:
+        key = raw if isinstance(raw, str) else None
+        if key not in seen:
+            seen[key] = normalize_domain(raw)
+        results.append(seen[key])
+    return results
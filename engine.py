@@ -0,0 +1,383 @@
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from check_result import CheckResult
+from domain_checker import check_domain_status, host_limiter, is_failed, retry_delay, CONFIRM_ATTEMPTS, RETRY_WORKERS
+from logs import logger
+from rate_limiter import spread_offsets
+from scheduler import CheckScheduler, PRIORITIES, normalize_priority, normalize_interval
+from snapshot import read_snapshot, write_snapshot, SNAPSHOT_INTERVAL
+from tls_inspector import cert_cache
+from redirects import redirect_cache
+from tracing import trace_check
+from assertions import domain_assertions
+
+
+# how many checks the background engine runs at once.
+ENGINE_WORKERS = 10
+# at boot, first checks are spread over this many seconds instead of all at once.
+STARTUP_SPREAD = 300
+# upper bound for one idle sleep, so stop() and new domains are noticed quickly.
+MAX_IDLE_SLEEP = 5
+
+
+class MonitorEngine:
+    """
+    background check engine.
+    every monitored domain (from all users) sits in a CheckScheduler,
+    the engine thread pulls due work as worker capacity frees up and keeps
+    the latest result per domain in memory.
+    """
+
+    def __init__(self, max_workers: int = ENGINE_WORKERS, limiter=None, probe=None, snapshot_path=None):
+        self.max_workers = max_workers
+        self.limiter = limiter or host_limiter
+        # probe(domain) -> CheckResult, or None when it cannot decide (the previous result stays).
+        # e.g. a vantage.MultiVantageChecker to check from several locations.
+        self.probe = probe or check_domain_status
+        self.scheduler = CheckScheduler()
+        self.results = {}  # domain -> latest CheckResult
+        self._owners = {}  # domain -> {username: (priority, interval)}
+        self._user_domains = {}  # username -> set of domains
+        self._failures = {}  # domain -> consecutive failed probes
+        self._retries = []  # (due, domain) heap for the confirmation lane
+        self._listeners = []  # called with (usernames, domain, result, previous) on every change
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._retry_executor = None
+        # with a snapshot_path, the state is saved every SNAPSHOT_INTERVAL seconds and on stop().
+        self.snapshot_path = snapshot_path
+        self._snapshot_thread = None
+        # snapshot state waiting for its domain to be scheduled again, kept until start().
+        self._restored = {}  # domain -> CheckResult state tuple
+        self._restored_failures = {}  # domain -> failure streak
+        self._restored_due = {}  # domain -> next_due
+        self._restored_redirects = {}  # domain -> (chain, seen, walked_at), see RedirectCache.export
+
+    # ---------------------------------------------------------------
+    # which domains we monitor
+    # ---------------------------------------------------------------
+
+    def sync_user(self, username: str, records: list, stagger: bool = False, quota=None):
+        """
+        makes the schedule match the user's current domain list.
+        a domain shared by several users is checked at the most important
+        priority and the shortest interval any of them asked for.
+        with stagger=True, new domains get their first check spread out
+        instead of all being due now (used when loading everything at boot).
+        quota (see user_management.get_user_quota) sets the user's minimum
+        interval and fair-share weight. the records' content assertions are
+        registered in assertions.domain_assertions for the probe.
+        """
+        domain_assertions.sync_user(username, records)
+        min_interval = quota['min_interval'] if quota else 0
+        if quota:
+            self.scheduler.set_weight(username, quota['weight'])
+        wanted = {}
+        for record in records:
+            domain = record.get('domain')
+            if not domain:
+                continue
+            priority = normalize_priority(record.get('priority'))
+            wanted[domain] = (priority, max(normalize_interval(priority, record.get('interval')), min_interval))
+
+        with self._lock:
+            previous = self._user_domains.get(username, set())
+            touched = set(wanted) | previous
+            for domain in previous - set(wanted):
+                self._owners.get(domain, {}).pop(username, None)
+            for domain, settings in wanted.items():
+                self._owners.setdefault(domain, {})[username] = settings
+            self._user_domains[username] = set(wanted)
+
+            new_domains = [d for d in touched if d in wanted and d not in self.scheduler]
+            now = time.time()
+            resume_at = self._apply_restored(new_domains, now) if self._restored or self._restored_due else {}
+            # everything without a future due time from a snapshot is spread out when staggering.
+            spread = [d for d in new_domains if d not in resume_at]
+            offsets = dict(zip(spread, spread_offsets(len(spread), STARTUP_SPREAD))) if stagger else {}
+            for domain in touched:
+                owners = self._owners.get(domain)
+                if not owners:
+                    self._owners.pop(domain, None)
+                    self.scheduler.unschedule(domain)
+                    self.results.pop(domain, None)
+                    self._failures.pop(domain, None)
+                    redirect_cache.forget(domain)
+                    continue
+                priority = min((p for p, _ in owners.values()), key=PRIORITIES.get)
+                interval = min(i for _, i in owners.values())
+                first_due = now + offsets[domain] if domain in offsets else None
+                if domain in resume_at:
+                    first_due = min(resume_at[domain], now + interval)
+                # a shared domain is charged to its lightest owner, so popular domains don't count against small users.
+                tenant = min(owners, key=lambda name: (len(self._user_domains.get(name, ())), name))
+                self.scheduler.schedule(domain, priority, interval, first_due=first_due, tenant=tenant)
+        self._wake.set()
+
+    def _apply_restored(self, domains: list, now: float) -> dict:
+        # called under self._lock: brings back the snapshot's result, failure streak and
+        # redirect chain for newly scheduled domains. returns {domain: next_due} for those still due
+        # in the future; overdue ones are left to the startup spread.
+        resume_at = {}
+        redirects = []
+        for domain in domains:
+            state = self._restored.pop(domain, None)
+            if state is not None:
+                # decoded only now, so a big snapshot loads without building every result up front.
+                self.results[domain] = CheckResult.from_state(state)
+            streak = self._restored_failures.pop(domain, 0)
+            if streak:
+                self._failures[domain] = streak
+            next_due = self._restored_due.pop(domain, None)
+            if next_due is not None and next_due > now:
+                resume_at[domain] = next_due
+            redirect = self._restored_redirects.pop(domain, None)
+            if redirect is not None:
+                redirects.append((domain,) + redirect)
+        if redirects:
+            redirect_cache.load(redirects)
+        return resume_at
+
+    def check_now(self, domains: list) -> list:
+        """
+        makes already-scheduled domains due immediately (keeping their priority).
+        a domain that is being checked right now is checked again once that check is done.
+        returns the domains that were queued, domains the engine does not schedule (yet) are left out.
+        """
+        queued = []
+        now = time.time()
+        for domain in domains:
+            entry = self.scheduler.entry(domain)
+            if entry is not None:
+                self.scheduler.schedule(domain, entry.priority, entry.interval, first_due=now, tenant=entry.tenant)
+                queued.append(domain)
+        self._wake.set()
+        return queued
+
+    def latest(self, domains: list) -> dict:
+        """returns {domain: latest result} for the domains we already have results for."""
+        return {d: self.results[d] for d in domains if d in self.results}
+
+    def add_listener(self, callback):
+        """
+        registers callback(usernames, domain, result, previous) to be called when a
+        domain's published result changes (previous is None for its first result).
+        usernames are the domain's owners. callbacks run on the engine's worker
+        threads, so they must be quick and must not block.
+        """
+        self._listeners.append(callback)
+
+    def usage(self, username: str) -> dict:
+        """the user's share of the engine: checks run, time spent checking and average scheduling lag."""
+        return self.scheduler.usage.report(username)
+
+    def metrics(self) -> dict:
+        return {
+            'domains': len(self.scheduler),
+            'workers': self.max_workers,
+            'in_flight': self._in_flight,
+            'pending_retries': len(self._retries),
+            'unconfirmed_failures': sum(1 for n in self._failures.values() if n < CONFIRM_ATTEMPTS),
+            'priorities': self.scheduler.metrics(),
+            'vantages': self.probe.stats() if hasattr(self.probe, 'stats') else None,
+            'redirects': redirect_cache.stats(),
+        }
+
+    # ---------------------------------------------------------------
+    # snapshots (warm restart)
+    # ---------------------------------------------------------------
+
+    def export_state(self) -> dict:
+        """
+        the engine state as plain builtins: latest results, failure streaks,
+        each domain's next due time, the parsed-certificate cache and the redirect chains.
+        """
+        with self._lock:
+            failures = dict(self._failures)
+        results = [result.to_state() for result in list(self.results.values())]
+        schedule = {}
+        for domain in self.scheduler.domains():
+            entry = self.scheduler.entry(domain)
+            if entry is not None:
+                schedule[domain] = entry.next_due
+        return {'results': results, 'failures': failures, 'schedule': schedule, 'certificates': cert_cache.export(),
+                'redirects': redirect_cache.export()}
+
+    def restore_state(self, state: dict) -> int:
+        """
+        warm start from export_state() output. call it before the first sync_user():
+        each domain gets its result, failure streak and schedule position back
+        when a sync schedules it, so it is served right away and not re-checked
+        until it is due (domains that became due while we were down are spread
+        over STARTUP_SPREAD). leftovers for domains nobody monitors any more are
+        dropped on start(). returns how many domains were restored.
+        """
+        with self._lock:
+            self._restored = {state_tuple[0]: state_tuple for state_tuple in state.get('results', ())}
+            self._restored_failures = dict(state.get('failures', {}))
+            self._restored_due = dict(state.get('schedule', {}))
+            self._restored_redirects = {domain: (chain, seen, walked_at)
+                                        for domain, chain, seen, walked_at in state.get('redirects', ())}
+            restored = len(self._restored_due) or len(self._restored)
+        cert_cache.load(state.get('certificates', ()))
+        return restored
+
+    def load_snapshot(self) -> int:
+        # restores from snapshot_path if there is a usable snapshot, returns how many domains were restored.
+        if not self.snapshot_path:
+            return 0
+        start = time.monotonic()
+        state = read_snapshot(self.snapshot_path)
+        if state is None:
+            return 0
+        restored = self.restore_state(state)
+        logger.info(f"restored {restored} domains from {self.snapshot_path} in {time.monotonic() - start:.3f}s.")
+        return restored
+
+    def save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        start = time.monotonic()
+        try:
+            size = write_snapshot(self.snapshot_path, self.export_state())
+        except (OSError, ValueError) as e:
+            logger.error(f"could not write engine snapshot {self.snapshot_path}: {e}")
+            return
+        logger.debug(f"engine snapshot written: {len(self.results)} results, {size} bytes in {time.monotonic() - start:.3f}s.")
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(SNAPSHOT_INTERVAL):
+            self.save_snapshot()
+
+    # ---------------------------------------------------------------
+    # engine loop
+    # ---------------------------------------------------------------
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        with self._lock:
+            leftover = set(self._restored) | set(self._restored_due)
+            if leftover:
+                logger.info(f"dropping {len(leftover)} restored domains that are no longer monitored.")
+            self._restored, self._restored_failures, self._restored_due = {}, {}, {}
+            self._restored_redirects = {}
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='engine')
+        self._retry_executor = ThreadPoolExecutor(max_workers=RETRY_WORKERS, thread_name_prefix='engine-retry')
+        self._thread = threading.Thread(target=self._run, name='monitor-engine', daemon=True)
+        self._thread.start()
+        if self.snapshot_path:
+            self._snapshot_thread = threading.Thread(target=self._snapshot_loop, name='engine-snapshot', daemon=True)
+            self._snapshot_thread.start()
+        logger.info(f"monitor engine started with {self.max_workers} workers.")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=MAX_IDLE_SLEEP)
+        if self._snapshot_thread:
+            self._snapshot_thread.join(timeout=MAX_IDLE_SLEEP)
+        if self._thread:
+            # only a started engine has state worth saving, never overwrite a good snapshot with an empty one.
+            self.save_snapshot()
+        for executor in (self._executor, self._retry_executor):
+            if executor:
+                executor.shutdown(wait=False)
+        logger.info("monitor engine stopped.")
+
+    def _run(self):
+        while not self._stop.is_set():
+            # clear first, so a wake-up that arrives while we work is not lost.
+            self._wake.clear()
+            # confirmation retries have their own lane, they never wait for main capacity.
+            for domain in self._due_retries():
+                self._retry_executor.submit(self._check, domain, False)
+            with self._lock:
+                capacity = self.max_workers - self._in_flight
+            batch = self.scheduler.next_batch(capacity) if capacity > 0 else []
+            for entry in batch:
+                with self._lock:
+                    self._in_flight += 1
+                self._executor.submit(self._check, entry.domain, True)
+            if batch:
+                continue
+            # nothing to dispatch: sleep until something is due, capacity frees up or we are woken.
+            sleep_for = MAX_IDLE_SLEEP if capacity <= 0 else self.scheduler.seconds_until_next()
+            with self._lock:
+                if self._retries:
+                    sleep_for = min(sleep_for, self._retries[0][0] - time.time())
+            self._wake.wait(max(min(sleep_for, MAX_IDLE_SLEEP), 0))
+
+    def _due_retries(self) -> list:
+        now = time.time()
+        due = []
+        with self._lock:
+            while self._retries and self._retries[0][0] <= now:
+                due.append(heapq.heappop(self._retries)[1])
+        return due
+
+    def _check(self, domain: str, main_lane: bool):
+        result = None
+        start = time.monotonic()
+        try:
+            with trace_check(domain), self.limiter.slot(domain):
+                result = self.probe(domain)
+        except Exception as e:
+            logger.error(f"engine check for {domain} crashed: {e}")
+        finally:
+            entry = self.scheduler.entry(domain)
+            if entry is not None:
+                self.scheduler.usage.finished(entry.tenant, time.monotonic() - start)
+            if main_lane:
+                with self._lock:
+                    self._in_flight -= 1
+        try:
+            if result is not None:
+                self._record(domain, result)
+            else:
+                self.scheduler.complete(domain)
+        finally:
+            self._wake.set()
+
+    def _record(self, domain: str, result):
+        """
+        stores a probe result. a failure is only published after CONFIRM_ATTEMPTS
+        consecutive failed probes; until then the previous result stays visible,
+        and the domain is re-probed quickly in the retry lane (it stays "in flight"
+        for the scheduler meanwhile, so it is not also dispatched normally).
+        """
+        if is_failed(result):
+            with self._lock:
+                streak = self._failures.get(domain, 0) + 1
+                self._failures[domain] = streak
+                if streak < CONFIRM_ATTEMPTS and domain in self.scheduler:
+                    heapq.heappush(self._retries, (time.time() + retry_delay(streak), domain))
+                    logger.info(f"{domain} failed probe {streak}/{CONFIRM_ATTEMPTS}, confirming before marking down.")
+                    return
+            result.attempts = streak
+        else:
+            with self._lock:
+                self._failures.pop(domain, None)
+        if domain in self.scheduler:
+            previous = self.results.get(domain)
+            self.results[domain] = result
+            if self._listeners and (previous is None or result.changed_from(previous)):
+                self._notify(domain, result, previous)
+        self.scheduler.complete(domain)
+
+    def _notify(self, domain: str, result, previous):
+        with self._lock:
+            usernames = list(self._owners.get(domain, ()))
+        for callback in self._listeners:
+            try:
+                callback(usernames, domain, result, previous)
+            except Exception as e:
+                logger.error(f"change listener failed for {domain}: {e}")
@@ -0,0 +1,369 @@
+import bisect
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+import data_manager
+from assertions import domain_assertions
+from logs import logger
+
+try:
+    import fcntl  # cross-process file locks, POSIX only.
+except ImportError:
+    fcntl = None
+
+
+# an append-only log of what changed (domains added / removed, status transitions,
+# certificate renewals ...), so consumers can follow changes by offset instead of
+# polling and diffing whole domain lists.
+#
+# the log is a directory of segment files named after the offset of their first
+# event (00000000000000004096.seg). each event is one record:
+#     4 bytes payload length, 4 bytes crc32 of the payload (big-endian), payload
+# where the payload is compact JSON: [time, type, domain, users, data].
+# offsets count events from the start of the log, they never change or get reused.
+
+EVENT_LOG_DIR_NAME = 'events'
+SEGMENT_SUFFIX = '.seg'
+# a new segment is started once the active one is this big ...
+SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+# ... and the oldest segments are deleted beyond this many (about 256 MB).
+EVENT_LOG_MAX_SEGMENTS = 64
+# the most events one read() returns.
+EVENT_READ_LIMIT = 1000
+# how often (seconds) wait() looks for new events, the writer may be another process.
+EVENT_POLL_INTERVAL = 0.5
+# reads remember the byte position of every this many-th record of a segment,
+# so reading from an offset deep in a segment does not walk it from the start.
+EVENT_INDEX_STRIDE = 256
+
+_HEADER = struct.Struct('>II')
+
+# event types
+DOMAIN_ADDED = 'domain_added'
+DOMAIN_REMOVED = 'domain_removed'
+STATUS_CHANGED = 'status_changed'
+CERT_RENEWED = 'cert_renewed'
+CERT_CHANGED = 'cert_changed'
+CONTENT_CHANGED = 'content_changed'
+REDIRECTS_CHANGED = 'redirects_changed'
+
+
+def event_log_dir() -> str:
+    # resolved at call time, so it follows data_manager.DATA_DIR.
+    return os.environ.get('MONITOR_EVENT_LOG') or os.path.join(data_manager.DATA_DIR, EVENT_LOG_DIR_NAME)
+
+
+def _segment_name(base: int) -> str:
+    return f"{base:020d}{SEGMENT_SUFFIX}"
+
+
+def encode_event(event_type: str, domain: str, users, data=None, at: float = None) -> bytes:
+    payload = json.dumps([round(at or time.time(), 3), event_type, domain, sorted(users), data or {}],
+                         separators=(',', ':')).encode('utf-8')
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class EventLog:
+    """
+    the segmented change log in one directory. append() is safe across threads
+    and processes (the web app and worker.py both write to it); read() and
+    wait() never block writers.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # what we know about the active (last) segment: (base offset, bytes, events).
+        # another process may have appended since, see _sync_active().
+        self._active = None
+        # segment base -> byte positions of records base, base + EVENT_INDEX_STRIDE, ...
+        # records never move once complete, so the positions stay valid.
+        self._index = {}
+
+    def _path(self, base: int) -> str:
+        return os.path.join(self.directory, _segment_name(base))
+
+    def _segments(self) -> list:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        stems = (name[:-len(SEGMENT_SUFFIX)] for name in names if name.endswith(SEGMENT_SUFFIX))
+        return sorted(int(stem) for stem in stems if stem.isdigit())
+
+    def _scan(self, path: str, position: int):
+        # counts the complete records from byte position on.
+        # returns (end of the last complete record, records counted, whether the file ended cleanly).
+        count = 0
+        with open(path, 'rb') as f:
+            f.seek(position)
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return position, count, not header
+                length, crc = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    return position, count, False
+                position += _HEADER.size + length
+                count += 1
+
+    def _sync_active(self, repair: bool):
+        # caller holds self._lock. brings self._active up to date with the disk.
+        # with repair=True (the caller also holds the file lock) a torn last record,
+        # left by a crash mid-append, is cut off.
+        bases = self._segments()
+        if not bases:
+            self._active = None
+            return None
+        base = bases[-1]
+        path = self._path(base)
+        size = os.path.getsize(path)
+        known = self._active
+        if known is not None and known[0] == base and known[1] == size:
+            return known
+        position, count = (known[1], known[2]) if known is not None and known[0] == base and size > known[1] else (0, 0)
+        end, counted, clean = self._scan(path, position)
+        if not clean and repair:
+            logger.warning(f"event log segment {path} has a torn last record, cutting it off at byte {end}.")
+            with open(path, 'r+b') as f:
+                f.truncate(end)
+        self._active = (base, end, count + counted)
+        return self._active
+
+    def _file_lock(self):
+        return open(os.path.join(self.directory, '.lock'), 'a')
+
+    def append(self, records: list) -> int:
+        """
+        appends encoded events (see encode_event) in one write. returns the offset
+        after the last one. events are flushed to the OS, not fsynced one by one:
+        a crash can lose the newest events, never corrupt the older ones.
+        """
+        if not records:
+            return self.end_offset()
+        payload = b''.join(records)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with self._file_lock() as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    base, size, count = self._sync_active(repair=True) or (0, 0, 0)
+                    if size >= SEGMENT_MAX_BYTES:
+                        with open(self._path(base), 'rb') as f:
+                            os.fsync(f.fileno())
+                        base, size, count = base + count, 0, 0
+                    with open(self._path(base), 'ab') as f:
+                        f.write(payload)
+                        f.flush()
+                    self._active = (base, size + len(payload), count + len(records))
+                    if size == 0:
+                        self._apply_retention()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            return base + count + len(records)
+
+    def _apply_retention(self):
+        bases = self._segments()
+        for base in bases[:max(0, len(bases) - EVENT_LOG_MAX_SEGMENTS)]:
+            try:
+                os.remove(self._path(base))
+            except FileNotFoundError:
+                pass
+            logger.info(f"event log: dropped segment {_segment_name(base)} (retention).")
+
+    def _indexed_position(self, base: int, offset: int):
+        # (offset, byte position) of the closest known record at or before offset in a segment.
+        with self._lock:
+            marks = self._index.get(base)
+            if not marks:
+                return base, 0
+            slot = min((offset - base) // EVENT_INDEX_STRIDE, len(marks) - 1)
+            return base + slot * EVENT_INDEX_STRIDE, marks[slot]
+
+    def _remember_position(self, base: int, current: int, position: int):
+        # records the byte position of record current if it is the next one the index needs.
+        if (current - base) % EVENT_INDEX_STRIDE:
+            return
+        with self._lock:
+            marks = self._index.setdefault(base, [0])
+            if len(marks) == (current - base) // EVENT_INDEX_STRIDE:
+                marks.append(position)
+
+    def first_offset(self) -> int:
+        # the oldest offset still kept, older events were dropped by retention.
+        bases = self._segments()
+        return bases[0] if bases else 0
+
+    def end_offset(self) -> int:
+        # the offset the next event will get.
+        with self._lock:
+            active = self._sync_active(repair=False)
+        return active[0] + active[2] if active else 0
+
+    def read(self, offset: int, limit: int = EVENT_READ_LIMIT):
+        """
+        the events from offset on, oldest first, at most limit of them.
+        an offset older than first_offset() starts at the oldest kept event.
+                Returns:
+            (events, next_offset): event dicts (offset, time, type, domain, users, data)
+            and the offset to continue from.
+        """
+        bases = self._segments()
+        if not bases:
+            return [], offset
+        with self._lock:
+            for dropped in [base for base in self._index if base < bases[0]]:
+                del self._index[dropped]
+        offset = max(offset, bases[0])
+        events = []
+        index = max(0, bisect.bisect_right(bases, offset) - 1)
+        while index < len(bases) and len(events) < limit:
+            base = bases[index]
+            try:
+                current, complete = self._read_segment(base, offset, limit - len(events), events)
+            except FileNotFoundError:
+                # dropped by retention while we read, go on with the next segment.
+                current, complete = offset, True
+            offset = max(current, offset)
+            if not complete:
+                break
+            index += 1
+            if index < len(bases):
+                offset = max(offset, bases[index])
+        return events, offset
+
+    def _read_segment(self, base: int, offset: int, limit: int, events: list):
+        # appends up to limit events from offset on to events.
+        # returns (next offset, True if the segment was read to its end).
+        current, position = self._indexed_position(base, offset)
+        with open(self._path(base), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            f.seek(position)
+            # skip to the wanted offset by reading headers only.
+            while current < offset:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return current, True
+                length, _ = _HEADER.unpack(header)
+                if position + _HEADER.size + length > size:
+                    return current, False  # a record being written right now
+                position += _HEADER.size + length
+                f.seek(position)
+                current += 1
+                self._remember_position(base, current, position)
+            while len(events) < limit:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return current, not header
+                length, crc = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    return current, False
+                at, event_type, domain, users, data = json.loads(payload)
+                events.append({'offset': current, 'time': at, 'type': event_type, 'domain': domain,
+                               'users': users, 'data': data})
+                position += _HEADER.size + length
+                current += 1
+                self._remember_position(base, current, position)
+        return current, False
+
+    def wait(self, offset: int, timeout: float) -> bool:
+        # waits until there is an event at offset or later. True if there is one.
+        deadline = time.monotonic() + timeout
+        while self.end_offset() <= offset:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(EVENT_POLL_INTERVAL, remaining))
+        return True
+
+    def stats(self) -> dict:
+        bases = self._segments()
+        return {'segments': len(bases), 'first_offset': bases[0] if bases else 0, 'end_offset': self.end_offset()}
+
+
+_logs = {}
+_logs_guard = threading.Lock()
+
+
+def get_event_log() -> EventLog:
+    # one EventLog per directory and process, so appends share the active-segment bookkeeping.
+    directory = event_log_dir()
+    with _logs_guard:
+        log = _logs.get(directory)
+        if log is None:
+            log = _logs[directory] = EventLog(directory)
+        return log
+
+
+def publish(records: list):
+    # appends events; a failing event log is logged, it never fails the change itself.
+    if not records:
+        return
+    try:
+        get_event_log().append(records)
+    except OSError as e:
+        logger.error(f"could not append {len(records)} events to the event log: {e}")
+
+
+def publish_domain_ops(username: str, ops: list):
+    # data_manager hook: one event per add / remove op of a committed change.
+    now = time.time()
+    records = []
+    for op in ops:
+        if op.get('op') == 'add':
+            record = op.get('record', {})
+            settings = {key: record[key] for key in ('priority', 'interval') if key in record}
+            records.append(encode_event(DOMAIN_ADDED, record.get('domain'), (username,), settings, now))
+        elif op.get('op') == 'remove':
+            records.append(encode_event(DOMAIN_REMOVED, op.get('domain'), (username,), None, now))
+    publish(records)
+
+
+def _state(result) -> str:
+    if result.degraded:
+        return 'degraded'
+    return 'up' if result.live else 'down'
+
+
+def record_result_change(usernames, domain, result, previous):
+    """
+    MonitorEngine listener: turns a result change into events. the first result
+    of a domain is a status change from None. status and page content are told
+    apart per group of owners, each with the outcome of their own assertions.
+    """
+    now = time.time()
+    records = []
+    for owners, view in domain_assertions.views(usernames, result):
+        before = domain_assertions.seen_by(owners[0], previous) if previous is not None else None
+        if before is None or before.status_code != view.status_code or _state(before) != _state(view):
+            records.append(encode_event(STATUS_CHANGED, domain, owners, {
+                'status': view.status_value(),
+                'state': _state(view),
+                'previous_status': before.status_value() if before is not None else None,
+                'previous_state': _state(before) if before is not None else None,
+                'assertion_error': view.assertion_error,
+            }, now))
+        if before is not None and view.body_hash and before.body_hash and view.body_hash != before.body_hash:
+            records.append(encode_event(CONTENT_CHANGED, domain, owners, {
+                'body_hash': view.body_hash, 'previous_body_hash': before.body_hash}, now))
+    if previous is not None:
+        if previous.cert_expiry is not None and result.cert_expiry is not None \
+                and previous.cert_expiry != result.cert_expiry:
+            event_type = CERT_RENEWED if result.cert_expiry > previous.cert_expiry else CERT_CHANGED
+            records.append(encode_event(event_type, domain, usernames, {
+                'expiry': result.expiry_value(),
+                'previous_expiry': previous.expiry_value(),
+                'issuer': result.issuer,
+                'previous_issuer': previous.issuer,
+            }, now))
+        if result.redirects != previous.redirects and not result.failed and not previous.failed:
+            records.append(encode_event(REDIRECTS_CHANGED, domain, usernames, {
+                'redirects': list(result.redirects), 'previous_redirects': list(previous.redirects)}, now))
+    publish(records)
@@ -0,0 +1,124 @@
+import threading
+from collections import OrderedDict
+from logs import logger
+
+
+# a subscriber that falls this many distinct domains behind gets one "resync"
+# event (reload the whole list) instead of an ever growing backlog.
+MAX_PENDING_EVENTS = 1000
+# open streams allowed per user (browser tabs), the oldest one is closed beyond this.
+MAX_STREAMS_PER_USER = 5
+# how often an idle stream sends a keepalive comment, so proxies keep it open (seconds).
+HEARTBEAT_INTERVAL = 15
+
+
+class Subscription:
+    """
+    one connected dashboard.
+    pending events are coalesced per domain (only the newest state of a domain
+    is kept), so a slow client never makes the queue grow past one entry per
+    domain, and past MAX_PENDING_EVENTS it is collapsed into a single resync.
+    """
+
+    def __init__(self, username: str, max_pending: int = MAX_PENDING_EVENTS):
+        self.username = username
+        self.max_pending = max_pending
+        self.closed = False
+        self.dropped = 0
+        self._pending = OrderedDict()  # domain -> serialized event data
+        self._resync = False
+        self._ready = threading.Condition(threading.Lock())
+
+    def push(self, domain: str, data: str):
+        # called from the engine's worker threads, never blocks on the client.
+        with self._ready:
+            if self._resync:
+                self.dropped += 1
+                return
+            self._pending.pop(domain, None)
+            self._pending[domain] = data
+            if len(self._pending) > self.max_pending:
+                self.dropped += len(self._pending)
+                self._pending.clear()
+                self._resync = True
+            self._ready.notify()
+
+    def close(self):
+        with self._ready:
+            self.closed = True
+            self._ready.notify()
+
+    def wait(self, timeout: float = HEARTBEAT_INTERVAL) -> list:
+        """
+        blocks until there are events, the subscription is closed or timeout passes.
+        returns a list of (event name, data) - empty on timeout or close.
+        """
+        with self._ready:
+            if not self._pending and not self._resync and not self.closed:
+                self._ready.wait(timeout)
+            if self.closed:
+                return []
+            if self._resync:
+                self._resync = False
+                return [('resync', '{}')]
+            events = [('status', data) for data in self._pending.values()]
+            self._pending.clear()
+            return events
+
+
+class StatusBroadcaster:
+    """
+    fans status-change events out to the connected dashboards.
+    subscribers are indexed by username, so publishing a change only touches
+    the streams of the users who own that domain.
+    """
+
+    def __init__(self, max_streams_per_user: int = MAX_STREAMS_PER_USER):
+        self.max_streams_per_user = max_streams_per_user
+        self._subscribers = {}  # username -> [Subscription, ...]
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, username: str) -> Subscription:
+        subscription = Subscription(username)
+        with self._lock:
+            streams = self._subscribers.setdefault(username, [])
+            streams.append(subscription)
+            evicted = streams[:-self.max_streams_per_user]
+            del streams[:-self.max_streams_per_user]
+        for old in evicted:
+            old.close()
+        logger.debug(f"live stream opened for {username} ({len(streams)} open).")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.close()
+        with self._lock:
+            streams = self._subscribers.get(subscription.username, [])
+            if subscription in streams:
+                streams.remove(subscription)
+            if not streams:
+                self._subscribers.pop(subscription.username, None)
+
+    def has_subscribers(self, usernames) -> bool:
+        # lets the publisher skip serializing events nobody is listening to.
+        subscribers = self._subscribers
+        return any(name in subscribers for name in usernames)
+
+    def publish(self, usernames, domain: str, data: str):
+        # data is serialized once by the caller and shared by every stream.
+        with self._lock:
+            targets = [s for name in usernames for s in self._subscribers.get(name, ())]
+        for subscription in targets:
+            subscription.push(domain, data)
+        self.published += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            streams = [s for group in self._subscribers.values() for s in group]
+        return {
+            'users': len(self._subscribers),
+            'streams': len(streams),
+            'published': self.published,
+            'dropped': sum(s.dropped for s in streams),
+        }
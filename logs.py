@@ -5,13 +5,22 @@ import sys
 log_level = 'DEBUG'
 log_file = 'domain_checker.log'
 
-logging.basicConfig(
-    level= log_level,
-    format= '[Time: %(asctime)s, File: %(filename)s:%(lineno)d, Function: %(funcName)s] %(levelname)-s - %(message)s',
-    handlers= [logging.FileHandler(log_file),
-               logging.StreamHandler(sys.stdout)
-               ]
-    )
+
+def configure_logging(stream=sys.stdout, level=log_level):
+    """
+    sets up the shared log format and handlers (log file + a console stream).
+    the entry points (app.create_app, worker.py, cli.py) call this once at startup
+    instead of it running on import, so importing a module stays cheap.
+    calling it again does nothing.
+    """
+    logging.basicConfig(
+        level= level,
+        format= '[Time: %(asctime)s, File: %(filename)s:%(lineno)d, Function: %(funcName)s] %(levelname)-s - %(message)s',
+        handlers= [logging.FileHandler(log_file),
+                   logging.StreamHandler(stream)
+                   ]
+        )
+
 #with this i will import the logger onto other files.
 
 logger = logging.getLogger(__name__)
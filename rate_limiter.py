@@ -0,0 +1,149 @@
+import random
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from domain_normalizer import registered_domain
+from logs import logger
+from tracing import span
+
+
+# how many checks per second we allow against one host group (same IP / same zone).
+GROUP_RATE = 2.0
+# how many checks can "burst" against one group before the rate kicks in.
+GROUP_BURST = 4
+# never have more than this many checks in flight against one group.
+GROUP_MAX_IN_FLIGHT = 2
+# how long a resolved IP is trusted before we look it up again (seconds).
+RESOLVE_TTL = 300
+
+
+class TokenBucket:
+    """
+    classic token bucket.
+    tokens refill at `rate` per second up to `capacity`,
+    every acquire() takes one token and blocks until one is available.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                # how long until the next token shows up.
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """
+    groups checks by the IP the domain resolves to (or its registered domain
+    if it does not resolve) and applies a token bucket + in-flight cap per group.
+    this keeps us polite towards shared infrastructure (CDNs, one server with
+    many vhosts) so we don't get rate-limited into false "down" results.
+    """
+
+    def __init__(self, rate: float = GROUP_RATE, burst: int = GROUP_BURST,
+                 max_in_flight: int = GROUP_MAX_IN_FLIGHT, resolve_ttl: float = RESOLVE_TTL):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.resolve_ttl = resolve_ttl
+        self._buckets = {}
+        self._semaphores = {}
+        self._resolved = {}  # domain -> (group, resolved_at)
+        self._lock = threading.Lock()
+
+    def group_key(self, domain: str) -> str:
+        now = time.monotonic()
+        cached = self._resolved.get(domain)
+        if cached and now - cached[1] < self.resolve_ttl:
+            return cached[0]
+        try:
+            group = socket.gethostbyname(domain)
+        except (socket.gaierror, UnicodeError):
+            # the check itself will report the DNS failure, we just need a group.
+            group = registered_domain(domain)
+        self._resolved[domain] = (group, now)
+        return group
+
+    def _group_state(self, group: str):
+        with self._lock:
+            if group not in self._buckets:
+                self._buckets[group] = TokenBucket(self.rate, self.burst)
+                self._semaphores[group] = threading.BoundedSemaphore(self.max_in_flight)
+            return self._buckets[group], self._semaphores[group]
+
+    @contextmanager
+    def slot(self, domain: str):
+        """
+        blocks until the domain's group has a free slot and a token,
+        then holds the slot for the duration of the check.
+        """
+        with span('limiter_wait'):
+            bucket, semaphore = self._group_state(self.group_key(domain))
+            semaphore.acquire()
+            try:
+                bucket.acquire()
+            except BaseException:
+                semaphore.release()
+                raise
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    def interleave(self, domains: list) -> list:
+        """
+        reorders domains round-robin across registered domains, so the pool
+        does not start 10 workers on the same zone at once.
+        this is cheap (no DNS), the IP grouping happens in slot().
+        """
+        groups = {}
+        for domain in domains:
+            groups.setdefault(registered_domain(domain), deque()).append(domain)
+        # one round per pass, exhausted queues are just not carried over to the next pass.
+        queues = list(groups.values())
+        ordered = []
+        while queues:
+            remaining = []
+            for queue in queues:
+                ordered.append(queue.popleft())
+                if queue:
+                    remaining.append(queue)
+            queues = remaining
+        return ordered
+
+
+def spread_offsets(count: int, interval: float, jitter: float = 0.1) -> list:
+    """
+    spreads `count` checks evenly across `interval` seconds.
+    each offset is moved by up to +-jitter of one slot, so repeated runs
+    do not line up on the exact same second.
+    returns a list of offsets (seconds from now), one per check.
+    """
+    if count <= 0 or interval <= 0:
+        return [0.0] * max(count, 0)
+    step = interval / count
+    offsets = []
+    for i in range(count):
+        offset = i * step + random.uniform(-jitter, jitter) * step
+        offsets.append(min(max(offset, 0.0), interval))
+    logger.debug(f"spreading {count} checks over {interval}s (slot {step:.3f}s).")
+    return offsets
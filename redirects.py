@@ -0,0 +1,141 @@
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+from logs import logger
+
+
+# a chain is trusted for direct probes once it was walked this many times in a row unchanged ...
+REDIRECT_STABLE_AFTER = 2
+# ... and has at least this many URLs: a direct probe asks the first hop and the final URL,
+# the same two requests as walking a single redirect (http -> https, apex -> www).
+REDIRECT_DIRECT_MIN_URLS = 3
+# ... and is walked again from the start at least this often (seconds). direct probes still ask
+# the first hop every time, this bounds how long an outage of an intermediate hop stays unseen.
+REDIRECT_REVALIDATE = 300
+
+
+def redirect_chain(response) -> tuple:
+    """
+    the URLs a requests response went through: the requested URL, every
+    redirect hop and the final URL. empty if there was no redirect.
+    """
+    if not response.history:
+        return ()
+    return tuple(sys.intern(hop.url) for hop in response.history) + (sys.intern(response.url),)
+
+
+def hostname_of(url: str) -> str:
+    # the host without port or credentials, what the TLS inspection connects to.
+    return urlsplit(url).hostname or ''
+
+
+class RedirectEntry:
+    __slots__ = ('chain', 'seen', 'walked_at')
+
+    def __init__(self, chain: tuple, seen: int = 1, walked_at: float = 0.0):
+        self.chain = chain
+        self.seen = seen  # consecutive walks that found this chain
+        self.walked_at = walked_at
+
+
+class RedirectCache:
+    """
+    the redirect chain of every domain that redirects (http->https->www->CDN ...).
+    once a chain is stable, routine checks confirm that the requested URL still
+    redirects to the cached second hop and then request the final URL directly,
+    skipping the hops in between; the chain is re-walked every
+    REDIRECT_REVALIDATE seconds and whenever the first hop or the final URL
+    stops answering as cached (see domain_checker.fetch).
+    """
+
+    def __init__(self, stable_after: int = REDIRECT_STABLE_AFTER, revalidate: float = REDIRECT_REVALIDATE):
+        self.stable_after = stable_after
+        self.revalidate = revalidate
+        self._entries = {}  # domain -> RedirectEntry
+        self._lock = threading.Lock()
+        self.direct = 0
+        self.walks = 0
+        self.changes = 0
+
+    def target(self, domain: str, now: float = None):
+        # the final URL to probe directly, or None if the chain has to be walked.
+        with self._lock:
+            entry = self._entries.get(domain)
+            if entry is None or entry.seen < self.stable_after or len(entry.chain) < REDIRECT_DIRECT_MIN_URLS:
+                return None
+            if (now or time.time()) - entry.walked_at > self.revalidate:
+                return None
+            return entry.chain[-1]
+
+    def hit(self, domain: str):
+        # a direct probe of the final URL succeeded, the walk was saved.
+        with self._lock:
+            self.direct += 1
+
+    def unsettle(self, domain: str):
+        # the first hop no longer answers as cached: the chain has to be walked
+        # unchanged REDIRECT_STABLE_AFTER times again before it is trusted.
+        with self._lock:
+            entry = self._entries.get(domain)
+            if entry is not None:
+                entry.seen = 0
+
+    def chain(self, domain: str) -> tuple:
+        entry = self._entries.get(domain)
+        return entry.chain if entry is not None else ()
+
+    def record(self, domain: str, chain: tuple, now: float = None):
+        """
+        stores the chain a full walk found.
+                Returns:
+            (chain, previous): the stored chain (shared with the cache when it is
+            unchanged) and the previous chain if it changed, else None.
+        """
+        now = now or time.time()
+        with self._lock:
+            self.walks += 1
+            entry = self._entries.get(domain)
+            if entry is not None and entry.chain == chain:
+                entry.seen += 1
+                entry.walked_at = now
+                return entry.chain, None
+            if chain:
+                self._entries[domain] = RedirectEntry(chain, 1, now)
+            else:
+                self._entries.pop(domain, None)
+            if entry is None:
+                return chain, None
+            self.changes += 1
+        logger.warning(f"redirect chain for {domain} changed: {' -> '.join(entry.chain) or 'none'} "
+                       f"is now {' -> '.join(chain) or 'none'}.")
+        return chain, entry.chain
+
+    def forget(self, domain: str):
+        with self._lock:
+            self._entries.pop(domain, None)
+
+    def export(self) -> list:
+        # (domain, chain, seen, walked_at) tuples for engine snapshots.
+        with self._lock:
+            return [(domain, e.chain, e.seen, e.walked_at) for domain, e in self._entries.items()]
+
+    def load(self, entries: list) -> int:
+        with self._lock:
+            for domain, chain, seen, walked_at in entries:
+                self._entries[domain] = RedirectEntry(tuple(sys.intern(url) for url in chain), seen, walked_at)
+            return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            probes = self.direct + self.walks
+            return {
+                'entries': len(self._entries),
+                'direct': self.direct,
+                'walks': self.walks,
+                'changes': self.changes,
+                'direct_ratio': round(self.direct / probes, 3) if probes else 0.0,
+            }
+
+
+redirect_cache = RedirectCache()
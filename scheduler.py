@@ -0,0 +1,273 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+
+# priority classes, lower rank = more important.
+PRIORITIES = {'critical': 0, 'high': 1, 'normal': 2, 'low': 3}
+DEFAULT_PRIORITY = 'normal'
+
+# how often (seconds) a domain of each class is checked unless it sets its own interval.
+DEFAULT_INTERVALS = {
+    'critical': 30,
+    'high': 300,
+    'normal': 3600,
+    'low': 86400,
+}
+MIN_INTERVAL = 10
+
+# how many recent dispatches per class we keep for the lag metrics.
+LAG_WINDOW = 1000
+# smoothing factor of the per-tenant average lag (exponential moving average).
+TENANT_LAG_SMOOTHING = 0.1
+
+
+def normalize_priority(priority) -> str:
+    """returns a known priority class name, unknown values fall back to the default."""
+    if isinstance(priority, str) and priority.lower() in PRIORITIES:
+        return priority.lower()
+    return DEFAULT_PRIORITY
+
+
+def normalize_interval(priority: str, interval=None) -> float:
+    """returns the check interval in seconds, defaulting to the class interval."""
+    try:
+        interval = float(interval)
+    except (TypeError, ValueError):
+        return float(DEFAULT_INTERVALS[priority])
+    return max(interval, MIN_INTERVAL)
+
+
+class ScheduledDomain:
+    """a domain's place in the schedule."""
+
+    __slots__ = ('domain', 'priority', 'interval', 'next_due', 'version', 'tenant')
+
+    def __init__(self, domain: str, priority: str, interval: float, next_due: float, version: int, tenant=None):
+        self.domain = domain
+        self.priority = priority
+        self.interval = interval
+        self.next_due = next_due
+        self.version = version
+        self.tenant = tenant  # the user this domain's checks are charged to
+
+    @property
+    def rank(self) -> int:
+        return PRIORITIES[self.priority]
+
+
+class LagTracker:
+    """
+    keeps a rolling window of scheduling lag (dispatch time - due time) per priority class.
+    lag grows when the engine is saturated, it is the number to watch.
+    """
+
+    def __init__(self, window: int = LAG_WINDOW):
+        self._lags = {name: deque(maxlen=window) for name in PRIORITIES}
+        self._dispatched = {name: 0 for name in PRIORITIES}
+        self._lock = threading.Lock()
+
+    def record(self, priority: str, lag: float):
+        with self._lock:
+            self._lags[priority].append(max(lag, 0.0))
+            self._dispatched[priority] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            report = {}
+            for name, lags in self._lags.items():
+                ordered = sorted(lags)
+                report[name] = {
+                    'dispatched': self._dispatched[name],
+                    'avg_lag': round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+                    'p95_lag': round(ordered[int(len(ordered) * 0.95) - 1], 3) if ordered else 0.0,
+                    'max_lag': round(ordered[-1], 3) if ordered else 0.0,
+                }
+            return report
+
+
+class TenantUsage:
+    """per-tenant accounting: checks dispatched, time spent checking and average lag."""
+
+    def __init__(self):
+        self._usage = {}  # tenant -> [checks, check_seconds, avg_lag]
+        self._lock = threading.Lock()
+
+    def dispatched(self, tenant, lag: float):
+        with self._lock:
+            usage = self._usage.setdefault(tenant, [0, 0.0, 0.0])
+            usage[0] += 1
+            lag = max(lag, 0.0)
+            usage[2] = lag if usage[0] == 1 else usage[2] + TENANT_LAG_SMOOTHING * (lag - usage[2])
+
+    def finished(self, tenant, seconds: float):
+        with self._lock:
+            usage = self._usage.setdefault(tenant, [0, 0.0, 0.0])
+            usage[1] += seconds
+
+    def report(self, tenant) -> dict:
+        with self._lock:
+            checks, check_seconds, avg_lag = self._usage.get(tenant, (0, 0.0, 0.0))
+        return {'checks': checks, 'check_seconds': round(check_seconds, 3), 'avg_lag': round(avg_lag, 3)}
+
+
+class CheckScheduler:
+    """
+    priority-queue scheduler.
+    domains wait in a heap keyed by their next-due time. once due, they move
+    to a "ready" heap keyed by (priority, fair-share tag, due time), so when
+    there is more due work than capacity, critical domains go first, and
+    within a priority class the capacity is shared fairly between tenants.
+
+    fair sharing is weighted fair queueing: every due domain gets a virtual
+    finish tag, tag = max(tenant's last tag, virtual time) + 1 / tenant weight.
+    a tenant with 50k due domains gets tags 1, 2, 3 ... while a light tenant's
+    domain that becomes due later is tagged just past the current virtual time,
+    so it goes out next instead of waiting behind the whole backlog.
+
+    removed/rescheduled entries are skipped lazily using a version number,
+    which keeps every operation O(log n) even at 100k domains.
+    """
+
+    def __init__(self):
+        self._entries = {}   # domain -> ScheduledDomain
+        self._waiting = []   # (next_due, seq, version, domain)
+        self._ready = []     # (rank, tag, next_due, seq, version, domain)
+        self._in_flight = set()
+        self._forced = {}    # in-flight domain -> due time asked for while it was running
+        self._seq = itertools.count()
+        # versions come from one counter for all domains, so a domain that is removed and
+        # added again never reuses the version of heap items left from its earlier registration.
+        self._versions = itertools.count()
+        self._lock = threading.Lock()
+        self._weights = {}   # tenant -> share weight, default 1
+        self._tenant_tags = {}  # tenant -> last fair-share tag handed out
+        self._virtual_time = 0.0
+        self.lag = LagTracker()
+        self.usage = TenantUsage()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, domain):
+        return domain in self._entries
+
+    def schedule(self, domain: str, priority=DEFAULT_PRIORITY, interval=None, first_due=None, tenant=None):
+        """
+        adds a domain to the schedule, or updates its priority/interval/tenant.
+        first_due defaults to "now" for new domains; existing domains keep their due time.
+        """
+        priority = normalize_priority(priority)
+        interval = normalize_interval(priority, interval)
+        now = time.time()
+        with self._lock:
+            current = self._entries.get(domain)
+            if current and current.priority == priority and current.interval == interval and first_due is None:
+                current.tenant = tenant
+                return
+            if first_due is None:
+                first_due = current.next_due if current else now
+            version = next(self._versions)
+            entry = ScheduledDomain(domain, priority, interval, first_due, version, tenant)
+            self._entries[domain] = entry
+            # an in-flight domain gets re-pushed by complete(), at the asked-for time if there was one.
+            if domain in self._in_flight:
+                if first_due is not None:
+                    self._forced[domain] = first_due
+            else:
+                heapq.heappush(self._waiting, (entry.next_due, next(self._seq), version, domain))
+
+    def set_weight(self, tenant, weight: float):
+        # a tenant with weight 2 gets twice the share of a weight 1 tenant when capacity is short.
+        with self._lock:
+            self._weights[tenant] = max(float(weight), 0.01)
+
+    def _fair_tag(self, tenant) -> float:
+        tag = max(self._tenant_tags.get(tenant, 0.0), self._virtual_time) + 1.0 / self._weights.get(tenant, 1.0)
+        self._tenant_tags[tenant] = tag
+        return tag
+
+    def unschedule(self, domain: str) -> bool:
+        with self._lock:
+            return self._entries.pop(domain, None) is not None
+
+    def domains(self) -> list:
+        with self._lock:
+            return list(self._entries)
+
+    def entry(self, domain: str):
+        return self._entries.get(domain)
+
+    def _is_current(self, version: int, domain: str) -> bool:
+        entry = self._entries.get(domain)
+        return entry is not None and entry.version == version and domain not in self._in_flight
+
+    def next_batch(self, capacity: int, now=None) -> list:
+        """
+        returns up to `capacity` due entries, most important first, and marks them in flight.
+        every entry returned must later be passed to complete().
+        """
+        now = now if now is not None else time.time()
+        batch = []
+        with self._lock:
+            while self._waiting and self._waiting[0][0] <= now:
+                next_due, seq, version, domain = heapq.heappop(self._waiting)
+                if self._is_current(version, domain):
+                    entry = self._entries[domain]
+                    tag = self._fair_tag(entry.tenant)
+                    heapq.heappush(self._ready, (entry.rank, tag, next_due, seq, version, domain))
+            while self._ready and len(batch) < capacity:
+                rank, tag, next_due, seq, version, domain = heapq.heappop(self._ready)
+                if not self._is_current(version, domain):
+                    continue
+                entry = self._entries[domain]
+                self._virtual_time = max(self._virtual_time, tag)
+                self._in_flight.add(domain)
+                self.lag.record(entry.priority, now - next_due)
+                self.usage.dispatched(entry.tenant, now - next_due)
+                batch.append(entry)
+        return batch
+
+    def complete(self, domain: str, delay=None, now=None):
+        """
+        puts a checked domain back in the schedule, `delay` seconds from now
+        (by default its own interval). a check asked for while it was running
+        (e.g. a forced check) is kept and goes out as soon as it is due.
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            self._in_flight.discard(domain)
+            forced = self._forced.pop(domain, None)
+            entry = self._entries.get(domain)
+            if entry is None:
+                return
+            entry.next_due = now + (entry.interval if delay is None else delay)
+            if forced is not None:
+                entry.next_due = min(entry.next_due, forced)
+            heapq.heappush(self._waiting, (entry.next_due, next(self._seq), entry.version, domain))
+
+    def seconds_until_next(self, now=None) -> float:
+        """how long the engine may sleep before something becomes due."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            if self._ready:
+                return 0.0
+            if not self._waiting:
+                return float('inf')
+            return max(self._waiting[0][0] - now, 0.0)
+
+    def metrics(self, now=None) -> dict:
+        """lag per priority class plus how many domains are overdue right now."""
+        now = now if now is not None else time.time()
+        report = self.lag.snapshot()
+        with self._lock:
+            for name in report:
+                report[name]['scheduled'] = 0
+                report[name]['overdue'] = 0
+            for entry in self._entries.values():
+                report[entry.priority]['scheduled'] += 1
+                if entry.next_due <= now and entry.domain not in self._in_flight:
+                    report[entry.priority]['overdue'] += 1
+        return report
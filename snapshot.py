@@ -0,0 +1,104 @@
+import marshal
+import os
+import sys
+import threading
+import time
+import zlib
+import data_manager
+from check_result import CheckResult
+from data_manager import _atomic_write_bytes, _file_signature
+from logs import logger
+
+
+# how often (seconds) the engine writes its state to disk.
+SNAPSHOT_INTERVAL = 60
+# older snapshots are ignored at boot, their results would mislead more than help.
+SNAPSHOT_MAX_AGE = 24 * 3600
+SNAPSHOT_FILE_NAME = 'engine_state.bin'
+
+# file layout: magic line, python version line, then zlib-compressed marshal data.
+# marshal is the fastest (de)serializer for plain builtins, but its format may
+# change between python versions, so a snapshot from another version is ignored.
+# bump the magic when the layout of the saved state changes (e.g. CheckResult.to_state()).
+SNAPSHOT_MAGIC = b'DMSNAP4\n'
+SNAPSHOT_VERSION_TAG = f"{sys.version_info[0]}.{sys.version_info[1]}\n".encode()
+
+
+def snapshot_path() -> str:
+    # resolved at call time, so it follows data_manager.DATA_DIR.
+    return os.environ.get('MONITOR_SNAPSHOT') or os.path.join(data_manager.DATA_DIR, SNAPSHOT_FILE_NAME)
+
+
+def write_snapshot(path: str, state: dict) -> int:
+    """
+    atomically writes the engine state (a dict of builtins, see
+    MonitorEngine.export_state) to path. returns the file size in bytes.
+    """
+    payload = SNAPSHOT_MAGIC + SNAPSHOT_VERSION_TAG + zlib.compress(marshal.dumps(dict(state, saved_at=time.time())), 1)
+    _atomic_write_bytes(path, payload)
+    return len(payload)
+
+
+def read_snapshot(path: str, max_age: float = SNAPSHOT_MAX_AGE):
+    """
+    returns the state dict saved by write_snapshot, or None if there is no usable
+    snapshot (missing, unreadable, written by another python version or too old).
+    """
+    try:
+        with open(path, 'rb') as f:
+            payload = f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.error(f"could not read engine snapshot {path}: {e}")
+        return None
+
+    header = SNAPSHOT_MAGIC + SNAPSHOT_VERSION_TAG
+    if not payload.startswith(header):
+        logger.warning(f"ignoring engine snapshot {path}: unknown format or written by another python version.")
+        return None
+    try:
+        state = marshal.loads(zlib.decompress(payload[len(header):]))
+    except (zlib.error, ValueError, EOFError, TypeError) as e:
+        logger.error(f"ignoring corrupt engine snapshot {path}: {e}")
+        return None
+    age = time.time() - state.get('saved_at', 0)
+    if age > max_age:
+        logger.warning(f"ignoring engine snapshot {path}, it is {int(age)}s old.")
+        return None
+    return state
+
+
+class SnapshotResults:
+    """
+    read-only view of the latest results in the snapshot another process's
+    engine writes (worker.py), for web workers started with MONITOR_ENGINE=0.
+    the file is only re-read when it changed; results are decoded per lookup,
+    so a request pays for its own domains only. they are up to
+    SNAPSHOT_INTERVAL seconds older than the worker's.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._signature = None
+        self._states = {}  # domain -> CheckResult state tuple
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        signature = _file_signature(self.path)
+        with self._lock:
+            if signature == self._signature:
+                return self._states
+            state = read_snapshot(self.path) if signature is not None else None
+            self._states = {s[0]: s for s in state.get('results', ())} if state else {}
+            self._signature = signature
+            return self._states
+
+    def available(self) -> bool:
+        # True once the worker has written a usable snapshot.
+        return bool(self._refresh())
+
+    def latest(self, domains: list) -> dict:
+        # same as MonitorEngine.latest: {domain: latest result} for the domains the worker has results for.
+        states = self._refresh()
+        return {d: CheckResult.from_state(states[d]) for d in domains if d in states}
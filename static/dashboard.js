@@ -17,9 +17,18 @@ const daysUntil = (iso) => {
 // API Functions
 // =================================================================
 
-async function fetchDomains() {
+// Turns an API domain object into the format the frontend uses
+const toRow = d => ({
+    domain: d.domain,
+    status: d.status.startsWith('Live') ? 'up' : 'down',
+    ssl: d.ssl_expiration,
+    issuer: d.ssl_issuer,
+});
+
+// source 'engine' serves the background engine's latest results instead of a full live re-check
+async function fetchDomains(source) {
     try {
-        const response = await fetch('/api/domains');
+        const response = await fetch(source ? `/api/domains?source=${source}` : '/api/domains');
         if (!response.ok) {
             // If session expired or is invalid, redirect to login page
             if (response.status === 401) window.location.href = '/login';
@@ -27,12 +36,7 @@ async function fetchDomains() {
         }
         const data = await response.json();
         // Transform the raw API data into the format the frontend uses
-        domainsData = data.map(d => ({
-            domain: d.domain,
-            status: d.status.startsWith('Live') ? 'up' : 'down',
-            ssl: d.ssl_expiration,
-            issuer: d.ssl_issuer,
-        }));
+        domainsData = data.map(toRow);
         renderTable();
     } catch (error) {
         console.error("Error fetching domains:", error);
@@ -60,6 +64,29 @@ async function removeDomain(domain) {
     }
 }
 
+// =================================================================
+// Live updates
+// The server pushes a "status" event whenever the background engine sees a
+// domain's status or certificate change, so the table stays current without reloads.
+// =================================================================
+
+function connectLiveUpdates() {
+    if (!window.EventSource) return;
+    const source = new EventSource('/api/events');
+
+    source.addEventListener('status', (e) => {
+        const row = toRow(JSON.parse(e.data));
+        const index = domainsData.findIndex(r => r.domain === row.domain);
+        // Ignore domains that are no longer in the table (removed in another tab)
+        if (index === -1) return;
+        domainsData[index] = row;
+        renderTable();
+    });
+
+    // The server sends "resync" when we fell too far behind, reload the list from the engine
+    source.addEventListener('resync', () => fetchDomains('engine'));
+}
+
 // =================================================================
 // Table and UI Rendering
 // =================================================================
@@ -198,4 +225,5 @@ function setupEventListeners() {
 (function init(){
   fetchDomains(); // Load initial data as soon as the page loads
   setupEventListeners(); // Activate all the interactive elements
+  connectLiveUpdates(); // Keep the table current with pushed status changes
 })();
\ No newline at end of file
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Tests for per-domain content assertions (assertions.py)
+Checks that the streaming matcher finds text and patterns across chunk
+boundaries, stops reading as soon as it has an answer, never reads past
+the byte cap, that patterns prone to catastrophic backtracking are refused
+or cut off, and that every owner of a shared domain gets the outcome of
+their own assertions from one read of the page.
+No network access needed, responses are fed from memory.
+Runs standalone: python3 tests/test_assertions.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import assertions as assertions_module
+from assertions import (Assertions, AssertionRegistry, compile_assertions, validate_assertions, evaluate_all,
+                        BODY_READ_LIMIT, BODY_CHUNK_SIZE)
+from check_result import CheckResult
+
+
+class FakeResponse:
+    # the bits of a streamed requests response the matcher uses. counts the chunks it hands out.
+    def __init__(self, body: bytes, url: str = "https://example.com/"):
+        self.body = body
+        self.url = url
+        self.chunks_read = 0
+
+    def iter_content(self, size):
+        for start in range(0, len(self.body), size):
+            self.chunks_read += 1
+            yield self.body[start:start + size]
+
+
+def page(text: bytes, at: int, size: int = 2 * 1024 * 1024):
+    # a big page with text placed at byte offset `at`.
+    return b"x" * at + text + b"x" * (size - at - len(text))
+
+
+def test_text_found_across_chunks_and_early_stop():
+    """Expected text split over two chunks is found, and reading stops right after"""
+    print("\n--- Test 1: Streaming substring match ---")
+    needle = b"Welcome back"
+    response = FakeResponse(page(needle, BODY_CHUNK_SIZE - 4))
+    error, body_hash = Assertions({"contains": "Welcome back"}).evaluate(response, 100)
+    assert error is None and body_hash is None, error
+    assert response.chunks_read == 2, f"read {response.chunks_read} chunks"
+    print(f"✓ found across a chunk boundary after {response.chunks_read} chunks of a 2 MB page")
+
+
+def test_missing_text_respects_byte_cap():
+    """A page without the text is read only up to the byte cap"""
+    print("\n--- Test 2: Byte cap ---")
+    response = FakeResponse(page(b"Domain for sale", 1000))
+    error, _ = Assertions({"contains": "Welcome", "regex": "Order #\\d+"}).evaluate(response, 100)
+    assert error and error.startswith("expected text not found in the first"), error
+    assert response.chunks_read * BODY_CHUNK_SIZE <= BODY_READ_LIMIT, f"read {response.chunks_read} chunks"
+    print(f"✓ '{error}', {response.chunks_read * BODY_CHUNK_SIZE // 1024} KB read")
+
+
+def test_regex_host_and_response_time():
+    """Regex, final host and max response time are each reported"""
+    print("\n--- Test 3: Regex, final host, response time ---")
+    body = page(b"Order #12345", BODY_CHUNK_SIZE * 3 - 5, size=BODY_CHUNK_SIZE * 5)
+    assert Assertions({"regex": "Order #\\d{5}"}).evaluate(FakeResponse(body), 10)[0] is None
+    error, _ = Assertions({"regex": "Invoice #\\d+"}).evaluate(FakeResponse(body), 10)
+    assert error == "body does not match the pattern", error
+    error, _ = Assertions({"final_host": "www.example.com"}).evaluate(FakeResponse(b"", "https://parking.example.net/"), 10)
+    assert error == "redirected to parking.example.net, expected www.example.com", error
+    error, _ = Assertions({"max_response_ms": 500}).evaluate(FakeResponse(b""), 1234)
+    assert error == "response took 1234ms (max 500ms)", error
+    print("✓ regex, final host and response time assertions reported")
+
+
+def test_body_hash_tracks_changes():
+    """The body hash changes when the page does, and needs the whole body"""
+    print("\n--- Test 4: Body hash ---")
+    tracked = Assertions({"contains": "Welcome", "track_body": True})
+    first = FakeResponse(b"Welcome" + b"a" * 100000)
+    _, hash_a = tracked.evaluate(first, 10)
+    _, hash_b = tracked.evaluate(FakeResponse(b"Welcome" + b"a" * 100000), 10)
+    _, hash_c = tracked.evaluate(FakeResponse(b"Welcome" + b"b" * 100000), 10)
+    assert hash_a == hash_b != hash_c
+    assert first.chunks_read > 1, "hashing must not stop at the first match"
+    print(f"✓ same page {hash_a[:12]}…, changed page {hash_c[:12]}…")
+
+
+def test_validation_and_registry():
+    """Bad specs are rejected; a shared domain is checked with every owner's assertions"""
+    print("\n--- Test 5: Validation and registry ---")
+    assert validate_assertions({"contains": "ok", "max_response_ms": 2000, "track_body": True}) is None
+    for bad in ({"regex": "("}, {"contains": ""}, {"max_response_ms": -1}, {"track_body": "yes"}, {"nope": 1}, []):
+        assert validate_assertions(bad), bad
+
+    registry = AssertionRegistry()
+    registry.sync_user("bob", [{"domain": "shared.com", "assertions": {"contains": "bob"}}])
+    registry.sync_user("alice", [{"domain": "shared.com", "assertions": {"contains": "alice"}},
+                                 {"domain": "plain.com"}])
+    registry.sync_user("carol", [{"domain": "shared.com", "assertions": {"contains": "bob"}}])
+    assert [a.spec for a in registry.get("shared.com")] == [{"contains": "alice"}, {"contains": "bob"}]
+    assert registry.for_user("carol", "shared.com") is registry.for_user("bob", "shared.com")
+    assert registry.get("plain.com") == () and registry.for_user("alice", "plain.com") is None
+    registry.sync_user("alice", [])
+    assert [a.spec for a in registry.get("shared.com")] == [{"contains": "bob"}]
+    registry.sync_user("bob", [])
+    registry.sync_user("carol", [])
+    assert registry.get("shared.com") == () and len(registry) == 0
+    assert compile_assertions({"contains": "x"}) is compile_assertions({"contains": "x"})
+    print("✓ invalid specs rejected, distinct owner specs kept and cleaned up")
+
+
+def test_backtracking_patterns():
+    """Patterns that backtrack badly are refused, and matching stops at the time budget"""
+    print("\n--- Test 6: Catastrophic backtracking ---")
+    for pattern in ["(a+)+$", "(a|aa)+$", "(\\w+)\\1", ".*confirmed", "\\d+\\d+\\d+x", "(?:x+){2,}"]:
+        assert validate_assertions({"regex": pattern}), f"{pattern} accepted"
+    for pattern in ["Order #\\d+", "Order.*confirmed", "[A-Z]{2}-\\d{4}", "colou?r", "(foo|bar) page"]:
+        assert validate_assertions({"regex": pattern}) is None, f"{pattern} refused"
+
+    # a pattern compiled without validation (an old record) is cut off once over the budget:
+    # one search of a 20 KB window is quadratic here, all 16 windows would take seconds.
+    saved = assertions_module.REGEX_TIME_BUDGET
+    assertions_module.REGEX_TIME_BUDGET = 0.05
+    try:
+        slow = Assertions({"regex": ".*confirmed"})
+        response = FakeResponse(b"a" * (BODY_CHUNK_SIZE * 16))
+        started = time.perf_counter()
+        error, _ = slow.evaluate(response, 10)
+        elapsed = time.perf_counter() - started
+    finally:
+        assertions_module.REGEX_TIME_BUDGET = saved
+    assert error and "took over" in error, error
+    assert elapsed < 30, f"matching ran {elapsed:.1f}s"
+    print(f"✓ 6 risky patterns refused, 5 common ones kept; an unvalidated one stopped after {elapsed:.2f}s")
+
+
+def test_each_owner_gets_their_own_outcome():
+    """Owners of one domain with different assertions each see their own result, the page is read once"""
+    print("\n--- Test 7: Per-owner assertions ---")
+    registry = AssertionRegistry()
+    registry.sync_user("alice", [{"domain": "shop.com", "assertions": {"contains": "Add to cart"}}])
+    registry.sync_user("bob", [{"domain": "shop.com", "assertions": {"contains": "Sold out", "track_body": True}}])
+    registry.sync_user("carol", [{"domain": "shop.com"}])
+
+    response = FakeResponse(page(b"Add to cart", 100000, size=300000))
+    checks = registry.get("shop.com")
+    outcomes = evaluate_all(checks, response, 10)
+    assert response.chunks_read == -(-300000 // BODY_CHUNK_SIZE), "the page was not read exactly once"
+    result = CheckResult("shop.com", 200)
+    result.assertion_outcomes = tuple((a.key, error, body_hash) for a, (error, body_hash) in zip(checks, outcomes))
+
+    alice, bob, carol = (registry.seen_by(user, result) for user in ("alice", "bob", "carol"))
+    assert alice.assertion_error is None and not alice.degraded and alice.body_hash is None
+    assert bob.degraded and bob.assertion_error == "expected text not found" and len(bob.body_hash) == 64
+    assert carol.assertion_error is None and carol.body_hash is None
+    groups = {tuple(owners): view.degraded for owners, view in registry.views(["alice", "bob", "carol"], result)}
+    assert groups == {("alice",): False, ("bob",): True, ("carol",): False}, groups
+    print(f"✓ one read of {response.chunks_read} chunks, alice live, bob degraded, carol without assertions live")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - CONTENT ASSERTION TESTS")
+    print("=" * 70)
+
+    tests = [test_text_found_across_chunks_and_early_stop, test_missing_text_respects_byte_cap,
+             test_regex_host_and_response_time, test_body_hash_tracks_changes, test_validation_and_registry,
+             test_backtracking_patterns, test_each_owner_gets_their_own_outcome]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
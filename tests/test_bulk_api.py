@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tests for the bulk JSON endpoints (/api/bulk_add, /api/bulk_remove, /api/bulk_check)
+Checks input validation (malformed items are a 400, never a 500), the
+per-item results, that "wait": false reports what the engine really
+queued, and that long lists are not re-checked live by GET /api/domains. Uses Flask's test client with a temporary data directory, no
+running server or network needed.
+Runs standalone: python3 tests/test_bulk_api.py
+"""
+
+import os
+import sys
+import tempfile
+
+os.environ["MONITOR_ENGINE"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+import data_manager
+import domain_checker
+import user_management
+from check_result import CheckResult, CertStatus
+from engine import MonitorEngine
+
+TEST_USER = "bulk_user"
+
+
+def client_for(username=TEST_USER):
+    data_manager.DATA_DIR = tempfile.mkdtemp(prefix="dm_bulk_")
+    user_management.USERS_FILE = os.path.join(data_manager.DATA_DIR, "users.json")
+    app_module._engine = None
+    app_module._worker_results = None
+    client = app_module.create_app().test_client()
+    with client.session_transaction() as sess:
+        sess["username"] = username
+    return client
+
+
+def test_malformed_items_are_rejected():
+    """Non-string domains and bad lists are a 400 on every bulk endpoint"""
+    print("\n--- Test 1: Input validation ---")
+    client = client_for()
+    bad_bodies = [{"domains": [["a.com"]]}, {"domains": [{"domain": {"x": 1}}]}, {"domains": [{"priority": "high"}]},
+                  {"domains": [None]}, {"domains": []}, {"domains": "a.com"}, ["a.com"]]
+    for endpoint in ("/api/bulk_add", "/api/bulk_remove", "/api/bulk_check"):
+        for body in bad_bodies:
+            response = client.post(endpoint, json=body)
+            assert response.status_code == 400, (endpoint, body, response.status_code)
+    response = client.post("/api/bulk_check", json={"domains": ["ok.com", ["x"]]})
+    assert "Item 1" in response.get_json()["message"], response.get_json()
+    print(f"✓ {len(bad_bodies)} malformed bodies rejected with 400 on all three endpoints")
+
+
+def test_add_and_remove_results():
+    """Each item gets its own result, settings are validated per item"""
+    print("\n--- Test 2: Per-item results ---")
+    client = client_for()
+    response = client.post("/api/bulk_add", json={"domains": [
+        "https://Shop.example.com/cart", {"domain": "blog.example.org", "priority": "critical"},
+        "shop.example.com", "not a domain", {"domain": "api.example.net", "priority": "urgent"}]})
+    body = response.get_json()
+    assert response.status_code == 200 and body["added"] == 2, body
+    assert [r["result"] for r in body["results"]] == ["added", "added", "exists", "invalid", "invalid"], body
+    assert body["results"][0]["domain"] == "shop.example.com"
+    response = client.post("/api/bulk_remove", json={"domains": ["SHOP.example.com.", "missing.com"]})
+    assert [r["result"] for r in response.get_json()["results"]] == ["removed", "not_found"]
+    assert [d["domain"] for d in data_manager.get_user_domains(TEST_USER)] == ["blog.example.org"]
+    print("✓ added / exists / invalid / removed / not_found reported per item")
+
+
+def test_queued_checks_match_the_engine():
+    """wait=false reports queued only for domains the engine actually scheduled"""
+    print("\n--- Test 3: Queued checks ---")
+    client = client_for()
+    assert client.post("/api/bulk_check", json={"domains": ["a.com"], "wait": False}).status_code == 503
+    client.post("/api/bulk_add", json={"domains": ["a.com", "b.com"]})
+    engine = MonitorEngine()
+    # b.com was added by another worker and is not synced into this engine yet.
+    engine.sync_user(TEST_USER, [{"domain": "a.com"}])
+    app_module._engine = engine
+    response = client.post("/api/bulk_check", json={"domains": ["a.com", "b.com", "c.com"], "wait": False})
+    body = response.get_json()
+    assert response.status_code == 202 and body["queued"] == 1, body
+    assert [r["result"] for r in body["results"]] == ["queued", "not_scheduled", "not_found"], body
+    print(f"✓ {[(r['domain'], r['result']) for r in body['results']]}")
+
+
+def test_long_lists_are_not_checked_live():
+    """GET /api/domains serves background results for lists over LIVE_CHECK_MAX"""
+    print("\n--- Test 4: Live check limit ---")
+    client = client_for()
+    client.post("/api/bulk_add", json={"domains": ["a.com", "b.com", "c.com"]})
+    engine = MonitorEngine()
+    engine.sync_user(TEST_USER, data_manager.get_user_domains(TEST_USER))
+    engine._record("a.com", CheckResult("a.com", 200, CertStatus.VALID, 1893456000, issuer="R3"))
+    app_module._engine = engine
+    saved = app_module.LIVE_CHECK_MAX, domain_checker.check_domains_concurrently
+    app_module.LIVE_CHECK_MAX = 2
+
+    def no_live_checks(domains, *args, **kwargs):
+        raise AssertionError(f"{len(domains)} domains checked live")
+    domain_checker.check_domains_concurrently = no_live_checks
+    try:
+        response = client.get("/api/domains")
+    finally:
+        app_module.LIVE_CHECK_MAX, domain_checker.check_domains_concurrently = saved
+    body = response.get_json()
+    assert response.status_code == 200 and len(body) == 3, body
+    assert body[0]["status"] == "Live. Status code 200" and body[1]["domain"] == "b.com", body
+    print(f"✓ 3 domains over a limit of 2 served from the engine: {[d['status'] for d in body]}")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - BULK API TESTS")
+    print("=" * 70)
+
+    tests = [test_malformed_items_are_rejected, test_add_and_remove_results, test_queued_checks_match_the_engine,
+             test_long_lists_are_not_checked_live]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
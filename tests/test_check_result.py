@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Tests for the compact check result record (check_result.py)
+Checks that a result survives the snapshot round trip (to_state through
+marshal and back), that to_dict keeps the API's field names and
+formatting, the live / failed / degraded states, which differences count
+as a change for the live updates, and that results stay slot-only with
+shared strings.
+Runs standalone: python3 tests/test_check_result.py
+"""
+
+import marshal
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from check_result import CheckResult, CertStatus, TlsSummary, STATUS_FAILED
+
+EXPIRY = 1893456000  # 2030-01-01
+
+
+def full_result():
+    tls = TlsSummary("TLSv1.3", "EC 256", True, 2, 1901232000, ["chain expires soon"])
+    result = CheckResult("shop.com", 200, CertStatus.VALID, EXPIRY, issuer="R3", tls=tls, attempts=2)
+    result.vantages = (("eu-west", 200, 41.5), ("us-east", -1, None))
+    result.assertion_error = "expected text 'Add to cart' not found"
+    result.body_hash = "ab" * 32
+    result.assertion_outcomes = (('{"contains": "Add to cart"}', None, None),)
+    result.redirects = ("https://shop.com/", "https://www.shop.com/")
+    return result
+
+
+def test_state_round_trip():
+    """Every field survives to_state -> marshal -> from_state"""
+    print("\n--- Test 1: Snapshot round trip ---")
+    original = full_result()
+    state = marshal.loads(marshal.dumps(original.to_state()))
+    restored = CheckResult.from_state(state)
+    assert restored.to_dict() == original.to_dict(), (restored.to_dict(), original.to_dict())
+    assert not restored.changed_from(original) and restored.attempts == 2
+    assert restored.cert_status is CertStatus.VALID and restored.vantages == original.vantages
+    assert restored.assertion_outcomes == original.assertion_outcomes
+    bare = CheckResult.from_state(marshal.loads(marshal.dumps(CheckResult("new.com").to_state())))
+    assert bare.tls is None and bare.redirects == () and bare.to_dict() == CheckResult("new.com").to_dict()
+    print("✓ full and empty results restored unchanged")
+
+
+def test_api_format():
+    """to_dict keeps the API's keys and values, optional keys only when set"""
+    print("\n--- Test 2: API format ---")
+    pending = CheckResult("new.com").to_dict()
+    assert pending == {"domain": "new.com", "status_code": "N/A", "certificate_status": "N/A",
+                       "certificate_expiry": "N/A", "issuer": "N/A", "tls": None, "attempts": 1}, pending
+    failed = CheckResult("down.com", STATUS_FAILED, CertStatus.FAILED, cert_error="Connection timed out").to_dict()
+    assert failed["status_code"] == "FAILED" and failed["certificate_status"] == "failed"
+    assert failed["certificate_expiry"] == "Connection timed out"
+    full = full_result().to_dict()
+    assert full["certificate_expiry"] == "2030-01-01" and full["issuer"] == "R3"
+    assert full["tls"] == {"protocol": "TLSv1.3", "key": "EC 256", "san_match": True, "chain_length": 2,
+                           "chain_expiry": "2030-04-01", "ocsp_stapled": None, "issues": ["chain expires soon"]}
+    assert full["vantages"][1] == {"vantage": "us-east", "status_code": -1, "latency_ms": None}
+    assert full["redirects"] == ["https://shop.com/", "https://www.shop.com/"]
+    assert "assertion_error" in full and "body_hash" in full
+    print("✓ pending, failed and full results formatted as before")
+
+
+def test_states():
+    """live / failed / degraded follow the status code and assertions"""
+    print("\n--- Test 3: live / failed / degraded ---")
+    up = CheckResult("a.com", 200)
+    assert up.live and not up.failed and not up.degraded
+    error = CheckResult("a.com", 503)
+    assert not error.live and not error.failed
+    degraded = full_result()
+    assert degraded.degraded and degraded.live
+    down = CheckResult("a.com", STATUS_FAILED)
+    down.assertion_error = "expected status 200, got FAILED"
+    assert down.failed and not down.degraded, "a failed check is down, not degraded"
+    print("✓ 200 is live, FAILED is failed, a failed assertion on an answer is degraded")
+
+
+def test_changes():
+    """Only differences a user can see count as a change"""
+    print("\n--- Test 4: changed_from ---")
+    base = full_result()
+    assert not full_result().changed_from(base)
+    retried = full_result()
+    retried.attempts = 3
+    retried.vantages = (("eu-west", 200, 12.0),)
+    assert not retried.changed_from(base), "attempts and latencies are not a change"
+    changes = {
+        "status_code": 503, "cert_status": CertStatus.EXPIRED, "cert_expiry": EXPIRY + 86400,
+        "cert_error": "SSL certificate invalid", "issuer": "E1", "assertion_error": None,
+        "body_hash": "cd" * 32, "redirects": ("https://shop.com/",),
+        "assertion_outcomes": (('{"contains": "Add to cart"}', "expected text not found", None),),
+    }
+    for field, value in changes.items():
+        changed = full_result()
+        setattr(changed, field, value)
+        assert changed.changed_from(base), f"{field} change not detected"
+    print(f"✓ {len(changes)} visible fields detected, attempts / latencies ignored")
+
+
+def test_compact_records():
+    """Results have no per-instance dict and share repeated strings"""
+    print("\n--- Test 5: Compact records ---")
+    result = CheckResult("a.com", 200, issuer="".join(["Let's ", "Encrypt"]))
+    assert not hasattr(result, "__dict__")
+    try:
+        result.extra = 1
+        raise AssertionError("unknown attribute accepted")
+    except AttributeError:
+        pass
+    other = CheckResult("b.com", 200, issuer="".join(["Let's ", "Encrypt"]))
+    assert result.issuer is other.issuer, "issuer not interned"
+    restored = CheckResult.from_state(full_result().to_state())
+    assert restored.redirects[0] is sys.intern("https://shop.com/"), "redirect URLs not interned"
+    print("✓ slot-only records, issuers and redirect URLs interned")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - CHECK RESULT TESTS")
+    print("=" * 70)
+
+    tests = [test_state_round_trip, test_api_format, test_states, test_changes, test_compact_records]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Tests for the headless CLI runner (cli.py)
+Checks the exit codes, that invalid domains are skipped, that --since-cache
+answers fresh domains from the cache in NDJSON and CSV, and that the CLI
+never imports Flask. Runs cli.py as a subprocess; every domain is served
+from a prepared cache, so no network access is needed.
+Runs standalone: python3 tests/test_cli.py
+"""
+
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(REPO, "cli.py")
+
+
+def run_cli(*args, stdin=""):
+    completed = subprocess.run([sys.executable, CLI, *args], input=stdin, capture_output=True, text=True,
+                               cwd=tempfile.mkdtemp(prefix="dm_cli_"), timeout=60)
+    return completed.returncode, completed.stdout, completed.stderr
+
+
+def cache_file(results):
+    path = os.path.join(tempfile.mkdtemp(prefix="dm_cli_cache_"), "cli_cache.json")
+    now = int(time.time())
+    with open(path, "w") as f:
+        json.dump({r["domain"]: dict(r, checked_at=now) for r in results}, f)
+    return path
+
+
+LIVE = {"domain": "up.example.com", "status_code": 200, "certificate_status": "valid",
+        "certificate_expiry": "2030-01-01", "issuer": "R3", "tls": {"issues": []}, "attempts": 1}
+DOWN = {"domain": "down.example.com", "status_code": "FAILED", "certificate_status": "failed",
+        "certificate_expiry": "Connection timed out", "issuer": "N/A", "tls": None, "attempts": 3}
+
+
+def test_usage_errors():
+    """No domains, a missing file or a bad concurrency exit with 2"""
+    print("\n--- Test 1: Usage errors ---")
+    assert run_cli()[0] == 2
+    assert run_cli("-f", "/nonexistent/domains.txt")[0] == 2
+    assert run_cli("-c", "0", "example.com")[0] == 2
+    print("✓ exit code 2 for bad usage")
+
+
+def test_cached_results_and_exit_codes():
+    """Fresh cached results are streamed without checking; any down domain exits with 1"""
+    print("\n--- Test 2: Cache and exit codes ---")
+    cache = cache_file([LIVE, DOWN])
+    code, out, _ = run_cli("--since-cache", "3600", "--cache-file", cache, "https://UP.example.com/")
+    lines = [json.loads(line) for line in out.splitlines()]
+    assert code == 0 and len(lines) == 1 and lines[0]["cached"] is True, (code, out)
+    code, out, _ = run_cli("--since-cache", "3600", "--cache-file", cache, "-", stdin="up.example.com\n# note\ndown.example.com\n")
+    assert code == 1 and len(out.splitlines()) == 2, (code, out)
+    code, out, err = run_cli("--since-cache", "3600", "--cache-file", cache, "up.example.com", "not a domain")
+    assert code == 1 and "skipping 'not a domain'" in err, (code, err)
+    print("✓ cached results streamed, exit 0 when all live, 1 otherwise")
+
+
+def test_csv_output():
+    """CSV output has the documented columns and flattens TLS issues"""
+    print("\n--- Test 3: CSV ---")
+    cache = cache_file([LIVE])
+    code, out, _ = run_cli("--format", "csv", "--since-cache", "3600", "--cache-file", cache, "up.example.com")
+    rows = list(csv.DictReader(io.StringIO(out)))
+    assert code == 0 and len(rows) == 1, (code, out)
+    assert rows[0]["domain"] == "up.example.com" and rows[0]["status_code"] == "200" and rows[0]["cached"] == "True"
+    print(f"✓ {list(rows[0])}")
+
+
+def test_no_flask_import():
+    """The CLI runs without loading Flask"""
+    print("\n--- Test 4: Imports ---")
+    argv = ["cli.py", "--since-cache", "3600", "--cache-file", cache_file([LIVE]), "up.example.com"]
+    code = ("import sys, runpy; sys.argv = %r\n"
+            "try:\n    runpy.run_path(%r, run_name='__main__')\nexcept SystemExit:\n    pass\n"
+            "print('flask' in sys.modules)") % (argv, CLI)
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=REPO, timeout=60)
+    assert completed.stdout.strip().splitlines()[-1] == "False", completed.stdout
+    print("✓ flask not imported")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - CLI TESTS")
+    print("=" * 70)
+
+    tests = [test_usage_errors, test_cached_results_and_exit_codes, test_csv_output, test_no_flask_import]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress tests for data_manager
+Hammers one user's domain list from many threads and processes at once
+and checks that no add/remove is lost and the files are never corrupted.
+Runs without the web app: python3 tests/test_data_manager.py
+"""
+
+import os
+import sys
+import json
+import tempfile
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import data_manager
+
+THREADS = 8
+PROCESSES = 4
+DOMAINS_PER_WORKER = 50
+TEST_USER = "stress_user"
+
+
+def use_temp_data_dir():
+    data_manager.DATA_DIR = tempfile.mkdtemp(prefix="dm_stress_")
+
+
+def add_domains(prefix, count):
+    for i in range(count):
+        record = {"domain": f"{prefix}-{i}.example.com", "status": "Pending check"}
+        assert data_manager.add_user_domain(TEST_USER, record), f"{record['domain']} reported as duplicate"
+
+
+def add_then_remove_odd(prefix, count):
+    add_domains(prefix, count)
+    for i in range(1, count, 2):
+        assert data_manager.remove_user_domain(TEST_USER, f"{prefix}-{i}.example.com")
+
+
+def process_worker(data_dir, prefix, count):
+    data_manager.DATA_DIR = data_dir
+    add_then_remove_odd(prefix, count)
+
+
+def expected_domains(prefixes, count):
+    return {f"{p}-{i}.example.com" for p in prefixes for i in range(0, count, 2)}
+
+
+def saved_domains():
+    # read straight from disk, bypassing the cache, to prove the files are consistent.
+    data_manager.invalidate_cache(os.path.join(data_manager.DATA_DIR, f"{TEST_USER}_domains.json"))
+    return [d["domain"] for d in data_manager.get_user_domains(TEST_USER)]
+
+
+def test_concurrent_threads():
+    """Many threads adding/removing on one user must not lose updates"""
+    print("\n--- Test 1: Concurrent threads ---")
+    use_temp_data_dir()
+    prefixes = [f"t{n}" for n in range(THREADS)]
+    threads = [threading.Thread(target=add_then_remove_odd, args=(p, DOMAINS_PER_WORKER)) for p in prefixes]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    domains = saved_domains()
+    assert len(domains) == len(set(domains)), "duplicate entries found"
+    assert set(domains) == expected_domains(prefixes, DOMAINS_PER_WORKER), "lost or extra updates"
+    print(f"✓ {THREADS} threads, {len(domains)} domains left, no lost updates")
+
+
+def test_concurrent_processes():
+    """Worker processes share the files through fcntl locks"""
+    print("\n--- Test 2: Concurrent processes ---")
+    if data_manager.fcntl is None:
+        print("- skipped, no fcntl on this platform")
+        return
+    use_temp_data_dir()
+    prefixes = [f"p{n}" for n in range(PROCESSES)]
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=process_worker, args=(data_manager.DATA_DIR, p, DOMAINS_PER_WORKER)) for p in prefixes]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0, "a worker process failed"
+
+    domains = saved_domains()
+    assert set(domains) == expected_domains(prefixes, DOMAINS_PER_WORKER), "lost or extra updates"
+    print(f"✓ {PROCESSES} processes, {len(domains)} domains left, no lost updates")
+
+
+def test_compaction_keeps_data():
+    """Compacting the change log into the snapshot must not change the list"""
+    print("\n--- Test 3: Log compaction ---")
+    use_temp_data_dir()
+    add_then_remove_odd("c", DOMAINS_PER_WORKER)
+    before = saved_domains()
+    data_manager.compact_user_log(TEST_USER)
+
+    log_path = os.path.join(data_manager.DATA_DIR, f"{TEST_USER}_domains.log")
+    assert not os.path.exists(log_path), "log should be removed after compaction"
+    with open(os.path.join(data_manager.DATA_DIR, f"{TEST_USER}_domains.json")) as f:
+        snapshot = json.load(f)
+    assert [d["domain"] for d in snapshot["domains"]] == before, "snapshot differs from pre-compaction state"
+    assert snapshot["generation"] == 1
+    assert saved_domains() == before
+    print(f"✓ compaction kept all {len(before)} domains")
+
+
+def test_torn_log_line_is_ignored():
+    """A half-written last log line (crash mid-append) must not break reads"""
+    print("\n--- Test 4: Torn log line ---")
+    use_temp_data_dir()
+    add_domains("torn", 3)
+    with open(os.path.join(data_manager.DATA_DIR, f"{TEST_USER}_domains.log"), "a") as f:
+        f.write('{"op": "add", "record": {"domain": "half')
+    assert len(saved_domains()) == 3
+    add_domains("after", 1)
+    assert len(saved_domains()) == 4, "append after a torn line was lost"
+    print("✓ torn line skipped, later appends still readable")
+
+
+def test_folded_log_is_not_replayed():
+    """A log left behind by a crash after the snapshot was written is not applied twice"""
+    print("\n--- Test 5: Crash between snapshot and log removal ---")
+    use_temp_data_dir()
+    add_domains("gen", 4)
+    log_path = os.path.join(data_manager.DATA_DIR, f"{TEST_USER}_domains.log")
+    with open(log_path) as f:
+        leftover = f.read()
+    # the list is overwritten without gen-1 and gen-2, then the crash: the log that
+    # added them was never removed.
+    kept = [d for d in data_manager.get_user_domains(TEST_USER) if d["domain"] in ("gen-0.example.com", "gen-3.example.com")]
+    data_manager.save_user_domains(TEST_USER, kept)
+    with open(log_path, "w") as f:
+        f.write(leftover)
+    expected = ["gen-0.example.com", "gen-3.example.com"]
+    assert saved_domains() == expected, saved_domains()
+    # later ops on top of the new snapshot still apply, in the same (leftover) log.
+    data_manager.remove_user_domain(TEST_USER, "gen-0.example.com")
+    add_domains("gen", 1)
+    data_manager.compact_user_log(TEST_USER)
+    assert saved_domains() == ["gen-3.example.com", "gen-0.example.com"], saved_domains()
+    print("✓ ops already in the snapshot skipped, later ops applied")
+
+
+def test_non_op_log_lines_are_ignored():
+    """Log lines that are valid JSON but not ops must not break reads"""
+    print("\n--- Test 6: Non-op log lines ---")
+    use_temp_data_dir()
+    add_domains("odd", 2)
+    with open(os.path.join(data_manager.DATA_DIR, f"{TEST_USER}_domains.log"), "a") as f:
+        f.write('[1, 2]\n"text"\nnull\n{"no_op": true}\n')
+    assert len(saved_domains()) == 2
+    add_domains("after", 1)
+    assert len(saved_domains()) == 3
+    print("✓ non-dict and op-less lines skipped")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - DATA MANAGER STRESS TESTS")
+    print("=" * 70)
+
+    tests = [test_concurrent_threads, test_concurrent_processes,
+             test_compaction_keeps_data, test_torn_log_line_is_ignored,
+             test_folded_log_is_not_replayed, test_non_op_log_lines_are_ignored]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Tests for the change event log (event_log.py)
+Checks offset-based reads across segments, retention, recovery from a
+torn last record, appends from several processes at once, and that
+domain changes and check results produce the right events, per owner
+when owners of one domain set different assertions, and that a long poll
+on /api/changes keeps waiting through other users' events, within a cap
+on the pages it skips, and does not tell a user who else monitors a
+shared domain. Reads deep into a segment start from its offset index.
+Runs standalone: python3 tests/test_event_log.py
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import data_manager
+import event_log
+from event_log import EventLog, encode_event
+from assertions import domain_assertions
+from check_result import CheckResult, CertStatus
+import user_management
+
+PROCESSES = 4
+EVENTS_PER_PROCESS = 200
+
+
+def temp_log():
+    return EventLog(tempfile.mkdtemp(prefix="dm_events_"))
+
+
+def events_for(prefix, count):
+    return [encode_event("status_changed", f"{prefix}{i}.com", ["alice"], {"status": 200}) for i in range(count)]
+
+
+def read_all(log, offset=0):
+    collected = []
+    while True:
+        events, offset = log.read(offset, limit=100)
+        if not events:
+            return collected, offset
+        collected.extend(events)
+
+
+def test_offsets_and_continuation():
+    """Offsets count events, a consumer continues exactly where it stopped"""
+    print("\n--- Test 1: Offsets ---")
+    log = temp_log()
+    assert log.read(0) == ([], 0) and log.end_offset() == 0
+    assert log.append(events_for("a", 5)) == 5
+    assert log.append(events_for("b", 3)) == 8
+    first, next_offset = log.read(0, limit=4)
+    assert [e["offset"] for e in first] == [0, 1, 2, 3] and next_offset == 4
+    rest, next_offset = log.read(next_offset)
+    assert [e["domain"] for e in rest] == ["a4.com", "b0.com", "b1.com", "b2.com"] and next_offset == 8
+    assert log.read(8) == ([], 8)
+    assert rest[0]["users"] == ["alice"] and rest[0]["data"] == {"status": 200}
+    print(f"✓ 8 events, read in two batches, continuation offset {next_offset}")
+
+
+def test_segments_and_retention():
+    """Events span segments, old segments are dropped and reads start at the oldest kept one"""
+    print("\n--- Test 2: Segments and retention ---")
+    saved = event_log.SEGMENT_MAX_BYTES, event_log.EVENT_LOG_MAX_SEGMENTS
+    event_log.SEGMENT_MAX_BYTES, event_log.EVENT_LOG_MAX_SEGMENTS = 1024, 3
+    try:
+        log = temp_log()
+        for i in range(100):
+            log.append(events_for(f"s{i}-", 1))
+    finally:
+        event_log.SEGMENT_MAX_BYTES, event_log.EVENT_LOG_MAX_SEGMENTS = saved
+    segments = log._segments()
+    assert len(segments) == 3, segments
+    events, end = read_all(log)
+    assert end == 100 and log.end_offset() == 100
+    assert events[0]["offset"] == log.first_offset() > 0
+    assert [e["offset"] for e in events] == list(range(log.first_offset(), 100)), "gap in offsets"
+    assert events[-1]["domain"] == "s99-0.com"
+    print(f"✓ {len(segments)} segments kept, events {log.first_offset()}..99 readable")
+
+
+def test_torn_record_is_repaired():
+    """A half-written last record is invisible to readers and cut off by the next append"""
+    print("\n--- Test 3: Torn last record ---")
+    log = temp_log()
+    log.append(events_for("t", 3))
+    segment = log._path(log._segments()[-1])
+    with open(segment, "ab") as f:
+        f.write(encode_event("status_changed", "torn.com", ["alice"])[:12])
+    fresh = EventLog(log.directory)  # another process's view
+    assert fresh.end_offset() == 3
+    assert [e["offset"] for e in fresh.read(0)[0]] == [0, 1, 2]
+    assert fresh.append(events_for("u", 1)) == 4
+    events, _ = read_all(EventLog(log.directory))
+    assert [e["domain"] for e in events] == ["t0.com", "t1.com", "t2.com", "u0.com"], events
+    print("✓ torn record skipped by readers and replaced by the next append")
+
+
+def append_from_process(directory, prefix):
+    log = EventLog(directory)
+    for i in range(EVENTS_PER_PROCESS):
+        log.append(events_for(f"{prefix}-{i}-", 1))
+
+
+def test_appends_from_several_processes():
+    """Concurrent writers in several processes never lose or corrupt an event"""
+    print("\n--- Test 4: Several writer processes ---")
+    directory = tempfile.mkdtemp(prefix="dm_events_")
+    workers = [multiprocessing.Process(target=append_from_process, args=(directory, f"p{n}")) for n in range(PROCESSES)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    events, end = read_all(EventLog(directory))
+    expected = PROCESSES * EVENTS_PER_PROCESS
+    assert end == expected and len(events) == expected, f"{len(events)} of {expected} events"
+    assert [e["offset"] for e in events] == list(range(expected))
+    assert len({e["domain"] for e in events}) == expected
+    print(f"✓ {expected} events from {PROCESSES} processes, offsets 0..{expected - 1} without gaps")
+
+
+def test_domain_and_result_events():
+    """Domain adds / removes and result changes are turned into events"""
+    print("\n--- Test 5: Event sources ---")
+    data_manager.DATA_DIR = tempfile.mkdtemp(prefix="dm_events_data_")
+    data_manager.add_user_domain("alice", {"domain": "shop.com", "priority": "critical"})
+    data_manager.remove_user_domain("alice", "shop.com")
+    data_manager.save_user_domains("alice", [{"domain": "blog.com"}])
+
+    down = CheckResult("blog.com", -1)
+    up = CheckResult("blog.com", 200, CertStatus.VALID, 1893456000, issuer="R3")
+    renewed = CheckResult("blog.com", 200, CertStatus.VALID, 1901232000, issuer="R3")
+    event_log.record_result_change({"alice"}, "blog.com", up, None)
+    event_log.record_result_change({"alice"}, "blog.com", down, up)
+    event_log.record_result_change({"alice"}, "blog.com", up, down)
+    event_log.record_result_change({"alice"}, "blog.com", renewed, up)
+
+    events, _ = read_all(event_log.get_event_log())
+    summary = [(e["type"], e["domain"]) for e in events]
+    assert summary == [("domain_added", "shop.com"), ("domain_removed", "shop.com"), ("domain_added", "blog.com"),
+                       ("status_changed", "blog.com"), ("status_changed", "blog.com"),
+                       ("status_changed", "blog.com"), ("cert_renewed", "blog.com")], summary
+    assert events[0]["data"] == {"priority": "critical"} and events[0]["users"] == ["alice"]
+    assert events[4]["data"]["state"] == "down" and events[4]["data"]["previous_status"] == 200
+    assert events[6]["data"]["previous_expiry"] == "2030-01-01", events[6]
+    print(f"✓ {len(events)} events: {', '.join(t for t, _ in summary)}")
+
+
+def test_events_follow_each_owners_assertions():
+    """A shared domain's status events go to the owners whose view changed"""
+    print("\n--- Test 6: Per-owner status events ---")
+    data_manager.DATA_DIR = tempfile.mkdtemp(prefix="dm_events_data_")
+    domain_assertions.sync_user("alice", [{"domain": "shop.com", "assertions": {"contains": "Add to cart"}}])
+    domain_assertions.sync_user("bob", [{"domain": "shop.com", "assertions": {"contains": "Sold out"}}])
+    alice_key = domain_assertions.for_user("alice", "shop.com").key
+    bob_key = domain_assertions.for_user("bob", "shop.com").key
+
+    def result(alice_error, bob_error):
+        checked = CheckResult("shop.com", 200)
+        checked.assertion_outcomes = ((alice_key, alice_error, None), (bob_key, bob_error, None))
+        return checked
+
+    try:
+        first = result(None, None)
+        event_log.record_result_change(["alice", "bob"], "shop.com", first, None)
+        event_log.record_result_change(["alice", "bob"], "shop.com", result(None, "expected text not found"), first)
+    finally:
+        domain_assertions.sync_user("alice", [])
+        domain_assertions.sync_user("bob", [])
+    events, _ = read_all(event_log.get_event_log())
+    summary = [(e["type"], e["users"], e["data"]["state"]) for e in events]
+    assert summary == [("status_changed", ["alice"], "up"), ("status_changed", ["bob"], "up"),
+                       ("status_changed", ["bob"], "degraded")], summary
+    assert events[2]["data"]["assertion_error"] == "expected text not found"
+    print(f"✓ {len(events)} events, only bob's view went degraded")
+
+
+def test_long_poll_waits_for_own_events():
+    """A waiting non-admin is not woken up with an empty page by another user's event"""
+    print("\n--- Test 7: Long poll per user ---")
+    os.environ["MONITOR_ENGINE"] = "0"
+    import app as app_module
+    data_manager.DATA_DIR = tempfile.mkdtemp(prefix="dm_events_data_")
+    user_management.USERS_FILE = os.path.join(data_manager.DATA_DIR, "users.json")
+    client = app_module.create_app().test_client()
+    with client.session_transaction() as sess:
+        sess["username"] = "alice"
+    log = event_log.get_event_log()
+
+    def publish_later():
+        time.sleep(0.3)
+        log.append([encode_event("domain_added", "bob.com", ["bob"])])
+        time.sleep(0.7)
+        log.append([encode_event("domain_added", "alice.com", ["alice"])])
+
+    writer = threading.Thread(target=publish_later)
+    writer.start()
+    started = time.monotonic()
+    page = client.get("/api/changes?offset=0&wait=5").get_json()
+    writer.join()
+    assert [e["domain"] for e in page["events"]] == ["alice.com"], page
+    assert page["next_offset"] == 2, page
+    waited = time.monotonic() - started
+    quiet = client.get("/api/changes?offset=2&wait=1").get_json()
+    assert quiet["events"] == [] and quiet["next_offset"] == 2, quiet
+
+    log.append([encode_event("cert_renewed", "shared.com", ["alice", "bob"], {"issuer": "R3"})])
+    shared = client.get("/api/changes?offset=2").get_json()["events"]
+    assert [(e["domain"], e["users"]) for e in shared] == [("shared.com", ["alice"])], shared
+    print(f"✓ woken by alice's own event after {waited:.1f}s, bob's event skipped; an idle poll ends empty; "
+          f"a shared domain's event does not name bob")
+
+
+def test_skipping_is_capped_and_indexed():
+    """A long run of other users' events is skipped a few pages at a time, reads seek through the index"""
+    print("\n--- Test 8: Skip cap and segment index ---")
+    import app as app_module
+    data_manager.DATA_DIR = tempfile.mkdtemp(prefix="dm_events_data_")
+    user_management.USERS_FILE = os.path.join(data_manager.DATA_DIR, "users.json")
+    client = app_module.create_app().test_client()
+    with client.session_transaction() as sess:
+        sess["username"] = "alice"
+    log = event_log.get_event_log()
+    log.append([encode_event("domain_added", f"bob{i}.com", ["bob"]) for i in range(1000)])
+    log.append([encode_event("domain_added", "alice.com", ["alice"])])
+
+    saved = app_module.CHANGES_MAX_SKIPPED_PAGES
+    app_module.CHANGES_MAX_SKIPPED_PAGES = 3
+    try:
+        started = time.monotonic()
+        first = client.get("/api/changes?offset=0&limit=100&wait=5").get_json()
+        elapsed = time.monotonic() - started
+        second = client.get(f"/api/changes?offset={first['next_offset']}&limit=100&wait=5").get_json()
+        while not second["events"]:
+            second = client.get(f"/api/changes?offset={second['next_offset']}&limit=100&wait=5").get_json()
+    finally:
+        app_module.CHANGES_MAX_SKIPPED_PAGES = saved
+    assert first["events"] == [] and first["next_offset"] == 300 and elapsed < 2, (first, elapsed)
+    assert [e["offset"] for e in second["events"]] == [1000], second
+
+    marks = log._index.get(0, [])
+    assert len(marks) == 1000 // event_log.EVENT_INDEX_STRIDE + 1, marks
+    fresh = EventLog(log.directory)
+    for offset in (0, 255, 256, 700, 999, 1000):
+        assert log.read(offset, 2) == fresh.read(offset, 2), offset
+    print(f"✓ first request answered after {elapsed:.2f}s at offset {first['next_offset']}, "
+          f"the client reached alice's event; {len(marks)} index marks, indexed reads match a full walk")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - CHANGE EVENT LOG TESTS")
+    print("=" * 70)
+
+    tests = [test_offsets_and_continuation, test_segments_and_retention, test_torn_record_is_repaired,
+             test_appends_from_several_processes, test_domain_and_result_events,
+             test_events_follow_each_owners_assertions, test_long_poll_waits_for_own_events,
+             test_skipping_is_capped_and_indexed]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for the read-through file cache (data_manager.FileCache)
+Checks that repeated reads are served from memory, that a write by another
+worker process is seen on the next read, that entries expire and that the
+least recently used ones are evicted, and that callers never get the
+cached objects themselves.
+Runs standalone: python3 tests/test_file_cache.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import data_manager
+from data_manager import FileCache
+
+
+def temp_json(data):
+    fd, path = tempfile.mkstemp(prefix="dm_cache_", suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    return path
+
+
+def test_hits_and_outside_writes():
+    """Unchanged files are cache hits, a write from elsewhere is a miss and is reloaded"""
+    print("\n--- Test 1: Hits and outside writes ---")
+    path = temp_json([{"domain": "a.com"}])
+    before = data_manager.cache_stats()
+    assert data_manager.read_json_cached(path) == [{"domain": "a.com"}]
+    assert data_manager.read_json_cached(path) == [{"domain": "a.com"}]
+    # another worker rewrites the file behind our back (different size, new inode).
+    data_manager._atomic_write_json(path, [{"domain": "a.com"}, {"domain": "b.com"}])
+    assert [d["domain"] for d in data_manager.read_json_cached(path)] == ["a.com", "b.com"]
+    after = data_manager.cache_stats()
+    assert after["hits"] - before["hits"] == 1 and after["stale"] - before["stale"] == 1, (before, after)
+    print(f"✓ 1 hit, outside write picked up ({after})")
+
+
+def test_missing_file_and_copies():
+    """A missing file gives the default, and changing a returned list never touches the cache"""
+    print("\n--- Test 2: Missing files and copies ---")
+    missing = os.path.join(tempfile.mkdtemp(prefix="dm_cache_"), "nope.json")
+    assert data_manager.read_json_cached(missing, default=[]) == []
+    try:
+        data_manager.read_json_cached(missing)
+        raise AssertionError("missing file without a default must raise")
+    except FileNotFoundError:
+        pass
+    path = temp_json([{"domain": "a.com"}])
+    first = data_manager.read_json_cached(path)
+    first[0]["domain"] = "changed.com"
+    first.append({"domain": "extra.com"})
+    assert data_manager.read_json_cached(path) == [{"domain": "a.com"}], "cached value was modified"
+    print("✓ default for missing files, callers get copies")
+
+
+def test_ttl_and_lru_eviction():
+    """Entries expire after the TTL and the least recently used entry is evicted first"""
+    print("\n--- Test 3: TTL and LRU ---")
+    cache = FileCache(max_entries=2, ttl=0.05)
+    cache.put("a", 1, "A")
+    cache.put("b", 1, "B")
+    assert cache.get("a", 1) == "A"  # a is now the most recently used
+    cache.put("c", 1, "C")
+    assert cache.get("b", 1) is None and cache.get("a", 1) == "A" and cache.get("c", 1) == "C"
+    assert cache.get("a", 2) is None, "a changed signature must be a miss"
+    time.sleep(0.06)
+    assert cache.get("c", 1) is None, "expired entry served"
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["entries"] == 0, stats
+    print(f"✓ {stats}")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - FILE CACHE TESTS")
+    print("=" * 70)
+
+    tests = [test_hits_and_outside_writes, test_missing_file_and_copies, test_ttl_and_lru_eviction]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
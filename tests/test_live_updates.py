@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tests for the live status stream (live_updates)
+Checks fan-out to the right users, per-domain coalescing and the resync
+fallback for slow clients, without running the web app.
+Runs standalone: python3 tests/test_live_updates.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from live_updates import StatusBroadcaster, Subscription
+
+
+def test_fan_out_only_to_owners():
+    """An event reaches every stream of the owners and nobody else"""
+    print("\n--- Test 1: Fan-out to owners ---")
+    broadcaster = StatusBroadcaster()
+    alice_tabs = [broadcaster.subscribe("alice"), broadcaster.subscribe("alice")]
+    bob = broadcaster.subscribe("bob")
+    assert broadcaster.has_subscribers(["carol", "alice"])
+    assert not broadcaster.has_subscribers(["carol"])
+
+    broadcaster.publish(["alice"], "example.com", '{"domain": "example.com"}')
+    for tab in alice_tabs:
+        assert tab.wait(0) == [("status", '{"domain": "example.com"}')]
+    assert bob.wait(0) == [], "bob does not own the domain"
+    print("✓ both of alice's tabs got the event, bob got nothing")
+
+
+def test_slow_client_is_coalesced():
+    """A client that does not read keeps only the newest state per domain"""
+    print("\n--- Test 2: Coalescing ---")
+    subscription = Subscription("alice", max_pending=10)
+    for i in range(100):
+        subscription.push("flappy.com", f'{{"n": {i}}}')
+    subscription.push("other.com", '{"n": 0}')
+    events = subscription.wait(0)
+    assert events == [("status", '{"n": 99}'), ("status", '{"n": 0}')], events
+    print("✓ 101 pushes became 2 events, newest state kept")
+
+
+def test_overflow_becomes_resync():
+    """Past max_pending domains the backlog is replaced by one resync event"""
+    print("\n--- Test 3: Resync on overflow ---")
+    subscription = Subscription("alice", max_pending=10)
+    for i in range(25):
+        subscription.push(f"site{i}.com", "{}")
+    assert subscription.wait(0) == [("resync", "{}")]
+    assert subscription.dropped == 25
+    subscription.push("site0.com", '{"n": 1}')
+    assert subscription.wait(0) == [("status", '{"n": 1}')], "stream must recover after a resync"
+    print(f"✓ {subscription.dropped} events dropped, one resync sent, stream recovered")
+
+
+def test_wait_wakes_up_on_push():
+    """A waiting stream is woken by a push from another thread"""
+    print("\n--- Test 4: Wake-up ---")
+    subscription = Subscription("alice")
+    threading.Timer(0.1, subscription.push, args=("example.com", "{}")).start()
+    start = time.monotonic()
+    events = subscription.wait(5)
+    assert events == [("status", "{}")]
+    assert time.monotonic() - start < 2, "wait() did not wake up on push"
+    print("✓ woken up by the push, not the timeout")
+
+
+def test_oldest_stream_is_evicted():
+    """Opening more streams than allowed closes the oldest one"""
+    print("\n--- Test 5: Stream limit ---")
+    broadcaster = StatusBroadcaster(max_streams_per_user=2)
+    first, second, third = (broadcaster.subscribe("alice") for _ in range(3))
+    assert first.closed and not second.closed and not third.closed
+    broadcaster.unsubscribe(second)
+    broadcaster.unsubscribe(third)
+    assert broadcaster.stats()["streams"] == 0
+    print("✓ oldest stream closed, unsubscribe cleans up")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - LIVE UPDATE TESTS")
+    print("=" * 70)
+
+    tests = [test_fan_out_only_to_owners, test_slow_client_is_coalesced, test_overflow_becomes_resync,
+             test_wait_wakes_up_on_push, test_oldest_stream_is_evicted]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
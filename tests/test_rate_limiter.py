@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Tests for per-host rate limiting (rate_limiter.py)
+Checks the round-robin interleave across zones (and that it stays linear on
+big bulk lists), the token bucket rate, the in-flight cap per host group and
+how checks are spread over an interval.
+No network access needed, host groups are set up front.
+Runs standalone: python3 tests/test_rate_limiter.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rate_limiter import HostRateLimiter, TokenBucket, spread_offsets
+
+
+def test_interleave_round_robin():
+    """Domains of one zone are spread out instead of running back to back"""
+    print("\n--- Test 1: Interleave ---")
+    limiter = HostRateLimiter()
+    domains = ["a.shop.com", "b.shop.com", "c.shop.com", "blog.org", "www.blog.org", "news.net"]
+    ordered = limiter.interleave(domains)
+    assert sorted(ordered) == sorted(domains), "domains lost or duplicated"
+    assert ordered == ["a.shop.com", "blog.org", "news.net", "b.shop.com", "www.blog.org", "c.shop.com"], ordered
+    assert limiter.interleave([]) == []
+    print(f"✓ {ordered}")
+
+
+def test_interleave_large_list():
+    """A 50k domain bulk list with one huge zone is interleaved in linear time"""
+    print("\n--- Test 2: Interleave a large list ---")
+    limiter = HostRateLimiter()
+    domains = [f"site{i}.bigcdn.com" for i in range(40000)] + [f"shop{i}.com" for i in range(10000)]
+    started = time.perf_counter()
+    ordered = limiter.interleave(domains)
+    elapsed = time.perf_counter() - started
+    assert len(ordered) == len(domains) and len(set(ordered)) == len(domains)
+    assert ordered[:2] == ["site0.bigcdn.com", "shop0.com"], ordered[:2]
+    assert elapsed < 2.0, f"interleave took {elapsed:.2f}s"
+    print(f"✓ {len(ordered)} domains in {elapsed * 1000:.0f}ms")
+
+
+def test_token_bucket_rate():
+    """After the burst, acquire() is held to the configured rate"""
+    print("\n--- Test 3: Token bucket ---")
+    bucket = TokenBucket(rate=20.0, capacity=2)
+    started = time.monotonic()
+    for _ in range(2):
+        bucket.acquire()
+    burst = time.monotonic() - started
+    for _ in range(4):
+        bucket.acquire()
+    elapsed = time.monotonic() - started
+    assert burst < 0.05, f"burst took {burst:.3f}s"
+    # 4 tokens beyond the burst at 20/s is at least 0.2s.
+    assert 0.18 <= elapsed < 1.0, f"6 acquires took {elapsed:.3f}s"
+    print(f"✓ burst of 2 immediate, 4 more in {elapsed:.2f}s")
+
+
+def test_in_flight_cap_per_group():
+    """Never more than max_in_flight checks run against one host group"""
+    print("\n--- Test 4: In-flight cap ---")
+    limiter = HostRateLimiter(rate=1000.0, burst=1000, max_in_flight=2)
+    now = time.monotonic()
+    for i in range(8):
+        limiter._resolved[f"vhost{i}.com"] = ("203.0.113.10", now)
+    limiter._resolved["other.com"] = ("203.0.113.99", now)
+    active = {"shared": 0, "peak": 0}
+    guard = threading.Lock()
+
+    def check(domain):
+        with limiter.slot(domain):
+            with guard:
+                active["shared"] += 1
+                active["peak"] = max(active["peak"], active["shared"])
+            time.sleep(0.02)
+            with guard:
+                active["shared"] -= 1
+
+    threads = [threading.Thread(target=check, args=(f"vhost{i}.com",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    # a different group is not held up by the busy one.
+    started = time.monotonic()
+    with limiter.slot("other.com"):
+        other_wait = time.monotonic() - started
+    for thread in threads:
+        thread.join()
+    assert active["peak"] == 2, f"peak in flight {active['peak']}"
+    assert other_wait < 0.02, f"other group waited {other_wait:.3f}s"
+    print(f"✓ peak {active['peak']} in flight on the shared IP, other group not blocked")
+
+
+def test_spread_offsets():
+    """Checks are spread over the interval with bounded jitter"""
+    print("\n--- Test 5: Spread ---")
+    offsets = spread_offsets(10, 60, jitter=0.1)
+    assert len(offsets) == 10 and all(0 <= o <= 60 for o in offsets)
+    for i, offset in enumerate(offsets):
+        assert abs(offset - i * 6) <= 0.6 + 1e-9, (i, offset)
+    assert spread_offsets(3, 0) == [0.0, 0.0, 0.0] and spread_offsets(0, 60) == []
+    print(f"✓ {[round(o, 1) for o in offsets]}")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - RATE LIMITER TESTS")
+    print("=" * 70)
+
+    tests = [test_interleave_round_robin, test_interleave_large_list, test_token_bucket_rate,
+             test_in_flight_cap_per_group, test_spread_offsets]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Tests for redirect-chain caching (redirects.py)
+Checks when a chain becomes trusted for direct probes of its final URL,
+that it is revalidated, that a changed chain is reported, that the
+engine keeps chains across a warm restart and drops them with the domain,
+that a direct probe still notices an outage of the first hop (and stops
+trusting the chain), and that single redirects are always walked.
+No network access needed: chains are recorded directly, and the direct
+probes go to a redirecting server on localhost.
+Runs standalone: python3 tests/test_redirects.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import requests
+from redirects import RedirectCache, redirect_cache
+from domain_checker import fetch
+from engine import MonitorEngine
+
+CHAIN = ("https://example.com/", "https://www.example.com/", "https://cdn.example.net/home")
+NOW = 1_800_000_000.0
+
+
+def test_chain_becomes_stable():
+    """The final URL is only probed directly after the chain was seen twice"""
+    print("\n--- Test 1: Stable chains ---")
+    cache = RedirectCache(stable_after=2, revalidate=3600)
+    assert cache.target("example.com", NOW) is None
+    cache.record("example.com", CHAIN, NOW)
+    assert cache.target("example.com", NOW) is None, "trusted after a single walk"
+    stored, previous = cache.record("example.com", tuple(CHAIN), NOW)
+    assert previous is None and stored is cache.chain("example.com")
+    assert cache.target("example.com", NOW + 10) == CHAIN[-1]
+    single = ("http://example.org/", "https://example.org/")
+    cache.record("example.org", single, NOW)
+    cache.record("example.org", single, NOW)
+    assert cache.target("example.org", NOW) is None, "a single redirect has nothing to skip"
+    print(f"✓ direct probes go to {CHAIN[-1]}, a single redirect is always walked")
+
+
+def test_chain_is_revalidated():
+    """After the revalidation period the chain is walked again"""
+    print("\n--- Test 2: Revalidation ---")
+    cache = RedirectCache(stable_after=1, revalidate=3600)
+    cache.record("example.com", CHAIN, NOW)
+    assert cache.target("example.com", NOW + 3599) == CHAIN[-1]
+    assert cache.target("example.com", NOW + 3601) is None
+    cache.record("example.com", CHAIN, NOW + 3601)
+    assert cache.target("example.com", NOW + 3602) == CHAIN[-1]
+    print("✓ walked again after an hour, trusted again after the walk")
+
+
+def test_changed_chain_is_reported():
+    """A different chain is reported with the old one and has to become stable again"""
+    print("\n--- Test 3: Chain changes ---")
+    cache = RedirectCache(stable_after=2)
+    cache.record("example.com", CHAIN, NOW)
+    cache.record("example.com", CHAIN, NOW)
+    moved = CHAIN[:2] + ("https://parking.example.org/",)
+    stored, previous = cache.record("example.com", moved, NOW)
+    assert stored == moved and previous == CHAIN
+    assert cache.target("example.com", NOW) is None, "a changed chain must be re-confirmed"
+    _, previous = cache.record("example.com", (), NOW)
+    assert previous == moved and cache.chain("example.com") == ()
+    stats = cache.stats()
+    assert stats["changes"] == 2 and stats["entries"] == 0, stats
+    print(f"✓ {stats}")
+
+
+def test_engine_keeps_chains_across_restart():
+    """Chains survive a warm restart and are forgotten with their domain"""
+    print("\n--- Test 4: Snapshots and removal ---")
+    path = os.path.join(tempfile.mkdtemp(prefix="dm_redirects_"), "engine_state.bin")
+    redirect_cache.record("example.com", CHAIN)
+    redirect_cache.record("example.com", CHAIN)
+    old = MonitorEngine(snapshot_path=path)
+    old.sync_user("alice", [{"domain": "example.com"}])
+    old.save_snapshot()
+    redirect_cache.forget("example.com")
+
+    new = MonitorEngine(snapshot_path=path)
+    new.load_snapshot()
+    new.sync_user("alice", [{"domain": "example.com"}])
+    assert redirect_cache.target("example.com") == CHAIN[-1], "chain not restored"
+    new.sync_user("alice", [])
+    assert redirect_cache.chain("example.com") == (), "chain kept for a removed domain"
+    print("✓ restored with the snapshot, dropped when the domain was removed")
+
+
+class ChainHandler(BaseHTTPRequestHandler):
+    # /start -> /middle -> /final, each answers with the status set in `statuses` if there is one.
+    statuses = {}
+    hops = {"/start": "/middle", "/middle": "/final"}
+
+    def answer(self):
+        status = self.statuses.get(self.path)
+        if status is None and self.path in self.hops:
+            self.send_response(301)
+            self.send_header("Location", self.hops[self.path])
+        else:
+            self.send_response(status or 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def refuse(self):
+        # like many hosts, HEAD is not supported: the first hop must be asked with a GET.
+        self.send_response(405)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = answer
+    do_HEAD = refuse
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_direct_probe_checks_the_first_hop():
+    """A direct probe asks the first hop, counts only when it succeeds, and re-walks on an outage"""
+    print("\n--- Test 5: Direct probes ---")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChainHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    chain = (f"{base}/start", f"{base}/middle", f"{base}/final")
+    # the full walk requests https://<domain>, refused at once here, so a fallback to it shows as an error.
+    domain = "127.0.0.1:9"
+    redirect_cache.record(domain, chain)
+    redirect_cache.record(domain, chain)
+    direct = redirect_cache.stats()["direct"]
+    try:
+        response, found = fetch(domain)
+        assert response.url == chain[-1] and response.status_code == 200 and found == chain
+        assert redirect_cache.stats()["direct"] == direct + 1
+        for broken in ("/start", "/final"):
+            redirect_cache.record(domain, chain)
+            redirect_cache.record(domain, chain)
+            ChainHandler.statuses = {broken: 503}
+            try:
+                fetch(domain)
+                raise AssertionError(f"{broken} outage hidden by the cached chain")
+            except requests.exceptions.RequestException:
+                pass
+            assert redirect_cache.stats()["direct"] == direct + 1, f"failed probe of {broken} counted as direct"
+            if broken == "/start":
+                assert redirect_cache.target(domain) is None, "chain still trusted after its first hop failed"
+                redirect_cache.record(domain, chain)
+                assert redirect_cache.target(domain) is None, "trusted again after a single walk"
+    finally:
+        ChainHandler.statuses = {}
+        redirect_cache.forget(domain)
+        server.shutdown()
+    print("✓ first hop asked with a GET on every direct probe, outages of /start and /final fall back to a "
+          "full walk, a failed first hop makes the chain unstable")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - REDIRECT CHAIN TESTS")
+    print("=" * 70)
+
+    tests = [test_chain_becomes_stable, test_chain_is_revalidated, test_changed_chain_is_reported,
+             test_engine_keeps_chains_across_restart, test_direct_probe_checks_the_first_hop]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Tests for confirming failed checks (the retry lane in domain_checker.py)
+Checks that a transient failure is retried and reported as up, that a
+domain is only reported down after every confirmation attempt failed,
+how the backoff grows, and that results stream out while retries run.
+No network access needed, the probe is replaced by a scripted one.
+Runs standalone: python3 tests/test_retries.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import domain_checker
+from domain_checker import iter_domain_checks, check_domains_concurrently, confirm_failure, retry_delay
+from check_result import CheckResult, STATUS_FAILED
+from rate_limiter import HostRateLimiter
+
+
+class ScriptedProbe:
+    # stands in for check_domain_status: each domain answers with its scripted
+    # status codes in turn (the last one repeats), and every call is counted.
+    def __init__(self, script: dict):
+        self.script = script
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, domain, assertions=None):
+        with self.lock:
+            attempt = self.calls.get(domain, 0)
+            self.calls[domain] = attempt + 1
+        statuses = self.script[domain]
+        return CheckResult(domain, statuses[min(attempt, len(statuses) - 1)])
+
+
+def local_limiter(domains):
+    # a limiter that never resolves DNS: every domain gets its own group up front.
+    limiter = HostRateLimiter(rate=1000.0, burst=1000, max_in_flight=10)
+    now = time.monotonic()
+    for i, domain in enumerate(domains):
+        limiter._resolved[domain] = (f"group{i}", now)
+    return limiter
+
+
+def run_with(probe, func, *args, **kwargs):
+    saved = domain_checker.check_domain_status, domain_checker.RETRY_BASE_DELAY
+    domain_checker.check_domain_status, domain_checker.RETRY_BASE_DELAY = probe, 0.01
+    try:
+        return func(*args, **kwargs)
+    finally:
+        domain_checker.check_domain_status, domain_checker.RETRY_BASE_DELAY = saved
+
+
+def test_transient_failure_is_not_reported():
+    """A domain that fails once and then answers is reported up after one retry"""
+    print("\n--- Test 1: Transient failure ---")
+    probe = ScriptedProbe({"blip.com": [STATUS_FAILED, 200], "steady.com": [200]})
+    domains = ["blip.com", "steady.com"]
+    results = run_with(probe, check_domains_concurrently, domains, limiter=local_limiter(domains))
+    assert [r.domain for r in results] == domains
+    assert results[0].status_code == 200 and results[0].attempts == 2, results[0].to_dict()
+    assert probe.calls == {"blip.com": 2, "steady.com": 1}, probe.calls
+    print(f"✓ blip.com recovered on attempt {results[0].attempts}")
+
+
+def test_down_after_every_attempt_failed():
+    """A domain is only FAILED after confirm_attempts consecutive failures"""
+    print("\n--- Test 2: Confirmed failure ---")
+    probe = ScriptedProbe({"dead.com": [STATUS_FAILED]})
+    limiter = local_limiter(["dead.com"])
+    result = run_with(probe, confirm_failure, "dead.com", 3, limiter)
+    assert result.failed and result.attempts == 3 and probe.calls["dead.com"] == 2
+    results = run_with(probe, check_domains_concurrently, ["dead.com"], limiter=limiter, confirm_attempts=1)
+    assert results[0].failed and results[0].attempts == 1, "confirm_attempts=1 must not retry"
+    print(f"✓ reported down after {result.attempts} attempts, no retry with confirm_attempts=1")
+
+
+def test_backoff_grows_and_is_capped():
+    """Retry delays double per attempt with jitter and stop at RETRY_MAX_DELAY"""
+    print("\n--- Test 3: Backoff ---")
+    for attempt, full in ((1, 0.5), (2, 1.0), (3, 2.0), (10, domain_checker.RETRY_MAX_DELAY)):
+        delays = [retry_delay(attempt) for _ in range(200)]
+        assert all(full * 0.5 <= d <= full for d in delays), (attempt, min(delays), max(delays))
+    print("✓ 0.5s, 1s, 2s ... capped, each jittered down to half")
+
+
+def test_results_stream_while_retries_run():
+    """Good results are yielded before a slow retry finishes"""
+    print("\n--- Test 4: Streaming ---")
+    probe = ScriptedProbe({"flaky.com": [STATUS_FAILED, STATUS_FAILED, 200]})
+    probe.script.update({f"ok{i}.com": [200] for i in range(20)})
+    domains = ["flaky.com"] + [f"ok{i}.com" for i in range(20)]
+    order = [r.domain for r in run_with(probe, lambda: list(iter_domain_checks(domains, limiter=local_limiter(domains))))]
+    assert sorted(order) == sorted(domains) and len(order) == len(domains), order
+    assert order[-1] == "flaky.com", "the retried domain should finish last"
+    print(f"✓ {len(order) - 1} results streamed before flaky.com recovered on attempt 3")
+
+
+def test_large_list_with_retries():
+    """A big list with many retries finishes quickly and yields every domain once"""
+    print("\n--- Test 5: Large list ---")
+    domains = [f"site{i}.com" for i in range(20000)]
+    probe = ScriptedProbe({d: [STATUS_FAILED, 200] if i % 10 == 0 else [200] for i, d in enumerate(domains)})
+    limiter = local_limiter(domains)
+    started = time.perf_counter()
+    results = run_with(probe, lambda: list(iter_domain_checks(domains, max_workers=20, limiter=limiter)))
+    elapsed = time.perf_counter() - started
+    assert len(results) == len(domains) and {r.domain for r in results} == set(domains)
+    assert all(r.status_code == 200 for r in results)
+    assert sum(r.attempts == 2 for r in results) == 2000
+    assert elapsed < 60, f"took {elapsed:.1f}s"
+    print(f"✓ {len(domains)} domains with 2000 retries in {elapsed:.1f}s")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - RETRY LANE TESTS")
+    print("=" * 70)
+
+    tests = [test_transient_failure_is_not_reported, test_down_after_every_attempt_failed,
+             test_backoff_grows_and_is_capped, test_results_stream_while_retries_run,
+             test_large_list_with_retries]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
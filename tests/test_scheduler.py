@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Fair-share tests for the check scheduler
+Checks that one tenant with a huge backlog cannot starve the others, that
+weights set each tenant's share, and that priority classes still come first.
+Runs standalone: python3 tests/test_scheduler.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scheduler import CheckScheduler
+from engine import MonitorEngine
+
+CAPACITY = 10
+
+
+def dispatch_all(scheduler, now):
+    # drains the ready work batch by batch, returns the tenants in dispatch order.
+    order = []
+    while True:
+        batch = scheduler.next_batch(CAPACITY, now=now)
+        if not batch:
+            return order
+        for entry in batch:
+            order.append(entry.tenant)
+            scheduler.complete(entry.domain, now=now)
+
+
+def test_light_tenant_is_not_starved():
+    """A light tenant's due domains go out right away, not after a heavy backlog"""
+    print("\n--- Test 1: Heavy vs light tenant ---")
+    scheduler = CheckScheduler()
+    now = time.time()
+    for i in range(5000):
+        scheduler.schedule(f"heavy{i}.com", "normal", 3600, first_due=now - 60, tenant="heavy")
+    # the heavy backlog is already being worked on when the light tenant's domains come due.
+    first = scheduler.next_batch(CAPACITY, now=now)
+    assert all(e.tenant == "heavy" for e in first)
+    for i in range(5):
+        scheduler.schedule(f"light{i}.com", "normal", 3600, first_due=now, tenant="light")
+
+    order = dispatch_all(scheduler, now)
+    last_light = max(i for i, tenant in enumerate(order) if tenant == "light")
+    assert last_light < 3 * CAPACITY, f"light tenant waited behind {last_light} heavy checks"
+    print(f"✓ all light domains dispatched within the first {last_light + 1} of {len(order)} checks")
+
+
+def test_weights_set_the_share():
+    """A tenant with weight 3 gets about three times the checks of a weight 1 tenant"""
+    print("\n--- Test 2: Weighted shares ---")
+    scheduler = CheckScheduler()
+    scheduler.set_weight("gold", 3)
+    now = time.time()
+    for i in range(2000):
+        scheduler.schedule(f"gold{i}.com", "normal", 3600, first_due=now, tenant="gold")
+        scheduler.schedule(f"free{i}.com", "normal", 3600, first_due=now, tenant="free")
+    window = [e.tenant for e in scheduler.next_batch(400, now=now)]
+    ratio = window.count("gold") / window.count("free")
+    assert 2.5 < ratio < 3.5, f"gold/free ratio {ratio:.2f}"
+    print(f"✓ gold:free = {ratio:.2f}:1 in the first 400 checks")
+
+
+def test_priority_still_comes_first():
+    """Fair sharing applies within a priority class, critical work still goes first"""
+    print("\n--- Test 3: Priority before fairness ---")
+    scheduler = CheckScheduler()
+    now = time.time()
+    for i in range(50):
+        scheduler.schedule(f"bulk{i}.com", "low", 86400, first_due=now, tenant="light")
+    scheduler.schedule("pager.com", "critical", 30, first_due=now, tenant="heavy")
+    batch = scheduler.next_batch(1, now=now)
+    assert batch[0].domain == "pager.com"
+    print("✓ critical domain dispatched first")
+
+
+def test_usage_is_accounted_per_tenant():
+    """Dispatches and lag are counted per tenant"""
+    print("\n--- Test 4: Usage accounting ---")
+    scheduler = CheckScheduler()
+    now = time.time()
+    for i in range(3):
+        scheduler.schedule(f"a{i}.com", "normal", 3600, first_due=now - 10, tenant="alice")
+    dispatch_all(scheduler, now)
+    usage = scheduler.usage.report("alice")
+    assert usage["checks"] == 3 and usage["avg_lag"] >= 9.9, usage
+    assert scheduler.usage.report("nobody")["checks"] == 0
+    print(f"✓ {usage}")
+
+
+def test_readded_domain_is_not_dispatched_twice():
+    """Heap items left from a removed registration never dispatch the re-added domain"""
+    print("\n--- Test 5: Remove and re-add ---")
+    scheduler = CheckScheduler()
+    now = time.time()
+    scheduler.schedule("flip.com", "normal", 3600, first_due=now + 100, tenant="alice")
+    assert scheduler.unschedule("flip.com")
+    scheduler.schedule("flip.com", "normal", 3600, first_due=now, tenant="alice")
+    assert [e.domain for e in scheduler.next_batch(CAPACITY, now=now)] == ["flip.com"]
+    scheduler.complete("flip.com", now=now)
+    # the first registration's item (due at now + 100) must be stale.
+    assert scheduler.next_batch(CAPACITY, now=now + 101) == [], "dispatched from a stale heap item"
+    assert [e.domain for e in scheduler.next_batch(CAPACITY, now=now + 3600)] == ["flip.com"]
+    print("✓ dispatched once per interval after being removed and re-added")
+
+
+def test_forced_check_while_in_flight():
+    """A check forced while the domain is being checked runs right after, not an interval later"""
+    print("\n--- Test 6: Forced check while in flight ---")
+    scheduler = CheckScheduler()
+    now = time.time()
+    scheduler.schedule("busy.com", "normal", 3600, first_due=now, tenant="alice")
+    entry = scheduler.next_batch(CAPACITY, now=now)[0]
+    scheduler.schedule("busy.com", entry.priority, entry.interval, first_due=now + 1, tenant="alice")
+    scheduler.complete("busy.com", now=now + 2)
+    assert [e.domain for e in scheduler.next_batch(CAPACITY, now=now + 2)] == ["busy.com"], "forced check lost"
+    scheduler.complete("busy.com", now=now + 3)
+    assert scheduler.entry("busy.com").next_due == now + 3 + 3600, "forced due time must be used only once"
+    print("✓ forced check dispatched after the running one, then back to the interval")
+
+
+def test_check_now_keeps_the_tenant():
+    """A forced check is still charged to the domain's owner"""
+    print("\n--- Test 7: Forced check keeps the tenant ---")
+    engine = MonitorEngine()
+    engine.sync_user("alice", [{"domain": "shop.com", "priority": "high"}])
+    now = time.time()
+    engine.scheduler.next_batch(CAPACITY, now=now + 3600)
+    engine.scheduler.complete("shop.com", now=now + 3600)
+    assert engine.check_now(["shop.com"]) == ["shop.com"]
+    entry = engine.scheduler.entry("shop.com")
+    assert entry.tenant == "alice" and entry.priority == "high", (entry.tenant, entry.priority)
+    assert [e.tenant for e in engine.scheduler.next_batch(CAPACITY)] == ["alice"]
+    assert engine.scheduler.usage.report("alice")["checks"] == 2 and engine.scheduler.usage.report(None)["checks"] == 0
+    print("✓ the forced check is dispatched and accounted as alice's")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - SCHEDULER FAIR-SHARE TESTS")
+    print("=" * 70)
+
+    tests = [test_light_tenant_is_not_starved, test_weights_set_the_share,
+             test_priority_still_comes_first, test_usage_is_accounted_per_tenant,
+             test_readded_domain_is_not_dispatched_twice, test_forced_check_while_in_flight,
+             test_check_now_keeps_the_tenant]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
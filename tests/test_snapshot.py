@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Tests for engine snapshots and warm restart (snapshot.py, MonitorEngine)
+Saves an engine's state, boots a fresh engine from it and checks that
+results are served right away, the schedule resumes where it was and
+overdue domains are spread out instead of all being checked at once.
+No network access needed, no check is ever run.
+Runs standalone: python3 tests/test_snapshot.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from check_result import CheckResult, CertStatus
+from engine import MonitorEngine, STARTUP_SPREAD
+from snapshot import read_snapshot, write_snapshot, SnapshotResults, SNAPSHOT_MAGIC, SNAPSHOT_VERSION_TAG
+from tls_inspector import cert_cache
+
+BIG_FLEET = 100000
+
+
+def temp_path():
+    return os.path.join(tempfile.mkdtemp(prefix="dm_snapshot_"), "engine_state.bin")
+
+
+def records(domains):
+    return [{"domain": d, "interval": 3600} for d in domains]
+
+
+def engine_with_results(domains, path):
+    engine = MonitorEngine(snapshot_path=path)
+    engine.sync_user("alice", records(domains))
+    for domain in domains:
+        engine._record(domain, CheckResult(domain, 200, CertStatus.VALID, 1893456000, issuer="R3"))
+    return engine
+
+
+def test_warm_restart_restores_results_and_schedule():
+    """A restarted engine serves the old results and keeps each domain's due time"""
+    print("\n--- Test 1: Warm restart ---")
+    path = temp_path()
+    domains = [f"site{i}.example.com" for i in range(10)]
+    old = engine_with_results(domains, path)
+    old._failures["site0.example.com"] = 1
+    old.save_snapshot()
+
+    new = MonitorEngine(snapshot_path=path)
+    assert new.load_snapshot() == len(domains)
+    new.sync_user("alice", records(domains), stagger=True)
+    assert set(new.latest(domains)) == set(domains), "results not served after restart"
+    assert new.latest(domains)["site3.example.com"].issuer == "R3"
+    assert new._failures.get("site0.example.com") == 1, "failure streak lost"
+    for domain in domains:
+        assert abs(new.scheduler.entry(domain).next_due - old.scheduler.entry(domain).next_due) < 0.01, \
+            f"{domain} lost its schedule position"
+    print(f"✓ {len(domains)} results served, schedule positions and failure streaks kept")
+
+
+def test_overdue_domains_are_staggered():
+    """Domains that became due while we were down are spread, not all checked at once"""
+    print("\n--- Test 2: Overdue domains ---")
+    path = temp_path()
+    domains = [f"late{i}.example.com" for i in range(200)]
+    old = engine_with_results(domains, path)
+    state = old.export_state()
+    state["schedule"] = {d: time.time() - 600 for d in domains}  # all overdue
+    write_snapshot(path, state)
+
+    new = MonitorEngine(snapshot_path=path)
+    new.load_snapshot()
+    new.sync_user("alice", records(domains), stagger=True)
+    due_now = new.scheduler.next_batch(len(domains))
+    assert len(due_now) < len(domains) / 10, f"{len(due_now)} of {len(domains)} due at once"
+    latest_due = max(new.scheduler.entry(d).next_due for d in domains)
+    assert latest_due <= time.time() + STARTUP_SPREAD + 1
+    print(f"✓ only {len(due_now)} of {len(domains)} overdue domains due right away")
+
+
+def test_unmonitored_domains_are_dropped():
+    """Snapshot entries for domains nobody monitors any more are not resurrected"""
+    print("\n--- Test 3: Removed domains ---")
+    path = temp_path()
+    engine_with_results(["keep.com", "gone.com"], path).save_snapshot()
+    new = MonitorEngine(snapshot_path=path)
+    new.load_snapshot()
+    new.sync_user("alice", records(["keep.com"]))
+    new.start()
+    new.stop()
+    assert "gone.com" not in new.results and not new._restored and not new._restored_due
+    assert "gone.com" not in {state[0] for state in read_snapshot(path)["results"]}
+    print("✓ removed domain dropped on start and not saved again")
+
+
+def test_bad_snapshots_are_ignored():
+    """A corrupt or foreign snapshot means a cold start, not a crash"""
+    print("\n--- Test 4: Bad snapshot files ---")
+    path = temp_path()
+    for payload in (b"garbage", SNAPSHOT_MAGIC + b"2.7\n" + b"x", SNAPSHOT_MAGIC + SNAPSHOT_VERSION_TAG + b"not zlib"):
+        with open(path, "wb") as f:
+            f.write(payload)
+        assert read_snapshot(path) is None
+    assert read_snapshot(path + ".missing") is None
+    write_snapshot(path, {"results": []})
+    assert read_snapshot(path, max_age=-1) is None, "stale snapshot should be ignored"
+    print("✓ corrupt, foreign, missing and stale snapshots ignored")
+
+
+def test_certificate_cache_is_restored():
+    """Parsed certificates survive the restart"""
+    print("\n--- Test 5: Certificate cache ---")
+    path = temp_path()
+    summary = {"fingerprint": "ab" * 32, "subject": "example.com", "issuer": "R3", "not_after": 1893456000,
+               "sans": ("example.com",), "key_type": "EC", "key_bits": 256}
+    cert_cache.load([summary])
+    engine_with_results(["example.com"], path).save_snapshot()
+    cert_cache._entries.clear()
+    MonitorEngine(snapshot_path=path).load_snapshot()
+    assert summary in cert_cache.export()
+    print("✓ certificate summaries restored")
+
+
+def test_worker_results_are_served_from_the_snapshot():
+    """A process without an engine serves the worker's results and follows its new snapshots"""
+    print("\n--- Test 6: Worker results read path ---")
+    path = temp_path()
+    view = SnapshotResults(path)
+    assert not view.available() and view.latest(["a.com"]) == {}
+    worker = engine_with_results(["a.com", "b.com"], path)
+    worker.save_snapshot()
+    assert view.available()
+    latest = view.latest(["a.com", "b.com", "unknown.com"])
+    assert set(latest) == {"a.com", "b.com"} and latest["a.com"].status_code == 200
+    worker._record("a.com", CheckResult("a.com", 503, CertStatus.VALID, 1893456000, issuer="R3"))
+    worker.save_snapshot()
+    assert view.latest(["a.com"])["a.com"].status_code == 503, "new snapshot not picked up"
+    print("✓ results served from the snapshot, refreshed when the worker writes a new one")
+
+
+def test_big_fleet_loads_fast():
+    """A 100k-domain snapshot loads and is applied in well under a few seconds"""
+    print("\n--- Test 7: Boot time ---")
+    path = temp_path()
+    domains = [f"site{i}.example.com" for i in range(BIG_FLEET)]
+    engine_with_results(domains, path).save_snapshot()
+    size = os.path.getsize(path)
+
+    start = time.perf_counter()
+    new = MonitorEngine(snapshot_path=path)
+    new.load_snapshot()
+    loaded = time.perf_counter() - start
+    new.sync_user("alice", records(domains), stagger=True)
+    total = time.perf_counter() - start
+    assert len(new.results) == BIG_FLEET
+    assert total < 5, f"warm boot took {total:.2f}s"
+    print(f"✓ {BIG_FLEET} domains: {size / 1024 / 1024:.1f} MB file, loaded in {loaded:.2f}s, serving after {total:.2f}s")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - SNAPSHOT / WARM RESTART TESTS")
+    print("=" * 70)
+
+    tests = [test_warm_restart_restores_results_and_schedule, test_overdue_domains_are_staggered,
+             test_unmonitored_domains_are_dropped, test_bad_snapshots_are_ignored,
+             test_certificate_cache_is_restored, test_worker_results_are_served_from_the_snapshot,
+             test_big_fleet_loads_fast]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Tests for TLS inspection helpers (tls_inspector.py)
+Checks the small DER reader on real certificates (RSA, EC P-256 / P-384,
+Ed25519), that broken input is reported as unknown instead of raising,
+wildcard SAN matching, the parsed-certificate cache, and that the whole
+verified chain is read where Python offers it, only the leaf where not.
+No network access needed, the certificates are embedded below
+(self-signed, generated with openssl req -x509).
+Runs standalone: python3 tests/test_tls_inspector.py
+"""
+
+import base64
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tls_inspector import CertificateCache, hostname_matches, public_key_info, _chain
+
+RSA_1024 = (
+    "MIICAjCCAWugAwIBAgIUEUaA+NyZBKWcr1ylsnlbnAfR/8wwDQYJKoZIhvcNAQELBQAwEzERMA8GA1UEAwwIcnNhLnRlc3Qw"
+    "HhcNMjYxMDE5MTM0NzQyWhcNMzYxMDE2MTM0NzQyWjATMREwDwYDVQQDDAhyc2EudGVzdDCBnzANBgkqhkiG9w0BAQEFAAOB"
+    "jQAwgYkCgYEAmzq6I4uUk/3puOD9BfVPyAnH+Oj7c1b+Y7t53fdw9zQkmMPUvjxUWuhBuY4QqrUXWZPYQGNWROUgM/kjxP8Q"
+    "4KMA3tUplbjWKYg/QqdfXaQF11F2tyFBdogXw+hOImXQ2KnFCYZH9utZRuVhTyrLnFMi8kHJat9J3Lbh9nB8dwsCAwEAAaNT"
+    "MFEwHQYDVR0OBBYEFIUK6JjDvctE37lKXMcehnMPdrmyMB8GA1UdIwQYMBaAFIUK6JjDvctE37lKXMcehnMPdrmyMA8GA1Ud"
+    "EwEB/wQFMAMBAf8wDQYJKoZIhvcNAQELBQADgYEACRcKlbpTc8przHbIUw0RMyqEaQQ/iBeosjSoCx/IOqRs5CEPZOrnAX68"
+    "EfcvAAgf240zj1VbnanWgmjDQgGbjg33pzVufGF8OGBaXIA9Wycvth1/9M/8XQ1YlewIQBHyVcY/Gvp6P2Ok9oCm1tf2CbaF"
+    "GoLEO+8st5UyJy+7q6Y="
+)
+
+EC_P256 = (
+    "MIIBejCCAR+gAwIBAgIUJ5ZYDiLpUZ3gA9szLhRLN6ORa74wCgYIKoZIzj0EAwIwEjEQMA4GA1UEAwwHZWMudGVzdDAeFw0y"
+    "NjEwMTkxMzQ3NDJaFw0zNjEwMTYxMzQ3NDJaMBIxEDAOBgNVBAMMB2VjLnRlc3QwWTATBgcqhkjOPQIBBggqhkjOPQMBBwNC"
+    "AATAbFtvUZck28W6Y4ReREMGdRBkg1AtQVaDAohrL70C/DAzINU6o6CU443v6zYaYmCCF62iCsve9gBJWu9AcmELo1MwUTAd"
+    "BgNVHQ4EFgQU+MVLd5E+wJgJysGSCUBdhRqqHwwwHwYDVR0jBBgwFoAU+MVLd5E+wJgJysGSCUBdhRqqHwwwDwYDVR0TAQH/"
+    "BAUwAwEB/zAKBggqhkjOPQQDAgNJADBGAiEAldo+7/7nIz+70sbIlxG5Ic8oISpvi7G5LBz3o/krqJMCIQCbjB4IIj6cHLc+"
+    "R7Hk2DKEImXbPDaeete8N1N9fNF5ng=="
+)
+
+EC_P384 = (
+    "MIIBvTCCAUKgAwIBAgIUTAvElmi8jxx+aG7UhRyd02xo4YAwCgYIKoZIzj0EAwIwFTETMBEGA1UEAwwKZWMzODQudGVzdDAe"
+    "Fw0yNjEwMTkxMzQ3NDJaFw0zNjEwMTYxMzQ3NDJaMBUxEzARBgNVBAMMCmVjMzg0LnRlc3QwdjAQBgcqhkjOPQIBBgUrgQQA"
+    "IgNiAAThPXhPmoIKzwGRHNCKxqLjwuDISRS/Qrf/ZKlqUSHYtccAiasEvJ9L1bpuz115UGnF3l3od+3eqjWr+f0LRTkoFFOs"
+    "6aAjNaEtyunhx/qS4espjIZwCPDjWiuQPaWprSSjUzBRMB0GA1UdDgQWBBT8YJBnHqfibnkik9py0l+iKP/Y0DAfBgNVHSME"
+    "GDAWgBT8YJBnHqfibnkik9py0l+iKP/Y0DAPBgNVHRMBAf8EBTADAQH/MAoGCCqGSM49BAMCA2kAMGYCMQDna7wmMvM2mMpW"
+    "Zlyr3lhEuPozGl0TQTxn4xmLzsIoqDbUY/GjjAbeYsMg1kAEb6sCMQD0b5ulAIsDX+uacwrrcgpIRUp5qerJL4fiVV69riDq"
+    "RC04J1jBU2FkYRuJ5NjLys4="
+)
+
+ED25519 = (
+    "MIIBODCB66ADAgECAhQJ0A/5p5610Aq4NnFwXQgTBuuINjAFBgMrZXAwEjEQMA4GA1UEAwwHZWQudGVzdDAeFw0yNjEwMTkx"
+    "MzQ3NDJaFw0zNjEwMTYxMzQ3NDJaMBIxEDAOBgNVBAMMB2VkLnRlc3QwKjAFBgMrZXADIQCR2B6haBqmEeDiI6E0yroQx1/o"
+    "dUbh0I0cirJTkERjy6NTMFEwHQYDVR0OBBYEFFNfSoE041hw0m6Uc5cthE5/I8zhMB8GA1UdIwQYMBaAFFNfSoE041hw0m6U"
+    "c5cthE5/I8zhMA8GA1UdEwEB/wQFMAMBAf8wBQYDK2VwA0EAS1RIPWu0y8GlXaNeA/TXT2EVJDFCPm6+Y16gpIdqGV0PnGRs"
+    "MCLjwRVNNe9kJOcLnIxt6WmDSJRctKGpOxzCCQ=="
+)
+
+
+def der(chunks):
+    return base64.b64decode("".join(chunks))
+
+
+def test_key_types_and_sizes():
+    """The public key type and size are read from the DER certificate"""
+    print("\n--- Test 1: Public key info ---")
+    expected = [(RSA_1024, ("RSA", 1024)), (EC_P256, ("EC", 256)), (EC_P384, ("EC", 384)),
+                (ED25519, ("Ed25519", 256))]
+    for chunks, key in expected:
+        assert public_key_info(der(chunks)) == key, (key, public_key_info(der(chunks)))
+    print(f"✓ {', '.join(f'{t} {b}' for _, (t, b) in expected)}")
+
+
+def test_broken_der_is_unknown():
+    """Truncated or garbage input gives ('unknown', None), never an exception"""
+    print("\n--- Test 2: Broken input ---")
+    rsa = der(RSA_1024)
+    for broken in (b"", b"\x30", rsa[:40], rsa[:200], b"\x30\x03\x02\x01\x01", b"\x04\x00" * 10):
+        assert public_key_info(broken) == ("unknown", None), broken[:8]
+    print("✓ truncated and malformed certificates reported as unknown")
+
+
+def test_hostname_matching():
+    """A wildcard covers exactly one label, names match case-insensitively"""
+    print("\n--- Test 3: SAN matching ---")
+    sans = ("example.com", "*.example.com")
+    assert hostname_matches("example.com", sans) and hostname_matches("WWW.Example.com.", sans)
+    assert not hostname_matches("a.b.example.com", sans)
+    assert not hostname_matches("example.org", sans)
+    assert not hostname_matches("example.com", ("*.example.com",))
+    print("✓ exact, wildcard and non-matching names")
+
+
+def test_certificate_cache():
+    """A certificate is decoded once, and export / load keeps the summaries"""
+    print("\n--- Test 4: Parsed certificate cache ---")
+    cache = CertificateCache(max_entries=2)
+    decoded = []
+
+    def load_info():
+        decoded.append(1)
+        return {"subject": ((("commonName", "ec.test"),),), "issuer": ((("commonName", "ec.test"),),),
+                "notAfter": "Oct 16 13:47:42 2036 GMT",
+                "subjectAltName": (("DNS", "ec.test"), ("IP Address", "1.2.3.4"))}
+
+    first = cache.get_or_parse(der(EC_P256), load_info)
+    assert cache.get_or_parse(der(EC_P256), load_info) is first
+    assert len(decoded) == 1, "a cached certificate was decoded again"
+    assert first["subject"] == "ec.test" and first["sans"] == ("ec.test",) and first["key_bits"] == 256
+    assert first["not_after"] == 2107777662, first["not_after"]
+    cache.get_or_parse(der(EC_P384), load_info)
+    cache.get_or_parse(der(ED25519), load_info)
+    stats = cache.stats()
+    assert stats == {"entries": 2, "hits": 1, "misses": 3, "hit_ratio": 0.25}, stats
+    assert len(decoded) == 3
+    restored = CertificateCache()
+    assert restored.load(cache.export()) == 2
+    assert [s["key_type"] for s in restored.export()] == ["EC", "Ed25519"]
+    print(f"✓ {stats}")
+
+
+class FakeCert:
+    # the bits of an _ssl.Certificate that _chain uses.
+    def __init__(self, der_bytes):
+        self.der = der_bytes
+
+    def public_bytes(self, encoding):
+        return self.der
+
+    def get_info(self):
+        return {}
+
+
+class FakeSocket:
+    # an SSLSocket, with a verified chain only when the python running the checks has one.
+    def __init__(self, chain=None):
+        self.leaf = chain[0] if chain else der(EC_P256)
+        if chain is not None:
+            self._sslobj = type("SSLObject", (), {"get_verified_chain": lambda _: [FakeCert(c) for c in chain]})()
+
+    def getpeercert(self, binary_form=False):
+        return self.leaf if binary_form else {}
+
+
+def test_verified_chain_and_fallback():
+    """The whole verified chain is read on python 3.10+, older pythons fall back to the leaf"""
+    print("\n--- Test 5: Verified chain and leaf fallback ---")
+    chain = [der(EC_P256), der(EC_P384), der(RSA_1024)]
+    assert [d for d, _ in _chain(FakeSocket(chain))] == chain
+    fallback = _chain(FakeSocket())
+    assert [d for d, _ in fallback] == [der(EC_P256)] and fallback[0][1]() == {}
+    if sys.version_info >= (3, 10):
+        import ssl
+        assert hasattr(ssl._ssl._SSLSocket, "get_verified_chain"), "python 3.10+ lost get_verified_chain"
+    print(f"✓ chain of {len(chain)} read, leaf-only fallback without it (running python "
+          f"{sys.version_info[0]}.{sys.version_info[1]})")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - TLS INSPECTOR TESTS")
+    print("=" * 70)
+
+    tests = [test_key_types_and_sizes, test_broken_der_is_unknown, test_hostname_matching, test_certificate_cache,
+             test_verified_chain_and_fallback]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
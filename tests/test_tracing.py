@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Tests for check tracing and request profiling (tracing.py)
+Checks that spans are recorded per check phase, that the slow-check buffer
+keeps only the slowest recent checks, that tracing costs next to nothing
+when it is off, and that request profiles can be read back with pstats.
+No network access needed.
+Runs standalone: python3 tests/test_tracing.py
+"""
+
+import os
+import pstats
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tracing
+from tracing import CheckTrace, SlowCheckBuffer, trace_check, span, set_tracing, start_profile, finish_profile
+from rate_limiter import HostRateLimiter
+
+
+def traced(domain, seconds, at=None):
+    trace = CheckTrace(domain)
+    trace.seconds = seconds
+    trace.finished_at = at if at is not None else time.time()
+    return trace
+
+
+def test_spans_are_recorded():
+    """A traced check records its limiter wait and each phase, in order"""
+    print("\n--- Test 1: Spans per phase ---")
+    set_tracing(True)
+    tracing.slow_checks.clear()
+    limiter = HostRateLimiter()
+    try:
+        with trace_check("tracing.invalid"), limiter.slot("tracing.invalid"):
+            with span("http"):
+                time.sleep(0.02)
+            with trace_check("tracing.invalid"):  # nested, joins the outer trace
+                with span("tls"):
+                    time.sleep(0.01)
+    finally:
+        set_tracing(False)
+    checks = tracing.slow_checks.top()
+    assert len(checks) == 1, checks
+    names = [s["name"] for s in checks[0]["spans"]]
+    assert names == ["limiter_wait", "http", "tls"], names
+    assert checks[0]["seconds"] >= 0.03
+    print(f"✓ {checks[0]}")
+
+
+def test_buffer_keeps_slowest_recent_checks():
+    """Only the N slowest checks are kept, and old ones age out"""
+    print("\n--- Test 2: Slow-check buffer ---")
+    buffer = SlowCheckBuffer(size=5, window=60)
+    buffer.add(traced("old-and-slow.com", 99, at=time.time() - 120))
+    for i in range(100):
+        buffer.add(traced(f"site{i}.com", i / 10))
+    top = buffer.top()
+    assert [c["domain"] for c in top] == [f"site{i}.com" for i in range(99, 94, -1)], top
+    assert len(buffer.top(2)) == 2
+    print(f"✓ kept {[c['domain'] for c in top]}")
+
+
+def test_disabled_tracing_is_cheap():
+    """With tracing off nothing is recorded and the hooks are close to free"""
+    print("\n--- Test 3: Overhead when off ---")
+    set_tracing(False)
+    tracing.slow_checks.clear()
+
+    def check():
+        with trace_check("example.com"):
+            with span("http"):
+                pass
+
+    per_call = min(timeit.repeat(check, number=100000, repeat=3)) / 100000
+    assert tracing.slow_checks.top() == []
+    assert per_call < 5e-6, f"{per_call * 1e9:.0f}ns per check"
+    print(f"✓ {per_call * 1e9:.0f}ns per check with tracing off")
+
+
+def test_profile_dump_is_readable():
+    """The binary dump opens with pstats, the text form lists the profiled code"""
+    print("\n--- Test 4: Request profiles ---")
+
+    def busy():
+        return sum(i * i for i in range(20000))
+
+    profiler = start_profile()
+    busy()
+    body, mimetype, filename = finish_profile(profiler, "1")
+    assert mimetype == "application/octet-stream" and filename.endswith(".prof")
+    path = os.path.join(tempfile.mkdtemp(prefix="dm_profile_"), filename)
+    with open(path, "wb") as f:
+        f.write(body)
+    functions = {name for _, _, name in pstats.Stats(path).stats}
+    assert "busy" in functions, functions
+
+    profiler = start_profile()
+    busy()
+    text, mimetype, _ = finish_profile(profiler, "text")
+    assert mimetype == "text/plain" and "busy" in text
+    print(f"✓ {len(body)} byte pstats dump, {len(text.splitlines())} lines of text")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - TRACING / PROFILING TESTS")
+    print("=" * 70)
+
+    tests = [test_spans_are_recorded, test_buffer_keeps_slowest_recent_checks,
+             test_disabled_tracing_is_cheap, test_profile_dump_is_readable]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Tests for multi-vantage checks (vantage.py)
+Starts several real vantage servers on localhost, each with a fake probe
+that answers like a different network location would, and checks the
+quorum consensus and per-vantage latency, and that a vantage server only
+connects to public addresses: no internal targets, no redirects or DNS
+rebinding into its own network. No internet access needed.
+Runs standalone: python3 tests/test_vantage.py
+"""
+
+import os
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from check_result import CheckResult, CertStatus, TlsSummary, STATUS_FAILED
+import vantage as vantage_module
+from vantage import HttpVantage, LocalVantage, MultiVantageChecker, make_server, encode_result, decode_result, probe_target
+
+TOKEN = "test-token"
+EXPIRY = 1893456000
+
+
+def probe_up(domain):
+    tls = TlsSummary("TLSv1.3", "EC 256", True, 3, EXPIRY, [])
+    return CheckResult(domain, 200, CertStatus.VALID, EXPIRY, issuer="R3", tls=tls)
+
+
+def probe_down(domain):
+    return CheckResult(domain, STATUS_FAILED)
+
+
+def start_vantage(name, probe):
+    server = make_server(name, "127.0.0.1", 0, TOKEN, probe, resolve=False)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, HttpVantage(name, f"http://127.0.0.1:{server.server_address[1]}", token=TOKEN, timeout=5)
+
+
+def test_minority_failure_is_not_down():
+    """One vantage failing out of three does not mark the domain down"""
+    print("\n--- Test 1: Minority failure ---")
+    servers = [start_vantage("eu", probe_up), start_vantage("us", probe_down)]
+    checker = MultiVantageChecker([LocalVantage("local", probe_up)] + [v for _, v in servers])
+    result = checker("example.com")
+    assert result.live, f"expected up, got {result}"
+    assert [name for name, _, _ in result.vantages] == ["local", "eu", "us"]
+    assert dict((n, s) for n, s, _ in result.vantages)["us"] == "FAILED"
+    assert all(latency is not None for _, _, latency in result.vantages), "latency missing"
+    assert result.tls.chain_expiry == EXPIRY, "tls details lost on the wire"
+    for server, _ in servers:
+        server.shutdown()
+    print(f"✓ up with 1/3 down votes, vantages: {result.vantages_value()}")
+
+
+def test_quorum_failure_is_down():
+    """Two of three vantages failing reaches the default quorum"""
+    print("\n--- Test 2: Quorum failure ---")
+    servers = [start_vantage("eu", probe_down), start_vantage("us", probe_down)]
+    checker = MultiVantageChecker([LocalVantage("local", probe_up)] + [v for _, v in servers])
+    assert checker.quorum == 2
+    result = checker("example.com")
+    assert result.failed and len(result.vantages) == 3
+    stats = checker.stats()
+    assert stats["eu"]["down"] == 1 and stats["local"]["down"] == 0
+    for server, _ in servers:
+        server.shutdown()
+    print("✓ down with 2/3 down votes")
+
+
+def test_unreachable_vantages_do_not_vote():
+    """With too few reachable vantages the checker does not decide"""
+    print("\n--- Test 3: No quorum ---")
+    server, reachable = start_vantage("eu", probe_down)
+    server.shutdown()
+    server.server_close()
+    gone = HttpVantage("us", "http://127.0.0.1:9", token=TOKEN, timeout=1)
+    checker = MultiVantageChecker([LocalVantage("local", probe_down), reachable, gone])
+    assert checker("example.com") is None, "one down vote must not reach quorum 2"
+    assert checker.stats()["us"]["unreachable"] == 1
+    print("✓ no result without quorum, unreachable vantages counted")
+
+
+def test_wire_format_keeps_raw_values():
+    """Results from a vantage compare equal to local ones (no date rounding)"""
+    print("\n--- Test 4: Wire format ---")
+    local = probe_up("example.com")
+    remote = decode_result(encode_result(local, 12))
+    assert not remote.changed_from(local)
+    assert remote.tls.to_dict() == local.tls.to_dict()
+    print("✓ round trip is lossless")
+
+
+def test_token_is_required():
+    """A vantage server rejects probes without the shared token"""
+    print("\n--- Test 5: Authentication ---")
+    server, vantage = start_vantage("eu", probe_up)
+    vantage.token = "wrong"
+    checker = MultiVantageChecker([vantage])
+    assert checker("example.com") is None
+    assert checker.stats()["eu"]["unreachable"] == 1
+    server.shutdown()
+    try:
+        make_server("eu", "127.0.0.1", 0, "", probe_up)
+        raise AssertionError("server started without a token")
+    except ValueError:
+        pass
+    print("✓ wrong token rejected, no server without a token")
+
+
+def test_only_public_domains_are_probed():
+    """A vantage server refuses IP addresses, internal names and names resolving to private addresses"""
+    print("\n--- Test 6: Probe targets ---")
+    probed = []
+    server, vantage = start_vantage("eu", lambda domain: probed.append(domain) or probe_up(domain))
+    for target in ["127.0.0.1", "http://[::1]/", "169.254.169.254", "localhost", "db.internal", "printer.local"]:
+        try:
+            vantage.check(target)
+            raise AssertionError(f"{target} was probed")
+        except vantage_module.requests.HTTPError as e:
+            assert e.response.status_code == 400, target
+    result, _ = vantage.check("HTTPS://Example.COM/login")
+    assert probed == ["example.com"] and result.domain == "example.com", probed
+    server.shutdown()
+
+    saved = vantage_module.socket.getaddrinfo
+    answers = {"rebind.example.com": "10.0.0.5", "v6.example.com": "::1", "shop.example.com": "93.184.216.34"}
+    vantage_module.socket.getaddrinfo = lambda host, *args, **kwargs: [
+        (socket.AF_INET, socket.SOCK_STREAM, 6, "", (answers[host], 443))]
+    try:
+        assert probe_target("rebind.example.com")[0] is None
+        assert probe_target("v6.example.com")[0] is None
+        assert probe_target("shop.example.com") == ("shop.example.com", None)
+    finally:
+        vantage_module.socket.getaddrinfo = saved
+    print("✓ IPs, internal names and private resolutions rejected, public domains normalized and probed")
+
+
+class InternalHandler(BaseHTTPRequestHandler):
+    # stands in for a service on the vantage server's own network, counts the requests reaching it.
+    hits = 0
+
+    def do_GET(self):
+        InternalHandler.hits += 1
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_probe_connects_only_to_checked_addresses():
+    """Every connection of a probe is checked: redirect hops to internal addresses fail, the domain stays pinned"""
+    print("\n--- Test 7: Redirects and DNS rebinding ---")
+    internal = ThreadingHTTPServer(("127.0.0.1", 0), InternalHandler)
+    threading.Thread(target=internal.serve_forever, daemon=True).start()
+    port = internal.server_address[1]
+    # shop.example.com answers with a public address once, then rebinds to loopback.
+    lookups = {"shop.example.com": ["93.184.216.34", "127.0.0.1"], "metadata.example.com": ["169.254.169.254"]}
+
+    def fake_dns(host, port, family=0, type=0, proto=0, flags=0):
+        answers = lookups.get(host)
+        address = answers.pop(0) if answers and len(answers) > 1 else (answers[0] if answers else host)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))]
+
+    seen = {}
+
+    def probe(domain):
+        seen["pinned"] = [socket.getaddrinfo(domain, 443)[0][4][0] for _ in range(2)]
+        for name, url in (("metadata", "http://metadata.example.com/latest/"), ("loopback", f"http://127.0.0.1:{port}/")):
+            try:
+                vantage_module.requests.get(url, timeout=2)
+                seen[name] = "connected"
+            except vantage_module.requests.ConnectionError:
+                seen[name] = "refused"
+        return probe_up(domain)
+
+    saved = vantage_module._system_getaddrinfo
+    vantage_module._system_getaddrinfo = fake_dns
+    server = make_server("eu", "127.0.0.1", 0, TOKEN, probe)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        vantage = HttpVantage("eu", f"http://127.0.0.1:{server.server_address[1]}", token=TOKEN, timeout=10)
+        result, _ = vantage.check("shop.example.com")
+    finally:
+        vantage_module._system_getaddrinfo = saved
+        server.shutdown()
+        internal.shutdown()
+    assert result.status_code == 200
+    assert seen["pinned"] == ["93.184.216.34"] * 2, f"the domain was re-resolved: {seen['pinned']}"
+    assert seen["metadata"] == seen["loopback"] == "refused", seen
+    assert InternalHandler.hits == 0, "the internal service was reached"
+    print("✓ the domain stayed on its checked address, hops to 169.254.169.254 and 127.0.0.1 never connected")
+
+
+def run_all_tests():
+    print("=" * 70)
+    print("🧪 DOMAIN MONITOR SYSTEM - MULTI-VANTAGE TESTS")
+    print("=" * 70)
+
+    tests = [test_minority_failure_is_not_down, test_quorum_failure_is_down,
+             test_unreachable_vantages_do_not_vote, test_wire_format_keeps_raw_values, test_token_is_required,
+             test_only_public_domains_are_probed, test_probe_connects_only_to_checked_addresses]
+    results = []
+    for test in tests:
+        try:
+            test()
+            results.append(True)
+        except AssertionError as e:
+            print(f"✗ {test.__name__} failed: {e}")
+            results.append(False)
+
+    print("\n" + "=" * 70)
+    print(f"📊 TEST RESULTS: {sum(results)}/{len(results)} PASSED")
+    print("=" * 70)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    run_all_tests()
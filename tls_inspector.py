@@ -0,0 +1,278 @@
+import hashlib
+import socket
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from logs import logger
+
+
+# parsed certificates kept in memory, keyed by SHA-256 fingerprint.
+# thousands of domains share the same few intermediates, so they are parsed once.
+CERT_CACHE_SIZE = 4096
+# a chain certificate expiring within this many days is reported as an issue.
+EXPIRY_WARNING_DAYS = 14
+# keys smaller than this are reported as weak.
+MIN_RSA_BITS = 2048
+MIN_EC_BITS = 256
+WEAK_PROTOCOLS = {'SSLv3', 'TLSv1', 'TLSv1.1'}
+
+# public key algorithm / curve OIDs we recognize in SubjectPublicKeyInfo.
+KEY_ALGORITHMS = {
+    '1.2.840.113549.1.1.1': 'RSA',
+    '1.2.840.10045.2.1': 'EC',
+    '1.3.101.112': 'Ed25519',
+    '1.3.101.113': 'Ed448',
+    '1.2.840.10040.4.1': 'DSA',
+}
+EC_CURVE_BITS = {
+    '1.2.840.10045.3.1.7': 256,  # prime256v1 / P-256
+    '1.3.132.0.34': 384,         # secp384r1
+    '1.3.132.0.35': 521,         # secp521r1
+}
+FIXED_KEY_BITS = {'Ed25519': 256, 'Ed448': 456}
+
+
+# ---------------------------------------------------------------
+# minimal DER reader, just enough to find the public key in a certificate.
+# ---------------------------------------------------------------
+
+def _der_read(data: bytes, offset: int):
+    # returns (tag, content_start, content_end) of the element at offset.
+    tag = data[offset]
+    length = data[offset + 1]
+    start = offset + 2
+    if length & 0x80:
+        num_bytes = length & 0x7f
+        length = int.from_bytes(data[start:start + num_bytes], 'big')
+        start += num_bytes
+    return tag, start, start + length
+
+
+def _der_children(data: bytes, start: int, end: int) -> list:
+    children = []
+    while start < end:
+        child = _der_read(data, start)
+        children.append(child)
+        start = child[2]
+    return children
+
+
+def _decode_oid(raw: bytes) -> str:
+    parts = [raw[0] // 40, raw[0] % 40]
+    value = 0
+    for byte in raw[1:]:
+        value = (value << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            parts.append(value)
+            value = 0
+    return '.'.join(str(p) for p in parts)
+
+
+def public_key_info(der: bytes):
+    """
+    returns (key_type, key_bits) for a DER certificate, e.g. ('RSA', 2048) or ('EC', 256).
+    unknown layouts return ('unknown', None) rather than failing the whole check.
+    """
+    try:
+        _, cert_start, cert_end = _der_read(der, 0)
+        _, tbs_start, tbs_end = _der_children(der, cert_start, cert_end)[0]
+        fields = _der_children(der, tbs_start, tbs_end)
+        if fields[0][0] == 0xa0:  # explicit [0] version, present on every v3 cert
+            fields = fields[1:]
+        _, spki_start, spki_end = fields[5]  # serial, sigAlg, issuer, validity, subject, spki
+        (_, alg_start, alg_end), (_, key_start, key_end) = _der_children(der, spki_start, spki_end)
+        alg_parts = _der_children(der, alg_start, alg_end)
+        oid = _decode_oid(der[alg_parts[0][1]:alg_parts[0][2]])
+        key_type = KEY_ALGORITHMS.get(oid, oid)
+
+        if key_type == 'RSA':
+            # BIT STRING (1 unused-bits byte) wrapping SEQUENCE { modulus INTEGER, exponent INTEGER }
+            _, seq_start, seq_end = _der_read(der, key_start + 1)
+            _, mod_start, mod_end = _der_children(der, seq_start, seq_end)[0]
+            modulus = der[mod_start:mod_end].lstrip(b'\x00')
+            return key_type, len(modulus) * 8 - (8 - modulus[0].bit_length())
+        if key_type == 'EC' and len(alg_parts) > 1:
+            curve = _decode_oid(der[alg_parts[1][1]:alg_parts[1][2]])
+            return key_type, EC_CURVE_BITS.get(curve)
+        return key_type, FIXED_KEY_BITS.get(key_type)
+    except (IndexError, ValueError):
+        return 'unknown', None
+
+
+# ---------------------------------------------------------------
+# parsed certificate cache
+# ---------------------------------------------------------------
+
+class CertificateCache:
+    """LRU of parsed certificate summaries keyed by SHA-256 fingerprint."""
+
+    def __init__(self, max_entries: int = CERT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_parse(self, der: bytes, load_info) -> dict:
+        # load_info() returns the getpeercert()-style dict; it is only called on a miss,
+        # decoding it is the parse the cache saves.
+        fingerprint = hashlib.sha256(der).hexdigest()
+        with self._lock:
+            summary = self._entries.get(fingerprint)
+            if summary is not None:
+                self._entries.move_to_end(fingerprint)
+                self.hits += 1
+                return summary
+            self.misses += 1
+        summary = _summarize(fingerprint, der, load_info())
+        with self._lock:
+            self._entries[fingerprint] = summary
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return summary
+
+    def export(self) -> list:
+        # the parsed summaries, oldest first, so load() rebuilds the same LRU order.
+        with self._lock:
+            return list(self._entries.values())
+
+    def load(self, summaries: list) -> int:
+        # warm start: fills the cache from export()ed summaries, returns how many were loaded.
+        with self._lock:
+            for summary in summaries:
+                self._entries[summary['fingerprint']] = summary
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+cert_cache = CertificateCache()
+
+
+def _name_field(name, field: str = 'commonName') -> str:
+    for rdn in name or ():
+        for key, value in rdn:
+            if key == field:
+                return value
+    return 'N/A'
+
+
+def _summarize(fingerprint: str, der: bytes, info: dict) -> dict:
+    # info is the getpeercert()-style dict for this certificate.
+    key_type, key_bits = public_key_info(der)
+    not_after = info.get('notAfter')
+    return {
+        'fingerprint': fingerprint,
+        'subject': _name_field(info.get('subject')),
+        'issuer': _name_field(info.get('issuer')),
+        'not_after': int(ssl.cert_time_to_seconds(not_after)) if not_after else None,
+        'sans': tuple(value for kind, value in info.get('subjectAltName', ()) if kind == 'DNS'),
+        'key_type': key_type,
+        'key_bits': key_bits,
+    }
+
+
+def _chain(ssock) -> list:
+    """
+    returns [(der, load_info), ...] from the leaf up to the root, load_info()
+    decodes the certificate (see CertificateCache.get_or_parse).
+    the verified chain comes from the private _sslobj API (python 3.10+);
+    on older pythons we only get the leaf.
+    """
+    get_chain = getattr(getattr(ssock, '_sslobj', None), 'get_verified_chain', None)
+    if get_chain is not None:
+        try:
+            chain = [(cert.public_bytes(ssl._ssl.ENCODING_DER), cert.get_info) for cert in get_chain()]
+            if chain:
+                return chain
+        except (AttributeError, ssl.SSLError, ValueError):
+            pass
+    return [(ssock.getpeercert(binary_form=True), ssock.getpeercert)]
+
+
+def hostname_matches(hostname: str, names) -> bool:
+    hostname = hostname.lower().rstrip('.')
+    for name in names:
+        name = name.lower().rstrip('.')
+        if name == hostname:
+            return True
+        # a wildcard covers exactly one label: *.example.com matches www.example.com, not example.com.
+        if name.startswith('*.') and hostname.count('.') == name.count('.') and hostname.endswith(name[1:]):
+            return True
+    return False
+
+
+def inspect_tls(hostname: str, port: int = 443, timeout: float = 5):
+    """
+    Connects to hostname and inspects its TLS setup: the whole certificate chain
+    (expiry of the leaf and every intermediate), whether the SANs cover the
+    hostname, key type and size, and the negotiated protocol.
+    socket/ssl errors are raised to the caller.
+           Returns:
+        A posture dictionary (see the keys below).
+    """
+    context = ssl.create_default_context()
+    with socket.create_connection((hostname, port), timeout=timeout) as sock:
+        with context.wrap_socket(sock, server_hostname=hostname) as ssock:
+            protocol = ssock.version()
+            cipher = ssock.cipher()[0] if ssock.cipher() else 'N/A'
+            chain = [cert_cache.get_or_parse(der, load_info) for der, load_info in _chain(ssock)]
+
+    leaf = chain[0]
+    now = time.time()
+    issues = []
+    if protocol in WEAK_PROTOCOLS:
+        issues.append(f"outdated protocol {protocol}")
+    if not hostname_matches(hostname, leaf['sans']):
+        issues.append(f"certificate names do not cover {hostname}")
+    minimum = MIN_RSA_BITS if leaf['key_type'] == 'RSA' else MIN_EC_BITS
+    if leaf['key_bits'] is not None and leaf['key_bits'] < minimum:
+        issues.append(f"weak {leaf['key_type']} key ({leaf['key_bits']} bits)")
+    for position, cert in enumerate(chain):
+        if cert['not_after'] is None:
+            continue
+        days_left = (cert['not_after'] - now) / 86400
+        role = 'certificate' if position == 0 else f"chain certificate '{cert['subject']}'"
+        if days_left < 0:
+            issues.append(f"{role} has expired")
+        elif days_left < EXPIRY_WARNING_DAYS:
+            issues.append(f"{role} expires in {int(days_left)} days")
+
+    expiries = [c['not_after'] for c in chain if c['not_after'] is not None]
+    logger.debug(f"TLS inspection for {hostname}: {protocol}, chain of {len(chain)}, {len(issues)} issues.")
+    return {
+        'protocol': protocol,
+        'cipher': cipher,
+        'leaf': leaf,
+        'chain': chain,
+        'chain_expiry': min(expiries) if expiries else None,
+        'san_match': hostname_matches(hostname, leaf['sans']),
+        # the stdlib ssl module cannot request or read a stapled OCSP response, so this stays unknown.
+        'ocsp_stapled': None,
+        'issues': issues,
+    }
+
+
+def posture_summary(posture: dict) -> dict:
+    # the compact part of a posture that we return through the API.
+    leaf = posture['leaf']
+    return {
+        'protocol': posture['protocol'],
+        'key': f"{leaf['key_type']} {leaf['key_bits']}" if leaf['key_bits'] else leaf['key_type'],
+        'san_match': posture['san_match'],
+        'chain_length': len(posture['chain']),
+        'chain_expiry': time.strftime('%Y-%m-%d', time.gmtime(posture['chain_expiry'])) if posture['chain_expiry'] else 'N/A',
+        'ocsp_stapled': posture['ocsp_stapled'],
+        'issues': posture['issues'],
+    }
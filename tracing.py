@@ -0,0 +1,187 @@
+import cProfile
+import heapq
+import io
+import marshal
+import os
+import pstats
+import threading
+import time
+
+
+# how many of the slowest checks we keep, and for how long (seconds).
+SLOW_CHECKS_KEPT = 50
+SLOW_CHECK_WINDOW = 3600
+# how many functions the text form of a request profile lists.
+PROFILE_TEXT_LINES = 60
+
+# span tracing is off unless CHECK_TRACING=1, or switched on at runtime with set_tracing().
+# when off, trace_check() and span() return a shared no-op object, so the
+# instrumented code pays one global lookup per call and nothing else.
+_enabled = os.environ.get('CHECK_TRACING', '0') == '1'
+_current = threading.local()
+
+
+class CheckTrace:
+    """timings of one domain check, split into spans (limiter wait, http, tls ...)."""
+
+    __slots__ = ('domain', 'started', 'finished_at', 'seconds', 'spans')
+
+    def __init__(self, domain: str):
+        self.domain = domain
+        self.started = time.perf_counter()
+        self.finished_at = None
+        self.seconds = 0.0
+        self.spans = []  # (name, seconds), in the order they ran
+
+    def to_dict(self) -> dict:
+        return {
+            'domain': self.domain,
+            'seconds': round(self.seconds, 4),
+            'at': int(self.finished_at),
+            'spans': [{'name': name, 'seconds': round(seconds, 4)} for name, seconds in self.spans],
+        }
+
+
+class SlowCheckBuffer:
+    """
+    keeps the SLOW_CHECKS_KEPT slowest checks of the last SLOW_CHECK_WINDOW seconds.
+    a min-heap, so a check that is not among the slowest costs one comparison.
+    """
+
+    def __init__(self, size: int = SLOW_CHECKS_KEPT, window: float = SLOW_CHECK_WINDOW):
+        self.size = size
+        self.window = window
+        self._heap = []  # (seconds, seq, trace)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        fresh = [item for item in self._heap if now - item[2].finished_at <= self.window]
+        if len(fresh) != len(self._heap):
+            heapq.heapify(fresh)
+            self._heap = fresh
+
+    def add(self, trace: CheckTrace):
+        with self._lock:
+            self._seq += 1
+            item = (trace.seconds, self._seq, trace)
+            if len(self._heap) >= self.size:
+                self._expire(trace.finished_at)
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            elif trace.seconds > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def top(self, limit: int = None) -> list:
+        with self._lock:
+            self._expire(time.time())
+            ordered = sorted(self._heap, reverse=True)
+        return [trace.to_dict() for _, _, trace in ordered[:limit]]
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
+
+
+slow_checks = SlowCheckBuffer()
+
+
+class _NoOp:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoOp()
+
+
+class _TraceScope:
+    __slots__ = ('trace',)
+
+    def __init__(self, domain: str):
+        self.trace = CheckTrace(domain)
+
+    def __enter__(self):
+        _current.trace = self.trace
+        return self.trace
+
+    def __exit__(self, *exc):
+        _current.trace = None
+        trace = self.trace
+        trace.seconds = time.perf_counter() - trace.started
+        trace.finished_at = time.time()
+        slow_checks.add(trace)
+        return False
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'started')
+
+    def __init__(self, trace: CheckTrace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.trace.spans.append((self.name, time.perf_counter() - self.started))
+        return False
+
+
+def trace_check(domain: str):
+    """
+    with trace_check(domain): ... times one whole check and records it in slow_checks.
+    nested calls (a traced caller around check_domain_status) join the outer trace.
+    """
+    if not _enabled or getattr(_current, 'trace', None) is not None:
+        return _NOOP
+    return _TraceScope(domain)
+
+
+def span(name: str):
+    """with span('http'): ... times one phase of the check being traced on this thread."""
+    if not _enabled:
+        return _NOOP
+    trace = getattr(_current, 'trace', None)
+    return _Span(trace, name) if trace is not None else _NOOP
+
+
+def set_tracing(enabled: bool):
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def tracing_enabled() -> bool:
+    return _enabled
+
+
+# ---------------------------------------------------------------
+# per-request profiles
+# ---------------------------------------------------------------
+
+def start_profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def finish_profile(profiler, fmt: str):
+    """
+    stops the profiler and returns (body, mimetype, filename).
+    fmt 'text' is a readable top list sorted by cumulative time; anything else
+    is the binary pstats dump (what cProfile -o writes), which python -m pstats,
+    snakeviz and flameprof can open.
+    """
+    profiler.disable()
+    stats = pstats.Stats(profiler)
+    if fmt == 'text':
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats('cumulative').print_stats(PROFILE_TEXT_LINES)
+        return out.getvalue(), 'text/plain', 'profile.txt'
+    return marshal.dumps(stats.stats), 'application/octet-stream', 'profile.prof'
@@ -1,9 +1,18 @@
 import json
 from logs import logger
+from data_manager import read_json_cached, invalidate_cache
 
 # File to store users
 USERS_FILE = 'users.json'
 
+# per-user limits on the shared check capacity:
+# max_domains  - how many domains one user may monitor
+# min_interval - the shortest check interval (seconds) a user may ask for
+# weight       - the user's share of the engine when it is busy (2 = twice the share of 1)
+# a user record in users.json can override any of them with a "quota" object, e.g.
+# {"username": "acme", "password": "...", "quota": {"max_domains": 100000, "weight": 4}}
+DEFAULT_QUOTA = {'max_domains': 10000, 'min_interval': 30, 'weight': 1}
+
 """
 register_user function.
 reads the full file into memory.
@@ -45,6 +54,7 @@ def register_user(username, password):
     try:
         with open(USERS_FILE, 'w') as f:
             json.dump(users, f, indent=4)
+        invalidate_cache(USERS_FILE)
         logger.info(f"User '{username}' registered successfully.")
         return True, "registration successful"
     except (IOError, json.JSONDecodeError) as e:
@@ -55,25 +65,60 @@ def register_user(username, password):
 """
 login_user function.
 pretty straight forward.
-open file, load users, search loop over the list of users,
-return true or false. & some error handling.
+load users (through the data_manager cache, so repeated logins don't re-read the file),
+search loop over the list of users, return true or false. & some error handling.
 """
 def login_user(username, password):
     try:
-        # 1. open file 
-        with open(USERS_FILE, 'r') as f:
-            # 2. load all users to a list
-            users = json.load(f)
-            # 3. loop over each user
-            for user in users:
-                # 4. check username and(!) password match
-                if user['username'] == username and user['password'] == password:
-                    logger.info(f"successful login for user: {username}")
-                    return True, "login successful"
+        # 1+2. load all users to a list
+        users = read_json_cached(USERS_FILE)
+        # 3. loop over each user
+        for user in users:
+            # 4. check username and(!) password match
+            if user['username'] == username and user['password'] == password:
+                logger.info(f"successful login for user: {username}")
+                return True, "login successful"
 
-            # if no match was found,
-            logger.warning(f"failed login attempt for user: {username}")   
-            return False, "invalid credentials"
+        # if no match was found,
+        logger.warning(f"failed login attempt for user: {username}")   
+        return False, "invalid credentials"
     except (IOError, json.JSONDecodeError) as e:
         logger.error(f"error during user login: {e}")
         return False, "server error"
+
+
+
+"""
+get_user_quota function.
+returns the user's limits: DEFAULT_QUOTA with the user's own "quota" overrides on top.
+unknown users (and a missing users file) get the defaults.
+"""
+def get_user_quota(username):
+    quota = dict(DEFAULT_QUOTA)
+    try:
+        users = read_json_cached(USERS_FILE)
+    except FileNotFoundError:
+        return quota
+    except (IOError, json.JSONDecodeError) as e:
+        logger.error(f"error reading quota for {username}: {e}")
+        return quota
+    for user in users:
+        if user['username'] == username and isinstance(user.get('quota'), dict):
+            quota.update({key: value for key, value in user['quota'].items() if key in DEFAULT_QUOTA})
+    return quota
+
+
+"""
+is_admin function.
+admins are users whose record in users.json has "admin": true (set by hand, there is no UI for it).
+they may profile requests (X-Profile header) and read /api/admin/* endpoints.
+"""
+def is_admin(username):
+    try:
+        users = read_json_cached(USERS_FILE)
+    except FileNotFoundError:
+        return False
+    except (IOError, json.JSONDecodeError) as e:
+        logger.error(f"error reading admin flag for {username}: {e}")
+        return False
+    return any(user['username'] == username and user.get('admin') is True for user in users)
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Multi-vantage checks: the same probe run from several network locations,
+combined into one result by quorum, so a network problem at one location
+does not mark every domain down.
+
+A vantage is either this process ("local") or a vantage server on another
+host / network, started with:
+
+    VANTAGE_TOKEN=secret python3 vantage.py --name eu-west --port 8090
+
+and the engine (app.py / worker.py) is pointed at them with:
+
+    MONITOR_VANTAGES="local,eu-west=http://10.0.1.5:8090,us-east=http://10.0.2.5:8090"
+    MONITOR_QUORUM=2   # optional, defaults to a majority of the vantages
+"""
+
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from assertions import compile_assertions, domain_assertions, validate_assertions
+from check_result import CheckResult, CertStatus, TlsSummary, intern_outcomes
+from domain_checker import check_domain_status, is_failed
+from domain_normalizer import normalize_domain
+from logs import logger
+
+
+# a remote vantage runs the whole probe (HTTP + TLS, each with its own timeout) before it answers.
+VANTAGE_TIMEOUT = 30
+# threads used to fan one check out to all vantages at once.
+VANTAGE_POOL_SIZE = 32
+DEFAULT_PORT = 8090
+# names that only resolve inside a private network, a vantage server never probes them.
+INTERNAL_SUFFIXES = ('localhost', 'local', 'internal', 'intranet', 'lan', 'home', 'corp', 'private', 'home.arpa')
+
+
+# ---------------------------------------------------------------
+# wire format between the engine and a vantage server.
+# unlike the API format it keeps raw values (epoch expiry), so results from
+# different vantages compare equal when nothing changed.
+# ---------------------------------------------------------------
+
+def encode_result(result: CheckResult, latency_ms: int) -> dict:
+    tls = result.tls
+    return {
+        'domain': result.domain,
+        'status_code': result.status_code,
+        'cert_status': result.cert_status.value,
+        'cert_expiry': result.cert_expiry,
+        'cert_error': result.cert_error,
+        'issuer': result.issuer,
+        'tls': [tls.protocol, tls.key, tls.san_match, tls.chain_length, tls.chain_expiry, list(tls.issues)] if tls else None,
+        'assertion_error': result.assertion_error,
+        'body_hash': result.body_hash,
+        'assertion_outcomes': [list(outcome) for outcome in result.assertion_outcomes],
+        'redirects': list(result.redirects),
+        'latency_ms': latency_ms,
+    }
+
+
+def decode_result(data: dict) -> CheckResult:
+    tls = TlsSummary(*data['tls']) if data.get('tls') else None
+    result = CheckResult(data['domain'], data['status_code'], CertStatus(data['cert_status']), data.get('cert_expiry'),
+                         data.get('cert_error'), data.get('issuer'), tls)
+    result.assertion_error = data.get('assertion_error')
+    result.body_hash = data.get('body_hash')
+    result.assertion_outcomes = intern_outcomes(data.get('assertion_outcomes'))
+    result.redirects = tuple(data.get('redirects') or ())
+    return result
+
+
+# ---------------------------------------------------------------
+# vantages
+# ---------------------------------------------------------------
+
+class LocalVantage:
+    """runs the probe in this process."""
+
+    def __init__(self, name: str = 'local', probe=None):
+        self.name = name
+        self.probe = probe or check_domain_status
+
+    def check(self, domain: str, assertions=None):
+        # returns (result, latency in ms). assertions (a tuple of Assertions) are only passed for a remote engine's request.
+        start = time.monotonic()
+        result = self.probe(domain) if assertions is None else self.probe(domain, assertions)
+        return result, int((time.monotonic() - start) * 1000)
+
+
+class HttpVantage:
+    """a vantage server (see serve()) on another host or network."""
+
+    def __init__(self, name: str, url: str, token: str = None, timeout: float = VANTAGE_TIMEOUT):
+        self.name = name
+        self.url = url.rstrip('/') + '/probe'
+        self.token = token if token is not None else os.environ.get('VANTAGE_TOKEN', '')
+        self.timeout = timeout
+        self._local = threading.local()  # one keep-alive session per thread
+
+    def check(self, domain: str):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        # the owners' assertions travel with the request, the vantage has no user data of its own.
+        payload = {'domain': domain}
+        assertions = domain_assertions.get(domain)
+        if assertions:
+            payload['assertions'] = [a.spec for a in assertions]
+        response = session.post(self.url, json=payload, timeout=self.timeout,
+                                headers={'Authorization': f'Bearer {self.token}'})
+        response.raise_for_status()
+        data = response.json()
+        # latency as measured at the vantage, without our hop to it.
+        return decode_result(data), data['latency_ms']
+
+
+class VantageStats:
+    __slots__ = ('probes', 'down', 'unreachable', 'latency_total')
+
+    def __init__(self):
+        self.probes = 0
+        self.down = 0
+        self.unreachable = 0
+        self.latency_total = 0
+
+
+class MultiVantageChecker:
+    """
+    probes a domain from every vantage in parallel and combines the answers:
+    - at least `quorum` vantages saw it fail -> down (the failed result is returned)
+    - otherwise, any vantage got an answer -> up (the result of the first
+      vantage in configured order that got one, so details do not flap)
+    - otherwise (too few vantages reachable to decide) -> None, the caller
+      keeps the previous result.
+    a vantage that cannot be reached does not vote.
+    every returned result carries the per-vantage status and latency.
+    usable anywhere check_domain_status is, e.g. MonitorEngine(probe=...).
+    """
+
+    def __init__(self, vantages: list, quorum: int = None):
+        if not vantages:
+            raise ValueError("at least one vantage is required")
+        self.vantages = vantages
+        self.quorum = quorum or len(vantages) // 2 + 1
+        self._stats = {v.name: VantageStats() for v in vantages}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=VANTAGE_POOL_SIZE, thread_name_prefix='vantage')
+
+    def _ask(self, vantage, domain):
+        try:
+            return vantage.check(domain)
+        except Exception as e:
+            logger.warning(f"vantage {vantage.name} could not check {domain}: {e}")
+            return None
+
+    def __call__(self, domain: str):
+        answers = list(self._executor.map(lambda v: (v, self._ask(v, domain)), self.vantages))
+        outcomes = []
+        down, up = [], []
+        with self._lock:
+            for vantage, answer in answers:
+                stats = self._stats[vantage.name]
+                stats.probes += 1
+                if answer is None:
+                    stats.unreachable += 1
+                    outcomes.append((vantage.name, None, None))
+                    continue
+                result, latency_ms = answer
+                stats.latency_total += latency_ms
+                outcomes.append((vantage.name, result.status_value(), latency_ms))
+                if is_failed(result):
+                    stats.down += 1
+                    down.append(result)
+                else:
+                    up.append(result)
+
+        if len(down) >= self.quorum:
+            chosen = down[0]
+        elif up:
+            chosen = up[0]
+            if down:
+                logger.info(f"{domain} failed from {len(down)} of {len(self.vantages)} vantages, below quorum {self.quorum}.")
+        else:
+            logger.warning(f"no quorum for {domain}: {len(down)} down votes, {len(self.vantages) - len(down)} vantages unreachable.")
+            return None
+        chosen.vantages = tuple(outcomes)
+        return chosen
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    'probes': s.probes,
+                    'down': s.down,
+                    'unreachable': s.unreachable,
+                    'avg_latency_ms': round(s.latency_total / (s.probes - s.unreachable)) if s.probes > s.unreachable else None,
+                }
+                for name, s in self._stats.items()
+            }
+
+
+def parse_vantages(spec: str) -> list:
+    """
+    'local,eu=http://10.0.1.5:8090' -> [LocalVantage('local'), HttpVantage('eu', 'http://10.0.1.5:8090')].
+    """
+    vantages = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, url = item.partition('=')
+        vantages.append(HttpVantage(name.strip(), url.strip()) if url else LocalVantage(name.strip()))
+    return vantages
+
+
+def probe_from_env():
+    # the engine's probe for the configured vantages, None (plain local checks) if none are configured.
+    spec = os.environ.get('MONITOR_VANTAGES', '').strip()
+    if not spec:
+        return None
+    vantages = parse_vantages(spec)
+    quorum = int(os.environ['MONITOR_QUORUM']) if os.environ.get('MONITOR_QUORUM') else None
+    checker = MultiVantageChecker(vantages, quorum)
+    logger.info(f"checking from {len(vantages)} vantages ({', '.join(v.name for v in vantages)}), quorum {checker.quorum}.")
+    return checker
+
+
+# ---------------------------------------------------------------
+# vantage server
+# ---------------------------------------------------------------
+
+class NonPublicAddress(socket.gaierror):
+    """a name a vantage server's probe connects to resolves to a non-public address."""
+
+
+_system_getaddrinfo = socket.getaddrinfo
+# the names resolved by the probe running in this thread -> the addresses they were checked with.
+_pinned = threading.local()
+
+
+def _is_public(address: str) -> bool:
+    return ipaddress.ip_address(address.split('%')[0]).is_global
+
+
+def _guarded_getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+    # socket.getaddrinfo while a vantage server probes (see public_addresses_only). every name the
+    # probe connects to (the domain, each redirect hop, the TLS inspection) must resolve to public
+    # addresses only, and is resolved once: later connections of the same probe go to the addresses
+    # that were checked, so a name cannot re-resolve to an internal address (DNS rebinding).
+    pinned = getattr(_pinned, 'hosts', None)
+    if pinned is None or host is None:
+        return _system_getaddrinfo(host, port, family, type, proto, flags)
+    name = (host.decode('ascii', 'replace') if isinstance(host, bytes) else host).lower().rstrip('.')
+    if name not in pinned:
+        infos = _system_getaddrinfo(name, None, 0, socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        blocked = [address for address in addresses if not _is_public(address)]
+        if blocked:
+            raise NonPublicAddress(socket.EAI_NONAME, f"{name} resolves to the non-public address {blocked[0]}")
+        pinned[name] = addresses
+    results = []
+    for address in pinned[name]:
+        try:
+            results.extend(_system_getaddrinfo(address, port, family, type, proto, flags | socket.AI_NUMERICHOST))
+        except socket.gaierror:
+            pass  # an address of another family than the one asked for
+    if not results:
+        raise socket.gaierror(socket.EAI_NONAME, f"{name} has no address of the requested family")
+    return results
+
+
+@contextmanager
+def public_addresses_only():
+    """
+    runs one probe in this thread with every connection checked and pinned by
+    _guarded_getaddrinfo. requests (urllib3) and the TLS inspection resolve
+    through socket.getaddrinfo, so redirects are covered hop by hop.
+    """
+    if socket.getaddrinfo is not _guarded_getaddrinfo:
+        socket.getaddrinfo = _guarded_getaddrinfo
+    _pinned.hosts = {}
+    try:
+        yield
+    finally:
+        _pinned.hosts = None
+
+
+def probe_target(raw, resolve: bool = True):
+    """
+    the domain a vantage server may probe for a request, so it cannot be used
+    to reach its own network: the name is normalized like user input (which
+    rejects IP addresses), internal names are refused, and so is a name that
+    resolves to a loopback, private or otherwise non-public address.
+    a name that does not resolve is allowed, the probe reports it as failed.
+    resolve=False skips the DNS lookup (for tests with made-up domains).
+    returns: (domain, None) or (None, error message).
+    """
+    domain, error = normalize_domain(raw)
+    if error:
+        return None, error
+    if any(domain == suffix or domain.endswith('.' + suffix) for suffix in INTERNAL_SUFFIXES):
+        return None, f"'{domain}' is an internal name."
+    if not resolve:
+        return domain, None
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(domain, 443, proto=socket.IPPROTO_TCP)}
+    except NonPublicAddress:
+        return None, f"'{domain}' resolves to a non-public address."
+    except (socket.gaierror, UnicodeError):
+        return domain, None
+    if not all(map(_is_public, addresses)):
+        return None, f"'{domain}' resolves to a non-public address."
+    return domain, None
+
+
+def make_server(name: str, host: str = '0.0.0.0', port: int = DEFAULT_PORT, token: str = '', probe=None,
+                resolve=True):
+    """
+    builds the HTTP server a remote vantage runs: POST /probe {"domain": ..., "assertions": [{...}, ...]}
+    answers with the encoded result. probe defaults to check_domain_status.
+    a token is required, the server would otherwise probe anything for anyone.
+    only domains probe_target() allows are probed, and the probe itself runs
+    under public_addresses_only(): redirects to internal addresses fail, and
+    the domain is connected to at the addresses probe_target() checked.
+    resolve=False skips both (for tests with made-up domains).
+    """
+    if not token:
+        raise ValueError("a vantage server needs a token (VANTAGE_TOKEN)")
+    expected = f'Bearer {token}'.encode()
+    local = LocalVantage(name, probe)
+
+    class ProbeHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _reply(self, code, body):
+            payload = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            if self.path != '/probe':
+                return self._reply(404, {'error': 'not found'})
+            # constant-time comparison, so the token cannot be guessed from response times.
+            if not hmac.compare_digest(self.headers.get('Authorization', '').encode(), expected):
+                return self._reply(401, {'error': 'unauthorized'})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                raw = body['domain']
+            except (ValueError, KeyError, TypeError):
+                return self._reply(400, {'error': 'body must be {"domain": ...}'})
+            # a list of the owners' assertion specs, or a single spec.
+            specs = body.get('assertions') or []
+            specs = [specs] if isinstance(specs, dict) else specs
+            if not isinstance(specs, list):
+                return self._reply(400, {'error': 'assertions must be a list of objects'})
+            error = next(filter(None, map(validate_assertions, specs)), None)
+            if error:
+                return self._reply(400, {'error': error})
+            assertions = tuple(compile_assertions(spec) for spec in specs)
+            with public_addresses_only() if resolve else nullcontext():
+                domain, error = probe_target(raw, resolve)
+                if error:
+                    return self._reply(400, {'error': error})
+                result, latency_ms = local.check(domain, assertions or None)
+            self._reply(200, dict(encode_result(result, latency_ms), vantage=name))
+
+        def log_message(self, format, *args):
+            logger.debug(f"vantage {name}: {format % args}")
+
+    return ThreadingHTTPServer((host, port), ProbeHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a check vantage server.")
+    parser.add_argument('--name', required=True, help="vantage name, e.g. eu-west")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    from logs import configure_logging
+    configure_logging()
+    token = os.environ.get('VANTAGE_TOKEN', '')
+    if not token:
+        parser.error("VANTAGE_TOKEN is not set, refusing to start an unauthenticated vantage server.")
+    server = make_server(args.name, args.host, args.port, token)
+    logger.info(f"vantage {args.name} listening on {args.host}:{args.port}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Standalone check worker: runs the background engine without the web app.
+Flask is never imported here. Pair it with web workers started with
+MONITOR_ENGINE=0, so the web processes never load the probe stack.
+
+    python3 worker.py
+
+The worker re-reads every user's domain list every RESYNC_INTERVAL seconds
+(cheap, the lists are served from the data_manager cache while unchanged),
+so domains added or removed through the web app are picked up.
+The web workers serve its results from the engine snapshot it writes
+every SNAPSHOT_INTERVAL seconds (see snapshot.SnapshotResults).
+"""
+
+import time
+
+RESYNC_INTERVAL = 30
+
+
+def create_engine():
+    # the engine with its listeners and the last snapshot restored, not started yet.
+    from engine import MonitorEngine
+    from snapshot import snapshot_path
+    from vantage import probe_from_env
+    from event_log import record_result_change
+
+    engine = MonitorEngine(probe=probe_from_env(), snapshot_path=snapshot_path())
+    # status transitions and certificate renewals go to the change event log.
+    engine.add_listener(record_result_change)
+    engine.load_snapshot()
+    return engine
+
+
+def sync_users(engine, known_users: set, stagger: bool) -> set:
+    # makes the engine match every user's stored list, returns the usernames seen.
+    from data_manager import list_usernames, get_user_domains
+    from user_management import get_user_quota
+    usernames = set(list_usernames())
+    for username in usernames:
+        engine.sync_user(username, get_user_domains(username), stagger=stagger, quota=get_user_quota(username))
+    for username in known_users - usernames:
+        engine.sync_user(username, [])
+    return usernames
+
+
+def main():
+    from logs import configure_logging, logger
+    configure_logging()
+    engine = create_engine()
+    known_users = set()
+    first_sync = True
+    try:
+        while True:
+            # the first sync staggers the initial checks instead of firing them all at once.
+            known_users = sync_users(engine, known_users, stagger=first_sync)
+            if first_sync:
+                # started after the first sync, so restored state is matched to every user's domains first.
+                engine.start()
+            first_sync = False
+            time.sleep(RESYNC_INTERVAL)
+    except KeyboardInterrupt:
+        logger.info("worker interrupted, shutting down.")
+    finally:
+        engine.stop()
+
+
+if __name__ == "__main__":
+    main()